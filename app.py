@@ -1,12 +1,24 @@
 import streamlit as st
-import openai
-import pyperclip
+import functools
+import shlex
 import time
-import os
-import base64
-import requests
-from io import BytesIO
-from PIL import Image
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from socialbuzz.blobstore import BlobStore
+from socialbuzz.client import get_client, verify_api_key
+from socialbuzz.engine import PLATFORMS, image_mode_settings
+from socialbuzz.export import export_to_tempfile
+from socialbuzz.history import History
+from socialbuzz.images import encode_jpeg, make_thumbnail
+from socialbuzz.jobs import get_job_manager
+from socialbuzz.metrics import get_metrics, set_session
+from socialbuzz.routing import get_route_log
+from socialbuzz.shared import get_shared_backend, open_completion_cache
+from socialbuzz.singleflight import get_single_flight
+from socialbuzz.prefetch import STALE_THRESHOLD, Prefetch, text_similarity
+from socialbuzz.tasks import finalize_images_task, images_task, partial_text, post_task, variants_task
+from socialbuzz.textlimits import PLATFORM_LIMITS, parse_thread, split_thread, twitter_length, validate_post
+from socialbuzz.ui import ALL_PLATFORMS, APP_STYLE, LENGTH_OPTIONS, PLATFORM_ICONS, PLATFORM_OPTIONS, TONE_OPTIONS, option_index
 
 # Set page config
 st.set_page_config(
@@ -15,214 +27,693 @@ st.set_page_config(
     layout="wide",
 )
 
-# Custom CSS
-st.markdown("""
-<style>
-    .main {
-        background-color: #f0f2f6;
-    }
-    .stButton>button {
-        background-color: #4267B2;
-        color: white;
-        border-radius: 20px;
-        padding: 10px 24px;
-        font-weight: bold;
-    }
-    .stButton>button:hover {
-        background-color: #365899;
-    }
-    .copy-btn {
-        background-color: #25D366;
-        color: white;
-        border-radius: 20px;
-        padding: 5px 15px;
-        font-weight: bold;
-        border: none;
-        cursor: pointer;
-    }
-    .copy-btn:hover {
-        background-color: #128C7E;
-    }
-    .platform-header {
-        font-size: 24px;
-        font-weight: bold;
-        margin-bottom: 10px;
-    }
-    .post-container {
-        background-color: white;
-        padding: 20px;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-    }
-    .input-container {
-        background-color: white;
-        padding: 20px;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-    }
-    .image-container {
-        background-color: white;
-        padding: 20px;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-top: 20px;
-        margin-bottom: 20px;
-    }
-    .image-grid {
-        display: flex;
-        flex-wrap: wrap;
-        gap: 10px;
-        justify-content: space-around;
-    }
-    .image-card {
-        border: 1px solid #ddd;
-        border-radius: 8px;
-        padding: 10px;
-        margin-bottom: 10px;
-        width: 250px;
-    }
-    /* Aggressively target and remove all capsule containers and dividers */
-    div[data-testid="stCaptionContainer"],
-    div[data-testid="stHeader"],
-    div[data-baseweb="card"],
-    div.stMarkdown > div > div {
-        background-color: transparent !important;
-        border: none !important;
-        box-shadow: none !important;
-        padding: 0 !important;
-        margin: 0 !important;
-    }
+# Process-wide image store; session state only keeps the content hashes it returns.
+# With SOCIALBUZZ_SHARED_DIR (or SOCIALBUZZ_SHARED_BACKEND) set, images are also readable from other replicas
+@st.cache_resource
+def get_blob_store():
+    return BlobStore(backend=get_shared_backend())
+
+# Id of the current browser session, used to track which images each session holds
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+# Evict images and cancel background jobs belonging to sessions that have ended
+def sweep_ended_sessions():
+    if Runtime.exists():
+        runtime = Runtime.instance()
+        get_blob_store().sweep(runtime.is_active_session)
+        get_job_manager().sweep(runtime.is_active_session)
+
+# Raw image bytes for a handle; only read to build a thumbnail or a download
+def load_image_bytes(image_hash):
+    return get_blob_store().get(image_hash)
+
+# Width (CSS px) of the right-hand column in the wide layout on a 1920 px desktop with the sidebar open
+GALLERY_WIDTH = 800
+
+# Thumbnail width for a gallery of n columns, at 2x for high-DPI screens and rounded up so few sizes get cached.
+# Images smaller than that (e.g. drafts) are sent at their own size.
+def thumbnail_width(columns):
+    width = 2 * GALLERY_WIDTH // max(1, columns)
+    return min(1024, -(-width // 64) * 64)
+
+# Display thumbnails (JPEG bytes), keyed by content hash and width so each image is resized only once.
+# The page update only carries a media URL for each, which the browser caches across reruns.
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_thumbnail(image_hash, width):
+    return make_thumbnail(load_image_bytes(image_hash), width)
+
+# Full-resolution JPEG, built only when its download button is clicked
+def download_jpeg(image_hash):
+    return encode_jpeg(load_image_bytes(image_hash))
+
+# Move freshly generated image bytes into the blob store and keep only their handles in session state
+def set_generated_images(images):
+    store = get_blob_store()
+    session_id = current_session_id()
+    handles = [store.put(image_bytes, owner=session_id) for image_bytes in images]
+    # Images this session no longer shows can be evicted
+    stale = set(st.session_state.get('generated_images', [])) - set(handles)
+    if stale:
+        store.release(session_id, stale)
+    st.session_state.generated_images = handles
+
+# This session's OpenAI client, shared from the process-wide pool with other sessions using the same key
+def get_session_client():
+    return get_client(st.session_state.api_key)
+
+# Completion cache shared by every session on this server, and by every replica when a shared backend is set
+@st.cache_resource
+def get_completion_cache():
+    return open_completion_cache()
+
+# Process-wide history of every post and final image, kept on disk across sessions and restarts
+@st.cache_resource
+def get_history():
+    return History()
+
+# A ZIP of export records, built in a temporary file and read back once for the download.
+# Runs when the download is clicked, outside the script run, so it only uses what it is given.
+def export_zip(make_records, load_image):
+    with export_to_tempfile(make_records(), load_image) as f:
+        return f.read()
+
+# The posts (every variant) and images on screen as export records
+def session_export_records():
+    posts = dict(st.session_state.edited_variants) if st.session_state.post_variants else {st.session_state.platform: st.session_state.edited_post}
+    image_platform = st.session_state.image_variant if st.session_state.post_variants else st.session_state.platform
+    images = st.session_state.generated_images
+    sources = st.session_state.image_sources if len(st.session_state.image_sources) == len(images) else [None] * len(images)
+    records = []
+    for p, text in posts.items():
+        route = st.session_state.post_routes.get(p)
+        written = st.session_state.post_image_prompts.get(p)
+        records.append({
+            "title": st.session_state.title,
+            "platform": p,
+            "tone": st.session_state.tone,
+            "length": st.session_state.length,
+            "text": text,
+            "model": route.model if route else None,
+            "route": route.name if route else None,
+            "image_prompts": written["prompts"] if written else (st.session_state.image_prompts if p == image_platform else None),
+            "images": list(zip(images, sources)) if p == image_platform else [],
+        })
+    return records
+
+# Posts shown per page of the history sidebar
+HISTORY_PAGE_SIZE = 10
+
+# How often (in seconds) the job panels refresh while a background job runs
+JOB_POLL_INTERVAL = 0.5
+
+# Images per post (kept at 2 to speed up generation)
+NUM_IMAGES = 2
+
+# Start a background job for this session; a new job replaces (and cancels) a running one of the same kind
+def start_job(kind, fn, *args, meta=None, **kwargs):
+    cancel_job(kind)
+    job = get_job_manager().submit(kind, fn, *args, owner=current_session_id(), meta=meta, **kwargs)
+    st.session_state.active_jobs[kind] = job.id
+
+# The running job of a kind for this session, if any
+def active_job(kind):
+    job_id = st.session_state.active_jobs.get(kind)
+    return get_job_manager().get(job_id) if job_id else None
+
+# Cancel a job, which also aborts its in-flight streams and unsent requests
+def cancel_job(kind):
+    job_id = st.session_state.active_jobs.pop(kind, None)
+    if job_id:
+        get_job_manager().cancel(job_id)
+        get_job_manager().pop(job_id)
+
+# Clear the images of the current post (and any job still generating them)
+def reset_images():
+    cancel_job("images")
+    set_generated_images([])
+    st.session_state.image_prompts = []
+    st.session_state.image_sources = []
+    st.session_state.image_mode = "final"
+
+# Move the results of finished jobs into session state
+def collect_finished_jobs():
+    manager = get_job_manager()
+    for kind in list(st.session_state.active_jobs):
+        job = active_job(kind)
+        if job is not None and not job.finished:
+            continue
+        st.session_state.active_jobs.pop(kind, None)
+        if job is None:
+            continue
+        manager.pop(job.id)
+        if job.status == "error":
+            st.session_state.notices.append(f"Error generating {'post' if kind == 'post' else 'images'}: {job.error}")
+        elif job.status == "done":
+            apply_job_result(job)
+
+# Store the result of a finished job as the current post, variants or images
+def apply_job_result(job):
+    result = job.result
+    if job.kind == "images":
+        st.session_state.image_prompts = result["prompts"]
+        set_generated_images(result["images"])
+        st.session_state.image_sources = result["sources"]
+        st.session_state.image_mode = result["mode"]
+        st.session_state.notices.extend(result["errors"])
+        if result["mode"] == "final":
+            record_images(result["images"], result["sources"])
+        return
     
-    /* Target subheaders specifically */
-    .stSubheader > div:first-child {
-        background-color: transparent !important;
-        border: none !important;
-        box-shadow: none !important;
-        padding: 0 !important;
-    }
+    mode = job.meta.get("mode")
+    posts = result["variants"] if mode == "variants" else {job.meta["platform"]: result["post"]}
+    # Image prompts written together with the post, remembered with the text they were written for
+    image_prompts = {p: {"source": posts[p], "prompts": prompts} for p, prompts in result["image_prompts"].items()}
+    record_posts(job, posts)
+    if mode == "variant":
+        st.session_state.post_routes.update(result["routes"])
+        st.session_state.post_image_prompts.pop(job.meta["platform"], None)
+        st.session_state.post_image_prompts.update(image_prompts)
+    else:
+        st.session_state.post_routes = result["routes"]
+        st.session_state.post_image_prompts = image_prompts
+    if mode == "variants":
+        set_post_variants(result["variants"])
+        st.session_state.notices.extend(f"Error generating {p} post: {error}" for p, error in result["errors"].items())
+        reset_images()
+    elif mode == "variant":
+        p = job.meta["platform"]
+        st.session_state.post_variants[p] = result["post"]
+        st.session_state.edited_variants[p] = result["post"]
+        # Images belong to the selected variant, so only reset them when that one changes
+        if p == st.session_state.image_variant:
+            st.session_state.generated_post = result["post"]
+            st.session_state.edited_post = result["post"]
+            reset_images()
+    else:
+        st.session_state.generated_post = result["post"]
+        st.session_state.edited_post = result["post"]
+        st.session_state.post_variants = {}
+        reset_images()
+
+# Save freshly written posts to the history, remembering their ids so images made later join them
+def record_posts(job, posts):
+    title, _, tone, length, _ = job.meta["inputs"]
+    result = job.result
+    ids = {}
+    try:
+        for p, post in posts.items():
+            route = result["routes"].get(p)
+            ids[p] = get_history().add_post(
+                title, p, tone, length, post,
+                model=route.model if route else None,
+                route=route.name if route else None,
+                usage=result.get("usage", {}).get(p),
+                image_prompts=result["image_prompts"].get(p),
+            )
+    except Exception as e:
+        st.session_state.notices.append(f"Could not save the post to the history: {str(e)}")
+    if job.meta.get("mode") == "variant":
+        st.session_state.history_ids.update(ids)
+    else:
+        st.session_state.history_ids = ids
+
+# Save final images to the history entry of the post they were made for
+def record_images(images, sources):
+    platform = st.session_state.image_variant if st.session_state.post_variants else st.session_state.platform
+    post_id = st.session_state.history_ids.get(platform)
+    if post_id is None or not images:
+        return
+    try:
+        get_history().add_images(post_id, images, sources)
+    except Exception as e:
+        st.session_state.notices.append(f"Could not save the images to the history: {str(e)}")
+
+# Make a post from the history the current post again, with its images; no API calls are made
+def restore_from_history(post_id):
+    post = get_history().get(post_id)
+    if post is None:
+        st.session_state.notices.append("That post is no longer in the history.")
+        return
+    cancel_job("post")
+    clear_prefetch()
+    reset_images()
+    st.session_state.title = post["title"]
+    st.session_state.platform = post["platform"]
+    st.session_state.tone = post["tone"]
+    st.session_state.length = post["length"]
+    st.session_state.generated_post = post["text"]
+    st.session_state.edited_post = post["text"]
+    st.session_state.post_variants = {}
+    st.session_state.edited_variants = {}
+    st.session_state.post_routes = {}
+    st.session_state.post_image_prompts = {}
+    if post["image_prompts"]:
+        st.session_state.post_image_prompts[post["platform"]] = {"source": post["text"], "prompts": post["image_prompts"]}
+    st.session_state.history_ids = {post["platform"]: post_id}
     
-    /* Fix specific styling for headers */
-    h1, h2, h3, h4, h5, h6 {
-        margin-top: 0.75em !important;
-        margin-bottom: 0.5em !important;
-        padding: 0 !important;
-        background: none !important;
-        border: none !important;
-    }
+    images, sources = [], []
+    for image_hash, prompt in post["images"]:
+        try:
+            images.append(get_history().load_image(image_hash))
+            sources.append(prompt)
+        except KeyError:
+            continue  # Pruned from disk
+    set_generated_images(images)
+    st.session_state.image_sources = sources
+    st.session_state.image_prompts = list(dict.fromkeys(prompt for prompt in sources if prompt))
+
+# A new search starts again from the newest matches
+def reset_history_pages():
+    st.session_state.history_cursors = [None]
+
+def older_history_page(last_id):
+    st.session_state.history_cursors.append(last_id)
+
+def newer_history_page():
+    if len(st.session_state.history_cursors) > 1:
+        st.session_state.history_cursors.pop()
+
+# Sidebar: search past posts and restore one; reruns on its own while searching and paging
+@st.fragment
+def history_sidebar():
+    st.markdown("### History")
+    query = st.text_input("Search past posts", key="history_query", placeholder="Words from the topic or post", on_change=reset_history_pages)
+    started = time.perf_counter()
+    # One extra row tells whether there is an older page
+    rows = get_history().search(query, before=st.session_state.history_cursors[-1], limit=HISTORY_PAGE_SIZE + 1)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    has_older = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
     
-    /* Fix for step containers */
-    section[data-testid="stSidebar"] > div,
-    .main > div {
-        background-color: transparent !important;
-        border: none !important;
-    }
-    .download-btn {
-        background-color: #5b7dff;
-        color: white !important; /* Force white text color */
-        border-radius: 12px;
-        padding: 8px 10px;
-        font-weight: bold;
-        border: none;
-        cursor: pointer;
-        width: 100%;
-        margin-top: 5px;
-        transition: all 0.3s ease;
-        text-decoration: none !important; /* Remove underline */
-        display: block;
-        text-align: center;
-    }
-    .download-btn:hover {
-        background-color: #3957e0;
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        color: white !important; /* Keep text white even on hover */
-    }
-    .regenerate-btn {
-        background-color: #FF5722;
-        color: white;
-        border-radius: 20px;
-        padding: 5px 15px;
-        font-weight: bold;
-        border: none;
-        cursor: pointer;
+    if not rows:
+        st.caption("No matching posts." if query else "Posts you create are saved here.")
+    else:
+        st.caption(f"Found in {elapsed_ms:.1f} ms")
+    for row in rows:
+        with st.container(border=True):
+            st.markdown(f"**{row['title']}**")
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created_at"]))
+            images = f" · {row['image_count']} images" if row["image_count"] else ""
+            st.caption(f"{PLATFORM_ICONS.get(row['platform'], '')} {row['platform']} · {row['tone']} · {row['length']} · {when}{images}")
+            preview = row["snippet"] or row["text"]
+            st.markdown(preview if len(preview) <= 200 else preview[:200] + "...")
+            if st.button("Restore", key=f"restore_history_{row['id']}"):
+                restore_from_history(row["id"])
+                st.rerun()
+    
+    col_newer, col_older = st.columns(2)
+    with col_newer:
+        st.button("Newer", key="history_newer", on_click=newer_history_page, disabled=len(st.session_state.history_cursors) == 1)
+    with col_older:
+        st.button("Older", key="history_older", on_click=older_history_page, args=(rows[-1]["id"] if rows else None,), disabled=not has_older)
+    
+    # A download is sent from memory, so bulk exports of the history are left to the command line
+    if rows:
+        command = "python -m socialbuzz export --history" + (f" --query {shlex.quote(query)}" if query else "") + " -o history.zip"
+        st.caption(f"To export {'every match' if query else 'the whole history'} with images, run `{command}`")
+
+# Live progress for a background job; polls without rerunning the rest of the page
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def job_panel(kind):
+    job = active_job(kind)
+    if job is None or job.finished:
+        st.rerun()  # A full rerun collects the result
+    
+    st.progress(job.progress, text=job.message or "Working...")
+    if kind == "post" and st.session_state.stream_post:
+        if job.meta.get("mode") == "variants":
+            tabs = st.tabs([f"{PLATFORM_ICONS[p]} {p}" for p in PLATFORMS])
+            for p, tab in zip(PLATFORMS, tabs):
+                with tab:
+                    st.markdown(partial_text(job, p) or f"Writing your {p} post...")
+        else:
+            st.markdown(partial_text(job, job.meta.get("platform")))
+    
+    if st.button("Cancel", key=f"cancel_{kind}_job"):
+        cancel_job(kind)
+        st.rerun()
+
+# Start writing a post (or one variant) in the background, with its image prompts in the same request if enabled;
+# adapt_from=(title, text) of a past post rewrites that post for the new topic instead
+def start_post_job(title, platform, tone, length, inputs, mode="single", bypass_cache=False, adapt_from=None):
+    custom_word_count = st.session_state.custom_word_count
+    meta = {"mode": mode, "platform": platform, "inputs": inputs}
+    options = {
+        "client": get_session_client(),
+        "cache": get_completion_cache(),
+        "bypass_cache": bypass_cache,
+        "num_image_prompts": NUM_IMAGES if st.session_state.fused_prompts else 0,
     }
-</style>
-""", unsafe_allow_html=True)
-
-# Helper function to download image
-def get_image_download_link(img, filename, text):
-    buffered = BytesIO()
-    img.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    href = f'<a href="data:image/jpeg;base64,{img_str}" download="{filename}" class="download-btn">📥 {text}</a>'
-    return href
-
-# Function to generate image using DALL-E
-def generate_dall_e_images(prompt, n=1):
+    if mode == "variants":
+        start_job("post", variants_task, title, tone, length, custom_word_count, meta=meta, **options)
+    else:
+        start_job("post", post_task, title, platform, tone, length, custom_word_count, meta=meta, adapt_from=adapt_from, **options)
+
+# Past posts on a near-identical topic for the same platform, tone and length, or [] (and for All platforms)
+def similar_past_posts(title, platform, tone, length):
+    if platform == ALL_PLATFORMS:
+        return []
     try:
-        response = openai.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            n=n,
-            size="1024x1024",  # Square format
-            response_format="b64_json"
+        return get_history().find_similar(title, platform, tone, length)
+    except Exception:
+        return []  # A history problem must never stop a post from being written
+
+# Offer close matches from the history before paying for a new post: reuse one as it is, adapt it, or write anew
+def similar_posts_offer(title, platform, tone, length, inputs):
+    matches = st.session_state.similar_offer["matches"]
+    st.info("You have written a post on a very similar topic before. Reuse it at no cost, adapt it to this topic, or write a new one.")
+    for match in matches:
+        with st.container(border=True):
+            when = time.strftime("%Y-%m-%d", time.localtime(match["created_at"]))
+            st.markdown(f"**{match['title']}** ({match['similarity']:.0%} similar, {when})")
+            st.text(match["text"] if len(match["text"]) <= 300 else match["text"][:300] + "...")
+            col_reuse, col_adapt = st.columns(2)
+            with col_reuse:
+                if st.button("Reuse this post", key=f"reuse_similar_{match['id']}"):
+                    st.session_state.similar_offer = None
+                    restore_from_history(match["id"])
+                    st.session_state.title = title  # Keep the topic as typed
+                    st.rerun()
+            with col_adapt:
+                if st.button("Adapt it to this topic", key=f"adapt_similar_{match['id']}"):
+                    st.session_state.similar_offer = None
+                    start_post_job(title, platform, tone, length, inputs, adapt_from=(match["title"], match["text"]))
+                    st.rerun()
+    if st.button("Write a new post", key="write_new_post"):
+        st.session_state.similar_offer = None
+        start_post_job(title, platform, tone, length, inputs)
+        st.rerun()
+
+# Image prompts written with the current post, unless the post has since been edited too much for them
+def prompts_written_with_post():
+    platform = st.session_state.image_variant if st.session_state.post_variants else st.session_state.platform
+    written = st.session_state.post_image_prompts.get(platform)
+    if written and text_similarity(written["source"], st.session_state.edited_post) >= STALE_THRESHOLD:
+        return written["prompts"]
+    return None
+
+# Image mode new images are made in: cheap drafts to pick from, or final images straight away
+def requested_image_mode():
+    return "draft" if st.session_state.draft_images else "final"
+
+# Start generating images for the current post, reusing prompts written with the post or prefetched
+# work when they still match it; otherwise the prompts take a separate request
+def start_images_job(title, regenerate=False):
+    prompts = None if regenerate else prompts_written_with_post()
+    prefetch = st.session_state.prefetch
+    if regenerate or prompts or prefetch is None or not prefetch.is_fresh(st.session_state.edited_post):
+        prefetch = None
+    start_job(
+        "images",
+        images_task,
+        title,
+        st.session_state.edited_post,
+        NUM_IMAGES,
+        client=get_session_client(),
+        cache=get_completion_cache(),
+        bypass_cache=regenerate,
+        prefetch=prefetch,
+        prompts=prompts,
+        mode=requested_image_mode()
+    )
+
+# Render the picked draft images again at full quality; the unpicked drafts are dropped once it finishes
+def start_finalize_job(picked):
+    prompts = [st.session_state.image_sources[i] for i in picked]
+    start_job("images", finalize_images_task, prompts, client=get_session_client())
+
+# Start speculative image work for a freshly written post, and drop it once the post has been edited too much
+def update_prefetch(title):
+    if not st.session_state.prefetch_prompts or st.session_state.generated_images or prompts_written_with_post():
+        return
+    prefetch = st.session_state.prefetch
+    if prefetch is None or prefetch.source != st.session_state.generated_post:
+        if prefetch is not None:
+            prefetch.cancel()
+        st.session_state.prefetch = Prefetch(
+            title,
+            st.session_state.generated_post,
+            client=get_session_client(),
+            cache=get_completion_cache(),
+            with_images=st.session_state.prefetch_images,
+            mode=requested_image_mode()
         )
-        
-        # Extract the base64 encoded images
-        images_data = []
-        for data in response.data:
-            images_data.append(data.b64_json)
-        
-        return images_data
-    except Exception as e:
-        st.error(f"Error generating images: {str(e)}")
-        return []
+    elif not prefetch.cancelled and not prefetch.is_fresh(st.session_state.edited_post):
+        prefetch.cancel()
+
+# Function to cancel and forget any speculative work for this session
+def clear_prefetch():
+    if st.session_state.prefetch is not None:
+        st.session_state.prefetch.cancel()
+        st.session_state.prefetch = None
 
-# Function to generate image prompts based on post content
-def generate_image_prompts(title, post_content, num_images=2):
+# Function to store a set of platform variants as the current post
+def set_post_variants(variants):
+    # Keep tabs in platform order rather than completion order
+    variants = {p: variants[p] for p in PLATFORMS if p in variants}
+    st.session_state.post_variants = variants
+    st.session_state.edited_variants = dict(variants)
+    if st.session_state.image_variant not in variants:
+        st.session_state.image_variant = next(iter(variants), "")
+    # The post used for images is the selected variant
+    st.session_state.generated_post = variants.get(st.session_state.image_variant, "")
+    st.session_state.edited_post = st.session_state.generated_post
+
+# Copy a post to the clipboard of the machine running the app; pyperclip is only loaded when it is used
+def copy_to_clipboard(text):
     try:
-        prompt = f"""
-        Based on this social media post about "{title}", create {num_images} different image prompts for DALL-E 3.
-        Each prompt should describe a square-format image that would complement the post well.
-        Make the prompts specific, visually appealing, and under 200 characters each.
-        Format your response as a numbered list with just the prompts, nothing else.
-
-        Post content:
-        {post_content}
-        """
-        
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",  # Use faster model to speed up process
-            messages=[
-                {"role": "system", "content": "You are an expert at creating visual prompts for AI image generators."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,  # Reduced tokens
-            temperature=0.7
-        )
-        
-        # Parse the response to extract prompts
-        prompts_text = response.choices[0].message.content.strip()
-        # Split by line, filter empty lines and remove numbering
-        prompts = []
-        for line in prompts_text.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line[0] == '-'):
-                # Remove numbering/bullet and any separator like ". " or ") "
-                cleaned_line = line[1:].strip()
-                if cleaned_line[0] in ['.', ')', '-', ':']:
-                    cleaned_line = cleaned_line[1:].strip()
-                prompts.append(cleaned_line)
+        import pyperclip
+        pyperclip.copy(text)
+        st.success("Post copied to clipboard!")
+    except Exception:
+        st.info("Clipboard functionality works when running locally. If you're using this in a web environment, please manually copy the text.")
+
+# Which model route wrote the post for a platform
+def render_route(platform):
+    route = st.session_state.post_routes.get(platform)
+    if route is not None:
+        st.caption(f"Written by {route.model} (route: {route.name}, up to {route.max_tokens} tokens)")
+
+# Flag posts over the platform limit and, for Twitter, preview the post as a numbered thread.
+# Returns the tweets when the user chooses to use the thread, otherwise None.
+def render_length_checks(post, platform, length, key):
+    thread = parse_thread(post) if platform == "Twitter" else None
+    if thread:
+        st.caption(f"Twitter thread: {len(thread)} tweets")
+    elif platform == "Twitter":
+        st.caption(f"Twitter characters: {twitter_length(post)}/{PLATFORM_LIMITS['Twitter']} (links count as 23, emoji as 2)")
+    problems = validate_post(post, platform)
+    for problem in problems:
+        st.warning(problem)
+    
+    is_thread = thread is not None or length == "Thread/Multiple Messages"
+    if platform != "Twitter" or not (problems or is_thread):
+        return None
+    tweets = split_thread(post, keep_paragraphs=is_thread)
+    st.markdown(f"**Thread preview ({len(tweets)} tweets)**")
+    for tweet in tweets:
+        with st.container(border=True):
+            st.text(tweet)
+            st.caption(f"{twitter_length(tweet)}/{PLATFORM_LIMITS['Twitter']}")
+    if tweets == thread:
+        return None  # Already in this shape
+    return tweets if st.button("Use this thread", key=f"use_thread_{key}") else None
+
+# Function to render the editable platform variants, each with its own copy and regenerate actions
+def render_post_variants(title, tone, length, inputs):
+    variants = st.session_state.post_variants
+    tabs = st.tabs([f"{PLATFORM_ICONS[p]} {p}" for p in variants])
+    for p, tab in zip(variants, tabs):
+        with tab:
+            edited = st.text_area(f"Edit your {p} post if needed:", value=variants[p], height=250)
+            st.session_state.edited_variants[p] = edited
+            st.info(f"Current word count: {len(edited.split())} words")
+            render_route(p)
+            tweets = render_length_checks(edited, p, length, p)
+            if tweets:
+                thread = "\n\n".join(tweets)
+                st.session_state.post_variants[p] = thread
+                st.session_state.edited_variants[p] = thread
+                if p == st.session_state.image_variant:
+                    st.session_state.generated_post = thread
+                    st.session_state.edited_post = thread
+                st.rerun()
+            
+            col1_action, col2_action = st.columns(2)
+            with col1_action:
+                if st.button("Copy to Clipboard", key=f"copy_clipboard_{p}"):
+                    copy_to_clipboard(edited)
+            with col2_action:
+                regenerate = st.button("Regenerate Post", key=f"regenerate_post_btn_{p}")
+            
+            if regenerate:
+                start_post_job(title, p, tone, length, inputs, mode="variant", bypass_cache=True)
+                st.rerun()
+    
+    # Images are generated for one variant at a time
+    options = list(variants)
+    image_variant = st.radio(
+        "Generate images for:",
+        options,
+        index=options.index(st.session_state.image_variant) if st.session_state.image_variant in options else 0,
+        horizontal=True
+    )
+    st.session_state.image_variant = image_variant
+    st.session_state.edited_post = st.session_state.edited_variants.get(image_variant, "")
+
+# Step 3: the editable post; reruns on its own while the user types
+@st.fragment
+def post_editor(title, platform, tone, length, inputs):
+    st.markdown('<div class="post-container">', unsafe_allow_html=True)
+    st.markdown('<h3>Step 3: Your Generated Post</h3>', unsafe_allow_html=True)
+    
+    if st.session_state.post_variants:
+        render_post_variants(title, tone, length, inputs)
+    else:
+        # Display platform-specific header
+        if platform in PLATFORM_ICONS:
+            icon = PLATFORM_ICONS[platform]
+            st.markdown(f'<div class="platform-header">{icon} {platform} Post</div>', unsafe_allow_html=True)
+    
+        # Display editable post
+        edited_post = st.text_area("Edit your post if needed:", value=st.session_state.generated_post, height=250)
+        st.session_state.edited_post = edited_post
+    
+        # Word count display
+        word_count = len(edited_post.split())
+        st.info(f"Current word count: {word_count} words")
+        render_route(platform)
         
-        # Limit to requested number
-        return prompts[:num_images]
+        # Fix length problems locally instead of regenerating
+        tweets = render_length_checks(edited_post, platform, length, "post")
+        if tweets:
+            st.session_state.generated_post = "\n\n".join(tweets)
+            st.session_state.edited_post = st.session_state.generated_post
+            st.rerun()
     
-    except Exception as e:
-        st.error(f"Error generating image prompts: {str(e)}")
-        # Fallback prompts
-        return [f"Professional square image related to {title}"] * num_images
+        # Copy and regenerate post buttons
+        col1_action, col2_action = st.columns(2)
+        with col1_action:
+            if st.button("Copy to Clipboard", key="copy_clipboard"):
+                copy_to_clipboard(edited_post)
+    
+        with col2_action:
+            if st.button("Regenerate Post", key="regenerate_post_btn"):
+                # Images are reset once the new post arrives
+                start_post_job(title, platform, tone, length, inputs, bypass_cache=True)
+                st.rerun()
+    
+    # The posts and images on screen in one ZIP; images finishing cause a full rerun, so this stays current
+    records = session_export_records()
+    st.download_button(
+        "📦 Export posts and images (ZIP)",
+        data=functools.partial(export_zip, lambda: records, get_blob_store().get),
+        file_name="socialbuzz-export.zip",
+        mime="application/zip",
+        key="export_session",
+        on_click="ignore"
+    )
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Keep speculative image work in step with the post being edited
+    update_prefetch(title)
+
+# Step 4: image generation and the gallery; reruns on its own when its buttons are used
+@st.fragment
+def image_gallery(title):
+    st.markdown('<div class="image-container">', unsafe_allow_html=True)
+    st.markdown('<h3>Step 4: AI Generated Images</h3>', unsafe_allow_html=True)
+    
+    # Drafts are cheap low-resolution candidates; only the ones picked are paid for at full quality
+    draft, final = image_mode_settings("draft"), image_mode_settings("final")
+    st.checkbox(
+        f"Start with draft previews ({draft['model']}, {draft['size']})",
+        key="draft_images",
+        help=f"Makes {draft['n']} cheap candidates per prompt. The ones you pick are drawn again from the same prompt with {final['model']} at {final['size']}."
+    )
+    
+    # Generate/Regenerate images button, swapped for the job's progress once it starts
+    controls = st.empty()
+    if active_job("images") is None:
+        if st.session_state.generated_images:
+            if controls.button("Regenerate Images for this Post", key="regenerate_images"):
+                start_images_job(title, regenerate=True)
+        else:
+            if controls.button("Generate Relevant Images for this Post", key="generate_images"):
+                start_images_job(title)
+    if active_job("images") is not None:
+        with controls.container():
+            job_panel("images")
+    
+    # Display images with improved layout
+    if st.session_state.generated_images:
+        # Create a container with custom CSS class for targeted styling
+        image_display = st.container()
+        with image_display:
+            cols = st.columns(len(st.session_state.generated_images))
+            width = thumbnail_width(len(cols))
+            is_draft = st.session_state.image_mode == "draft" and len(st.session_state.image_sources) == len(cols)
+            picked = []
+            
+            for i, (image_hash, col) in enumerate(zip(st.session_state.generated_images, cols)):
+                try:
+                    # Resized once per image; the browser never receives the full-size original for display
+                    thumbnail = load_thumbnail(image_hash, width)
+                    
+                    # Display image in column with minimal wrapping
+                    with col:
+                        # Display image without caption
+                        st.image(thumbnail, width="stretch")
+                        if is_draft and st.checkbox("Pick", key=f"pick_draft_{i}_{image_hash[:12]}"):
+                            picked.append(i)
+                        # Downloading needs no rerun at all
+                        st.download_button(
+                            "📥 Download Image",
+                            data=functools.partial(download_jpeg, image_hash),
+                            file_name=f"social_media_{'draft' if is_draft else 'image'}_{i+1}.jpg",
+                            mime="image/jpeg",
+                            key=f"download_image_{i}",
+                            on_click="ignore"
+                        )
+                except Exception as e:
+                    st.error(f"Error displaying image {i+1}: {str(e)}")
+            
+            if is_draft:
+                st.caption(f"Draft previews at {draft['size']}. Final images are drawn again from the same prompt, so details will differ.")
+                if st.button(f"Render {len(picked)} picked at full quality", key="finalize_images", disabled=not picked or active_job("images") is not None):
+                    start_finalize_job(picked)
+                    st.rerun()
+
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# Debug panel: timings, tokens and estimated cost of this session's recent stages; "Refresh timings" reruns only this panel
+@st.fragment
+def timings_panel():
+    spans = get_metrics().recent(current_session_id())
+    if not spans:
+        st.caption("Nothing recorded for this session yet.")
+    else:
+        tokens = sum(span.get("prompt_tokens", 0) + span.get("completion_tokens", 0) for span in spans)
+        cost = sum(span.get("cost_usd", 0) for span in spans)
+        st.caption(f"Last {len(spans)} stages: {tokens} tokens, about ${cost:.4f}")
+        rows = [
+            {
+                "stage": span["stage"],
+                "model": span.get("model", ""),
+                "ms": span["duration_ms"],
+                "first token ms": span.get("first_token_ms"),
+                "tokens": span.get("prompt_tokens", 0) + span.get("completion_tokens", 0) or None,
+                "cost $": span.get("cost_usd"),
+                "status": span["status"],
+            }
+            for span in reversed(spans)
+        ]
+        st.dataframe(rows, hide_index=True)
+    st.button("Refresh timings", key="refresh_timings")
 
 # Initialize session state
 if 'api_key_verified' not in st.session_state:
@@ -245,30 +736,57 @@ if 'generated_images' not in st.session_state:
     st.session_state.generated_images = []
 if 'image_prompts' not in st.session_state:
     st.session_state.image_prompts = []
+if 'image_sources' not in st.session_state:
+    st.session_state.image_sources = []
+if 'image_mode' not in st.session_state:
+    st.session_state.image_mode = "final"
+if 'draft_images' not in st.session_state:
+    st.session_state.draft_images = False
+if 'post_variants' not in st.session_state:
+    st.session_state.post_variants = {}
+if 'edited_variants' not in st.session_state:
+    st.session_state.edited_variants = {}
+if 'image_variant' not in st.session_state:
+    st.session_state.image_variant = ""
+if 'prefetch' not in st.session_state:
+    st.session_state.prefetch = None
+if 'prefetch_prompts' not in st.session_state:
+    st.session_state.prefetch_prompts = False
+if 'prefetch_images' not in st.session_state:
+    st.session_state.prefetch_images = False
+if 'stream_post' not in st.session_state:
+    st.session_state.stream_post = True
+if 'fused_prompts' not in st.session_state:
+    st.session_state.fused_prompts = False
+if 'post_image_prompts' not in st.session_state:
+    st.session_state.post_image_prompts = {}
+if 'post_routes' not in st.session_state:
+    st.session_state.post_routes = {}
+if 'show_timings' not in st.session_state:
+    st.session_state.show_timings = False
+if 'similar_offer' not in st.session_state:
+    st.session_state.similar_offer = None
+if 'history_ids' not in st.session_state:
+    st.session_state.history_ids = {}
+if 'history_cursors' not in st.session_state:
+    st.session_state.history_cursors = [None]
+if 'active_jobs' not in st.session_state:
+    st.session_state.active_jobs = {}
+if 'notices' not in st.session_state:
+    st.session_state.notices = []
 
 def main():
-    # Apply custom CSS directly to target white capsules
-    st.markdown("""
-    <style>
-    /* Target and remove white capsule dividers around subheaders */
-    .stSubheader {
-        border: none !important;
-        background-color: transparent !important;
-        padding: 0 !important;
-        margin: 0 !important;
-        box-shadow: none !important;
-    }
-
-    /* Target the specific subheader wrapper Streamlit uses */
-    .stSubheader > div {
-        border: none !important;
-        background-color: transparent !important;
-        padding: 0 !important;
-        margin: 0 !important;
-        box-shadow: none !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # One compact stylesheet; fragment reruns do not resend it
+    st.markdown(APP_STYLE, unsafe_allow_html=True)
+    
+    # Metrics recorded from here (and by jobs started from here) belong to this session
+    set_session(current_session_id())
+    
+    # Free images and jobs held by sessions that have closed
+    sweep_ended_sessions()
+    
+    # Pick up posts and images finished by background jobs since the last run
+    collect_finished_jobs()
     
     # Header
     st.title("📱 Social Media Post Generator")
@@ -283,13 +801,8 @@ def main():
         if st.button("Verify API Key"):
             if api_key:
                 try:
-                    openai.api_key = api_key
-                    # Simple verification by just making a small request
-                    response = openai.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[{"role": "user", "content": "Hello"}],
-                        max_tokens=5
-                    )
+                    # Free models.list check, remembered per key so repeat logins skip the round trip
+                    verify_api_key(api_key)
                     st.session_state.api_key_verified = True
                     st.session_state.api_key = api_key
                     st.success("API Key verified successfully!")
@@ -302,6 +815,10 @@ def main():
 
     # Step 2: Input Fields
     else:
+        # Past posts can be found and restored without calling OpenAI
+        with st.sidebar:
+            history_sidebar()
+        
         # Left column for inputs
         col1, col2 = st.columns([1, 1])
         
@@ -313,31 +830,13 @@ def main():
             title = st.text_input("Post Topic:", placeholder="e.g., AI Summit Delhi 2025", value=st.session_state.title)
             
             # Platform dropdown
-            platform = st.selectbox(
-                "Select Platform:",
-                ["", "LinkedIn", "Twitter", "WhatsApp"],
-                index=0 if st.session_state.platform == "" else 
-                     ["", "LinkedIn", "Twitter", "WhatsApp"].index(st.session_state.platform)
-            )
+            platform = st.selectbox("Select Platform:", PLATFORM_OPTIONS, index=option_index(PLATFORM_OPTIONS, st.session_state.platform))
             
             # Tone dropdown
-            tone = st.selectbox(
-                "Select Tone:",
-                ["", "Professional", "Casual", "Sarcastic", "Humorous", "Inspirational", 
-                 "Excited/Hyped", "Minimalist", "Storytelling", "Authoritative", "Marketing/Salesy"],
-                index=0 if st.session_state.tone == "" else 
-                     ["", "Professional", "Casual", "Sarcastic", "Humorous", "Inspirational", 
-                      "Excited/Hyped", "Minimalist", "Storytelling", "Authoritative", "Marketing/Salesy"].index(st.session_state.tone)
-            )
+            tone = st.selectbox("Select Tone:", TONE_OPTIONS, index=option_index(TONE_OPTIONS, st.session_state.tone))
             
             # Length dropdown
-            length_options = ["", "Short", "Medium", "Long", "Thread/Multiple Messages", "Custom Length"]
-            length = st.selectbox(
-                "Select Length:",
-                length_options,
-                index=0 if st.session_state.length == "" else 
-                     (length_options.index(st.session_state.length) if st.session_state.length in length_options else 0)
-            )
+            length = st.selectbox("Select Length:", LENGTH_OPTIONS, index=option_index(LENGTH_OPTIONS, st.session_state.length))
             
             # Custom word count input (conditionally shown)
             if length == "Custom Length":
@@ -349,6 +848,16 @@ def main():
                 )
                 st.session_state.custom_word_count = custom_word_count
             
+            # Show the post as it is written instead of waiting for the full completion
+            st.checkbox("Stream post as it is written", key="stream_post")
+            
+            # One structured request for the post and its image prompts saves a round trip when images are wanted
+            st.checkbox("Write image prompts together with the post", key="fused_prompts")
+            
+            # Opt-in speculative work so images are ready (or in flight) by the time they are requested
+            if st.checkbox("Prepare image prompts in the background", key="prefetch_prompts"):
+                st.checkbox("Also prepare the images (uses DALL-E credits even if unused)", key="prefetch_images")
+            
             # Create post and reset buttons
             col1_btn, col2_btn = st.columns(2)
             with col1_btn:
@@ -356,187 +865,51 @@ def main():
             with col2_btn:
                 reset = st.button("Reset", key="reset_btn")
             
+            # Cache effectiveness for this server process
+            cache_stats = get_completion_cache().stats()
+            stored = f", {cache_stats['entries']} stored" if cache_stats["entries"] is not None else ""
+            st.caption(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses{stored}")
+            if cache_stats.get("waits"):
+                st.caption(f"Shared with other replicas: {cache_stats['waits']} requests answered by one already running elsewhere")
+            flight_stats = get_single_flight().stats()
+            if flight_stats["coalesced"]:
+                st.caption(f"Shared requests: {flight_stats['coalesced']} joined one already in flight ({flight_stats['calls']} sent)")
+            route_counts = get_route_log().counts()
+            if route_counts:
+                st.caption("Model routes: " + ", ".join(f"{name} {count}" for name, count in sorted(route_counts.items())))
+            
+            # Where the time and tokens of this session's requests went
+            if st.checkbox("Show timings for this session", key="show_timings"):
+                timings_panel()
+            
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # A running post no longer matches once the inputs it was started with change
+        inputs = (title, platform, tone, length, st.session_state.custom_word_count)
+        post_job = active_job("post")
+        if post_job is not None and post_job.meta.get("inputs") != inputs:
+            cancel_job("post")
+            post_job = None
+        # Likewise an offer of similar past posts
+        if st.session_state.similar_offer is not None and st.session_state.similar_offer["inputs"] != inputs:
+            st.session_state.similar_offer = None
+        
         # Step 3: Display generated post
         with col2:
+            # Errors reported by background jobs since the last run
+            for notice in st.session_state.notices:
+                st.error(notice)
+            st.session_state.notices = []
+            
+            if post_job is not None:
+                job_panel("post")
+            elif st.session_state.similar_offer is not None:
+                similar_posts_offer(title, platform, tone, length, inputs)
+            
             if st.session_state.generated_post:
-                st.markdown('<div class="post-container">', unsafe_allow_html=True)
-                st.markdown('<h3>Step 3: Your Generated Post</h3>', unsafe_allow_html=True)
-                
-                # Display platform-specific header
-                if platform:
-                    icon = "🔗" if platform == "LinkedIn" else "🐦" if platform == "Twitter" else "💬"
-                    st.markdown(f'<div class="platform-header">{icon} {platform} Post</div>', unsafe_allow_html=True)
-                
-                # Display editable post
-                edited_post = st.text_area("Edit your post if needed:", value=st.session_state.generated_post, height=250)
-                st.session_state.edited_post = edited_post
-                
-                # Word count display
-                word_count = len(edited_post.split())
-                st.info(f"Current word count: {word_count} words")
-                
-                # Copy and regenerate post buttons
-                col1_action, col2_action = st.columns(2)
-                with col1_action:
-                    if st.button("Copy to Clipboard", key="copy_clipboard"):
-                        try:
-                            pyperclip.copy(edited_post)
-                            st.success("Post copied to clipboard!")
-                        except Exception:
-                            st.info("Clipboard functionality works when running locally. If you're using this in a web environment, please manually copy the text.")
-                
-                with col2_action:
-                    if st.button("Regenerate Post", key="regenerate_post_btn"):
-                        with st.spinner("Regenerating your post..."):
-                            try:
-                                # Define word count targets based on length selection
-                                word_count_targets = {
-                                    "Short": 75,  # ~75 words
-                                    "Medium": 175,  # ~175 words
-                                    "Long": 400,  # ~400 words
-                                    "Thread/Multiple Messages": 600,  # ~600 words (to be split into multiple messages)
-                                    "Custom Length": st.session_state.custom_word_count
-                                }
-                                
-                                target_words = word_count_targets.get(length, 150)  # Default to 150 if not found
-                                
-                                # Additional constraints based on platform
-                                platform_notes = ""
-                                if platform == "Twitter":
-                                    platform_notes = "Respect Twitter's character limit (280 chars). Use hashtags appropriately."
-                                elif platform == "LinkedIn":
-                                    platform_notes = "Professional tone with appropriate line breaks. Can include hashtags and tag people with @."
-                                elif platform == "WhatsApp":
-                                    platform_notes = "More casual, conversational and direct. Can use emojis naturally."
-                                
-                                # Additional notes for thread format
-                                thread_notes = ""
-                                if length == "Thread/Multiple Messages":
-                                    if platform == "Twitter":
-                                        thread_notes = "Format as 4-5 connected tweets in a thread, with each under 280 characters."
-                                    else:
-                                        thread_notes = "Format as 3-4 separate messages that build on each other."
-                                
-                                # Create prompt for GPT
-                                prompt = f"""
-                                Create a compelling social media post about "{title}" for {platform}.
-                                
-                                Tone: {tone}
-                                Target length: {target_words} words
-                                {platform_notes}
-                                {thread_notes}
-                                
-                                The post should be engaging, relevant to the platform, and formatted appropriately.
-                                Add emojis where they fit naturally with the tone and platform.
-                                For LinkedIn and Twitter, include 2-3 appropriate hashtags.
-                                For LinkedIn, make sure it has good paragraph breaks for readability.
-                                For WhatsApp, make it more personal and conversational.
-                                
-                                Return ONLY the post content with no explanations or additional text.
-                                """
-                                
-                                # Make request to GPT
-                                response = openai.chat.completions.create(
-                                    model="gpt-4",
-                                    messages=[
-                                        {"role": "system", "content": "You are an expert social media manager who creates engaging, platform-appropriate content."},
-                                        {"role": "user", "content": prompt}
-                                    ],
-                                    max_tokens=1500,
-                                    temperature=0.7
-                                )
-                                
-                                # Extract response
-                                generated_post = response.choices[0].message.content.strip()
-                                st.session_state.generated_post = generated_post
-                                st.session_state.edited_post = generated_post
-                                
-                                # Reset images when post is regenerated
-                                st.session_state.generated_images = []
-                                st.session_state.image_prompts = []
-                                
-                                # Refresh page to show results
-                                st.rerun()
-                                
-                            except Exception as e:
-                                st.error(f"Error regenerating post: {str(e)}")
-                        
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Step 4: Generated Images
-                st.markdown('<div class="image-container">', unsafe_allow_html=True)
-                st.markdown('<h3>Step 4: AI Generated Images</h3>', unsafe_allow_html=True)
-                
-                # Generate/Regenerate images button
-                if st.session_state.generated_images:
-                    if st.button("Regenerate Images for this Post", key="regenerate_images"):
-                        with st.status("Regenerating images...", expanded=True) as status:
-                            status.update(label="Creating new image prompts...", state="running")
-                            # Reduce to just 2 images to speed up generation
-                            image_prompts = generate_image_prompts(title, st.session_state.edited_post, num_images=2)
-                            st.session_state.image_prompts = image_prompts
-                            
-                            # Generate images for the prompts
-                            if image_prompts:
-                                all_images = []
-                                for i, prompt in enumerate(image_prompts):
-                                    status.update(label=f"Generating image {i+1} of {len(image_prompts)}...", state="running")
-                                    images = generate_dall_e_images(prompt, n=1)
-                                    all_images.extend(images)
-                                
-                                st.session_state.generated_images = all_images
-                                status.update(label="Images regenerated successfully!", state="complete")
-                                st.rerun()  # Refresh to show images
-                            else:
-                                status.update(label="Failed to generate image prompts. Please try again.", state="error")
-                else:
-                    if st.button("Generate Relevant Images for this Post", key="generate_images"):
-                        with st.status("Generating images...", expanded=True) as status:
-                            status.update(label="Creating image prompts...", state="running")
-                            # Reduce to just 2 images to speed up generation
-                            image_prompts = generate_image_prompts(title, st.session_state.edited_post, num_images=2)
-                            st.session_state.image_prompts = image_prompts
-                            
-                            # Generate images for the prompts
-                            if image_prompts:
-                                all_images = []
-                                for i, prompt in enumerate(image_prompts):
-                                    status.update(label=f"Generating image {i+1} of {len(image_prompts)}...", state="running")
-                                    images = generate_dall_e_images(prompt, n=1)
-                                    all_images.extend(images)
-                                
-                                st.session_state.generated_images = all_images
-                                status.update(label="Images generated successfully!", state="complete")
-                                st.rerun()  # Refresh to show images
-                            else:
-                                status.update(label="Failed to generate image prompts. Please try again.", state="error")
-                
-                # Display images with improved layout
-                if st.session_state.generated_images:
-                    # Create a container with custom CSS class for targeted styling
-                    image_display = st.container()
-                    with image_display:
-                        cols = st.columns(len(st.session_state.generated_images))
-                        
-                        for i, ((img_data, prompt), col) in enumerate(zip(zip(st.session_state.generated_images, st.session_state.image_prompts), cols)):
-                            try:
-                                # Convert base64 to image
-                                image_bytes = base64.b64decode(img_data)
-                                img = Image.open(BytesIO(image_bytes))
-                                
-                                # Display image in column with minimal wrapping
-                                with col:
-                                    # Display image without caption
-                                    st.image(img, use_container_width=True)
-                                    st.markdown(get_image_download_link(img, f"social_media_image_{i+1}.jpg", "Download Image"), unsafe_allow_html=True)
-                            except Exception as e:
-                                st.error(f"Error displaying image {i+1}: {str(e)}")
-
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+                # Each step reruns on its own, so typing in the editor does not redraw the images
+                post_editor(title, platform, tone, length, inputs)
+                image_gallery(title)
 
         # Generate post when Create Post button is clicked
         if create_post:
@@ -546,81 +919,17 @@ def main():
                 st.session_state.tone = tone
                 st.session_state.length = length
                 
-                # Show loading indicator
-                with st.spinner("Generating your post..."):
-                    try:
-                        # Define word count targets based on length selection
-                        word_count_targets = {
-                            "Short": 75,  # ~75 words
-                            "Medium": 175,  # ~175 words
-                            "Long": 400,  # ~400 words
-                            "Thread/Multiple Messages": 600,  # ~600 words (to be split into multiple messages)
-                            "Custom Length": st.session_state.custom_word_count
-                        }
-                        
-                        target_words = word_count_targets.get(length, 150)  # Default to 150 if not found
-                        
-                        # Additional constraints based on platform
-                        platform_notes = ""
-                        if platform == "Twitter":
-                            platform_notes = "Respect Twitter's character limit (280 chars). Use hashtags appropriately."
-                        elif platform == "LinkedIn":
-                            platform_notes = "Professional tone with appropriate line breaks. Can include hashtags and tag people with @."
-                        elif platform == "WhatsApp":
-                            platform_notes = "More casual, conversational and direct. Can use emojis naturally."
-                        
-                        # Additional notes for thread format
-                        thread_notes = ""
-                        if length == "Thread/Multiple Messages":
-                            if platform == "Twitter":
-                                thread_notes = "Format as 4-5 connected tweets in a thread, with each under 280 characters."
-                            else:
-                                thread_notes = "Format as 3-4 separate messages that build on each other."
-                        
-                        # Create prompt for GPT
-                        prompt = f"""
-                        Create a compelling social media post about "{title}" for {platform}.
-                        
-                        Tone: {tone}
-                        Target length: {target_words} words
-                        {platform_notes}
-                        {thread_notes}
-                        
-                        The post should be engaging, relevant to the platform, and formatted appropriately.
-                        Add emojis where they fit naturally with the tone and platform.
-                        For LinkedIn and Twitter, include 2-3 appropriate hashtags.
-                        For LinkedIn, make sure it has good paragraph breaks for readability.
-                        For WhatsApp, make it more personal and conversational.
-                        
-                        Return ONLY the post content with no explanations or additional text.
-                        """
-                        
-                        # Make request to GPT
-                        response = openai.chat.completions.create(
-                            model="gpt-4",
-                            messages=[
-                                {"role": "system", "content": "You are an expert social media manager who creates engaging, platform-appropriate content."},
-                                {"role": "user", "content": prompt}
-                            ],
-                            max_tokens=1500,
-                            temperature=0.7
-                        )
-                        
-                        # Extract response
-                        generated_post = response.choices[0].message.content.strip()
-                        st.session_state.generated_post = generated_post
-                        st.session_state.edited_post = generated_post
-                        
-                        # No longer automatically generate images
-                        # Just set the generated post and continue
-                        st.session_state.generated_images = []  # Reset any existing images
-                        st.session_state.image_prompts = []     # Reset any existing prompts
-                        
-                        # Refresh page to show results
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"Error generating post: {str(e)}")
+                # Written in the background so the post survives reruns and can be cancelled
+                matches = similar_past_posts(title, platform, tone, length)
+                if matches:
+                    # Nothing is sent to OpenAI until the user decides
+                    st.session_state.similar_offer = {"inputs": inputs, "matches": matches}
+                elif platform == ALL_PLATFORMS:
+                    # One concurrent pass for every platform; wall time is the slowest single call
+                    start_post_job(title, platform, tone, length, inputs, mode="variants")
+                else:
+                    start_post_job(title, platform, tone, length, inputs)
+                st.rerun()
             else:
                 st.error("Please fill in all fields (Topic, Platform, Tone, and Length).")
         
@@ -633,13 +942,19 @@ def main():
             st.session_state.platform = ""
             st.session_state.tone = ""
             st.session_state.length = ""
-            st.session_state.generated_images = []
-            st.session_state.image_prompts = []
+            st.session_state.post_variants = {}
+            st.session_state.edited_variants = {}
+            st.session_state.post_routes = {}
+            st.session_state.post_image_prompts = {}
+            st.session_state.history_ids = {}
+            st.session_state.similar_offer = None
+            cancel_job("post")
+            clear_prefetch()
+            reset_images()
             st.rerun()
 
 if __name__ == "__main__":
     try:
-        openai.api_key = st.session_state.get('api_key', '')
         main()
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
\ No newline at end of file
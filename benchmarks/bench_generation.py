@@ -0,0 +1,167 @@
+"""Offline load benchmark for the generation paths, run against the local mock OpenAI server.
+
+    python -m benchmarks.bench_generation --requests 50 --concurrency 8
+    python -m benchmarks.bench_generation --save baseline.json
+    python -m benchmarks.bench_generation --baseline baseline.json   # exits 1 on a p95 regression
+
+Reports p50/p95 latency, throughput and peak RSS for post creation (plain, coalesced and streamed),
+image prompt generation, DALL-E generation (final and draft) and the image display/download path.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_openai import MockConfig, start_mock_server
+
+# Quotas high enough that the limiter never throttles the benchmark itself
+UNTHROTTLED_LIMITS = {
+    model: {"rpm": 1_000_000, "tpm": None, "concurrency": 1024}
+    for model in ("gpt-4", "gpt-4o", "gpt-3.5-turbo", "dall-e-2", "dall-e-3", "models")
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KiB elsewhere
+
+
+# Run fn(i) `requests` times on `concurrency` threads and summarise the latencies
+def run_scenario(name, fn, requests, concurrency):
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(timed, i) for i in range(requests)]:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def build_scenarios(client, blob_dir):
+    from socialbuzz.blobstore import BlobStore
+    from socialbuzz.engine import (
+        build_post_messages,
+        request_dall_e_images,
+        request_image_prompts,
+        request_post,
+        stream_post_tokens,
+    )
+    from socialbuzz.images import encode_jpeg, make_thumbnail
+
+    messages = build_post_messages("AI Summit Delhi 2025", "LinkedIn", "Professional", "Long")
+    post = request_post(messages, client=client)
+    sample_images = request_dall_e_images("A square illustration of a tech summit", n=1, client=client)
+    store = BlobStore(blob_dir)
+
+    def display_and_download(i):
+        # Same work the gallery does for an image it has not cached yet, plus one download
+        handle = store.put(sample_images[0], owner=f"bench-{i}")
+        make_thumbnail(store.get(handle), 384)
+        encode_jpeg(store.get(handle))
+        store.release(f"bench-{i}")
+
+    # Each scenario measures its own requests; post_coalesced lets identical concurrent ones share a call
+    return {
+        "post": lambda i: request_post(messages, client=client, coalesce=False),
+        "post_coalesced": lambda i: request_post(messages, client=client),
+        "post_stream": lambda i: "".join(stream_post_tokens(messages, client=client, coalesce=False)),
+        "image_prompts": lambda i: request_image_prompts("AI Summit Delhi 2025", post, 2, client=client, coalesce=False),
+        "dall_e": lambda i: request_dall_e_images("A square illustration of a tech summit", n=1, client=client),
+        "dall_e_draft": lambda i: request_dall_e_images("A square illustration of a tech summit", client=client, mode="draft"),
+        "image_download": display_and_download,
+    }
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["scenario"]: row for row in json.load(f)}
+    regressions = []
+    for row in results:
+        before = baseline.get(row["scenario"])
+        if before and before["p95_ms"] and row["p95_ms"] and row["p95_ms"] > before["p95_ms"] * threshold:
+            regressions.append(f"{row['scenario']}: p95 {before['p95_ms']} ms -> {row['p95_ms']} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the generation paths against a local mock OpenAI server.")
+    parser.add_argument("--requests", type=int, default=40, help="requests per scenario (default: 40)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers (default: 8)")
+    parser.add_argument("--scenarios", nargs="+", help="subset of scenarios to run")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests that fail with 429/500")
+    parser.add_argument("--post-words", type=int, default=150)
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--respect-limits", action="store_true", help="keep the configured rate limits instead of lifting them")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p95 ratio counted as a regression (default: 1.2)")
+    args = parser.parse_args(argv)
+
+    if not args.respect_limits:
+        os.environ["SOCIALBUZZ_RATE_LIMITS"] = json.dumps(UNTHROTTLED_LIMITS)
+    # Keep mock posts out of the real history
+    workdir = tempfile.mkdtemp(prefix="socialbuzz-bench-")
+    os.environ["SOCIALBUZZ_HISTORY_PATH"] = os.path.join(workdir, "history.sqlite3")
+    os.environ["SOCIALBUZZ_HISTORY_BLOB_DIR"] = os.path.join(workdir, "history-images")
+
+    from socialbuzz.client import get_client
+
+    config = MockConfig(args.latency, args.jitter, args.error_rate, args.post_words, args.image_size)
+    server, base_url = start_mock_server(config)
+    client = get_client("sk-benchmark").with_options(base_url=base_url)
+
+    results = []
+    with tempfile.TemporaryDirectory() as blob_dir:
+        scenarios = build_scenarios(client, blob_dir)
+        for name in args.scenarios or scenarios:
+            row = run_scenario(name, scenarios[name], args.requests, args.concurrency)
+            results.append(row)
+            print(
+                f"{name:<15} p50 {row['p50_ms']:>8} ms   p95 {row['p95_ms']:>8} ms   "
+                f"{row['throughput_rps']:>7} req/s   errors {row['errors']:>3}   peak RSS {row['peak_rss_mb']} MB"
+            )
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Completion cache hit rate as the number of app replicas grows, with and without a shared backend.
+
+    python -m benchmarks.bench_replicas --replicas 1 2 4 --requests 40 --topics 20
+
+Each replica is a separate process with its own memory, like one `streamlit run app.py` behind a
+load balancer. All of them ask for posts on the same pool of topics, in their own random order,
+against one mock OpenAI server. With a shared backend (SOCIALBUZZ_SHARED_DIR) a post any replica
+has written, or is writing, is reused by the others, so API calls stay at one per topic however
+many replicas there are; without one, every replica pays for every topic itself.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_generation import UNTHROTTLED_LIMITS
+from benchmarks.mock_openai import MockConfig, start_mock_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# One replica's work, run inside its own process
+def run_replica(base_url, requests, topics, seed):
+    from socialbuzz.client import get_client
+    from socialbuzz.engine import generate_post
+    from socialbuzz.shared import open_completion_cache
+
+    client = get_client("sk-benchmark").with_options(base_url=base_url)
+    cache = open_completion_cache()
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for _ in range(requests):
+        topic = rng.randrange(topics)
+        generate_post(f"Benchmark topic {topic}", "LinkedIn", "Professional", "Short", client=client, cache=cache)
+    return {"seconds": time.perf_counter() - started, "stats": cache.stats()}
+
+
+def run_fleet(replicas, requests, topics, shared, config, base_url):
+    workdir = tempfile.mkdtemp(prefix="socialbuzz-replicas-")
+    config.requests.clear()
+    children = []
+    for i in range(replicas):
+        env = dict(
+            os.environ,
+            SOCIALBUZZ_RATE_LIMITS=json.dumps(UNTHROTTLED_LIMITS),
+            SOCIALBUZZ_CACHE_PATH=os.path.join(workdir, f"cache-{i}.sqlite3"),
+            SOCIALBUZZ_SHARED_DIR=os.path.join(workdir, "shared") if shared else "",
+            SOCIALBUZZ_HISTORY_PATH=os.path.join(workdir, "history.sqlite3"),
+            SOCIALBUZZ_HISTORY_BLOB_DIR=os.path.join(workdir, "history-images"),
+            SOCIALBUZZ_METRICS_FILE="",
+        )
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+        command = [sys.executable, "-m", "benchmarks.bench_replicas", "--child", base_url, str(requests), str(topics), str(i)]
+        children.append(subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True))
+    results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+    calls = sum(count for path, count in config.requests.items() if path.endswith("/chat/completions"))
+    total = replicas * requests
+    return {
+        "replicas": replicas,
+        "shared": shared,
+        "requests": total,
+        "api_calls": calls,
+        "hit_rate": round(1 - calls / total, 3),
+        "slowest_replica_s": round(max(r["seconds"] for r in results), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the completion cache hit rate across app replicas.")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4], help="fleet sizes to measure (default: 1 2 4)")
+    parser.add_argument("--requests", type=int, default=40, help="posts requested by each replica (default: 40)")
+    parser.add_argument("--topics", type=int, default=20, help="distinct topics the requests are drawn from (default: 20)")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock server latency in seconds")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        base_url, requests, topics, seed = args.child
+        print(json.dumps(run_replica(base_url, int(requests), int(topics), int(seed))))
+        return 0
+
+    config = MockConfig(latency=args.latency, jitter=0.0, post_words=60, stream_chunk_delay=0)
+    server, base_url = start_mock_server(config)
+    results = []
+    for shared in (False, True):
+        for replicas in args.replicas:
+            row = run_fleet(replicas, args.requests, args.topics, shared, config, base_url)
+            results.append(row)
+            print(
+                f"{'shared' if shared else 'per-process':<12} {replicas:>2} replicas   {row['requests']:>5} requests   "
+                f"{row['api_calls']:>4} API calls   hit rate {row['hit_rate']:>6}   slowest replica {row['slowest_replica_s']} s"
+            )
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
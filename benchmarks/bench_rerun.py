@@ -0,0 +1,170 @@
+"""Per-interaction rerun cost of the app, measured with Streamlit's AppTest against the mock OpenAI server.
+
+    python -m benchmarks.bench_rerun --images 4 --edits 20
+
+Drives the app to a generated post with a gallery of images, then types into the post
+editor and reports script time and bytes sent to the browser per keystroke, once as a
+full rerun (how every interaction ran before Step 3 and Step 4 became fragments) and
+once as the fragment rerun the browser now requests.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_generation import UNTHROTTLED_LIMITS, percentile
+from benchmarks.mock_openai import MockConfig, start_mock_server
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+EDITOR_LABEL = "Edit your post if needed:"
+
+
+def _measured_runner_class():
+    from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequests
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class MeasuredScriptRunner(LocalScriptRunner):
+        """Remembers the last runner (for its messages) and can scope runs to one fragment."""
+
+        last = None
+        fragment_id = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            MeasuredScriptRunner.last = self
+            if MeasuredScriptRunner.fragment_id:
+                # Drop the full run queued by the constructor; it would swallow the fragment request
+                self._requests = ScriptRequests()
+
+        def request_rerun(self, rerun_data):
+            if MeasuredScriptRunner.fragment_id:
+                rerun_data = dataclasses.replace(rerun_data, fragment_id=MeasuredScriptRunner.fragment_id)
+            return super().request_rerun(rerun_data)
+
+    return MeasuredScriptRunner
+
+
+def _button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"no button labelled {label!r}")
+
+
+# Poll until the app has collected every background job
+def _settle(at, timeout=60):
+    deadline = time.time() + timeout
+    while at.session_state.active_jobs:
+        if time.time() > deadline:
+            raise TimeoutError("background jobs did not finish")
+        time.sleep(0.2)
+        at.run()
+
+
+def _fragment_of(runner, label):
+    for msg in runner.forward_msgs():
+        element = msg.delta.new_element
+        if element.WhichOneof("type") == "text_area" and element.text_area.label == label:
+            return msg.delta.fragment_id
+    raise LookupError(f"no text area labelled {label!r}")
+
+
+# Sign in, write a post and generate its images
+def prepare_app(num_images):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    at.text_input[0].input("sk-benchmark")
+    _button(at, "Verify API Key").click().run()
+    at.text_input[0].input("AI Summit Delhi 2025")
+    selects = {s.label: s for s in at.selectbox}
+    selects["Select Platform:"].select("LinkedIn")
+    selects["Select Tone:"].select("Professional")
+    selects["Select Length:"].select("Long")
+    at.run()
+    _button(at, "Create Post").click().run()
+    # A history with a similar post offers it first; always measure a freshly written one
+    if at.session_state.similar_offer:
+        _button(at, "Write a new post").click().run()
+    _settle(at)
+    _button(at, "Generate Relevant Images for this Post").click().run()
+    _settle(at)
+
+    # The app makes two images per post; repeat them to fill a bigger gallery
+    images = list(at.session_state.generated_images)
+    if not images:
+        raise RuntimeError("image generation failed")
+    at.session_state.generated_images = [images[i % len(images)] for i in range(num_images)]
+    at.run()
+    return at
+
+
+def measure_edits(at, runner_class, edits, fragment):
+    post = next(t for t in at.text_area if t.label == EDITOR_LABEL).value
+    runner_class.fragment_id = _fragment_of(runner_class.last, EDITOR_LABEL) if fragment else None
+    times, sizes = [], []
+    try:
+        for i in range(edits):
+            editor = next(t for t in at.text_area if t.label == EDITOR_LABEL)
+            started = time.perf_counter()
+            editor.input(f"{post} {i}").run()
+            times.append(time.perf_counter() - started)
+            sizes.append(sum(msg.ByteSize() for msg in runner_class.last.forward_msgs()))
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+    finally:
+        runner_class.fragment_id = None
+    return {
+        "rerun": "fragment" if fragment else "full",
+        "edits": edits,
+        "p50_ms": round(percentile(times, 50) * 1000, 1),
+        "p95_ms": round(percentile(times, 95) * 1000, 1),
+        "bytes_per_edit": round(sum(sizes) / len(sizes)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-keystroke rerun cost of the post editor.")
+    parser.add_argument("--images", type=int, default=4, help="images in the gallery while editing (default: 4)")
+    parser.add_argument("--edits", type=int, default=20, help="keystrokes measured per mode (default: 20)")
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="socialbuzz-bench-")
+    server, base_url = start_mock_server(MockConfig(latency=0.05, jitter=0.0, post_words=150, image_size=args.image_size, stream_chunk_delay=0.0))
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "SOCIALBUZZ_RATE_LIMITS": json.dumps(UNTHROTTLED_LIMITS),
+        "SOCIALBUZZ_CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "SOCIALBUZZ_BLOB_DIR": os.path.join(workdir, "blobs"),
+        "SOCIALBUZZ_HISTORY_PATH": os.path.join(workdir, "history.sqlite3"),
+        "SOCIALBUZZ_HISTORY_BLOB_DIR": os.path.join(workdir, "history-images"),
+    })
+
+    import streamlit.testing.v1.app_test as app_test
+
+    runner_class = _measured_runner_class()
+    app_test.LocalScriptRunner = runner_class
+
+    at = prepare_app(args.images)
+    results = [measure_edits(at, runner_class, args.edits, fragment) for fragment in (False, True)]
+    server.shutdown()
+
+    for row in results:
+        print(f"{row['rerun']:<9} rerun   p50 {row['p50_ms']:>7} ms   p95 {row['p95_ms']:>7} ms   {row['bytes_per_edit']:>8} bytes/edit")
+    full, fragment = results
+    print(f"fragment rerun sends {full['bytes_per_edit'] / max(1, fragment['bytes_per_edit']):.1f}x fewer bytes, "
+          f"p50 {full['p50_ms'] / max(0.1, fragment['p50_ms']):.1f}x faster ({args.images} images loaded)")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
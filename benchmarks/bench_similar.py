@@ -0,0 +1,117 @@
+"""Latency of the near-duplicate lookup made before every new post, against a large history.
+
+    python -m benchmarks.bench_similar --posts 100000
+    python -m benchmarks.bench_similar --posts 100000 --vocabulary 8 --save similar.json
+
+Fills a history in a temporary directory with generated topics, all for the same platform, tone
+and length, then times History.find_similar for topics that have near-duplicates in it and for
+topics that do not. A small --vocabulary makes the history dense: many stored topics share words,
+so many of them collide with every lookup, which is the slow case for an LSH index.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "ai", "summit", "delhi", "launch", "product", "growth", "team", "hiring", "cloud", "security",
+    "startup", "funding", "design", "data", "mobile", "retail", "health", "climate", "energy", "finance",
+    "webinar", "meetup", "award", "partner", "update", "release", "roadmap", "community", "festival", "sale",
+)
+
+
+def random_title(rng, words):
+    return " ".join(rng.sample(words, rng.randint(3, 6))) + f" {rng.randint(2020, 2026)}"
+
+
+# Fill a history with `posts` topics in batches, without the cost of one transaction per post
+def fill_history(history, posts, words, rng):
+    conn = history._conn
+    conn.execute("BEGIN")
+    for _ in range(posts):
+        title = random_title(rng, words)
+        post_id = conn.execute(
+            "INSERT INTO posts (created_at, title, platform, tone, length, text) VALUES (?, ?, 'LinkedIn', 'Professional', 'Medium', ?)",
+            (time.time(), title, f"Post about {title}"),
+        ).lastrowid
+        history._insert_bands(post_id, title, "LinkedIn", "Professional", "Medium")
+    conn.execute("COMMIT")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(history, titles):
+    times, found = [], 0
+    for title in titles:
+        started = time.perf_counter()
+        matches = history.find_similar(title, "LinkedIn", "Professional", "Medium")
+        times.append((time.perf_counter() - started) * 1000)
+        found += bool(matches)
+    return {
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(percentile(times, 0.95), 3),
+        "max_ms": round(max(times), 3),
+        "found": found,
+        "lookups": len(titles),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time near-duplicate lookups against a large post history.")
+    parser.add_argument("--posts", type=int, default=100000, help="posts in the history (default: 100000)")
+    parser.add_argument("--lookups", type=int, default=500, help="lookups per kind (default: 500)")
+    parser.add_argument("--vocabulary", type=int, default=len(WORDS), help=f"distinct topic words, at most {len(WORDS)}; fewer is denser")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    from socialbuzz.history import History
+    from socialbuzz.similar import title_shingles
+
+    rng = random.Random(args.seed)
+    words = WORDS[:max(6, min(args.vocabulary, len(WORDS)))]
+    workdir = tempfile.mkdtemp(prefix="socialbuzz-bench-")
+    history = History(os.path.join(workdir, "history.sqlite3"), os.path.join(workdir, "history-images"))
+
+    started = time.perf_counter()
+    fill_history(history, args.posts, words, rng)
+    print(f"filled {args.posts} posts in {time.perf_counter() - started:.1f} s ({len(words)} topic words)")
+
+    # Opening the history loads the near-duplicate index into memory
+    started = time.perf_counter()
+    history = History(os.path.join(workdir, "history.sqlite3"), os.path.join(workdir, "history-images"))
+    open_seconds = time.perf_counter() - started
+    print(f"opened in {open_seconds:.2f} s")
+
+    # Stored topics with a word shuffled or a year changed, and topics made of words the history never uses
+    stored = [row[0] for row in history._conn.execute("SELECT title FROM posts ORDER BY random() LIMIT ?", (args.lookups,))]
+    near = [" ".join(reversed(title.split()[:-1])) + " " + str(int(title.split()[-1]) + 1) for title in stored]
+    novel = [f"quarterly {rng.choice(('tax', 'payroll', 'audit'))} deadline reminder {i}" for i in range(args.lookups)]
+
+    title_shingles.cache_clear()
+    results = {
+        "posts": args.posts,
+        "vocabulary": len(words),
+        "open_s": round(open_seconds, 3),
+        "near_duplicate": measure(history, near),
+        "novel": measure(history, novel),
+    }
+    for kind in ("near_duplicate", "novel"):
+        row = results[kind]
+        print(f"{kind:<15} p50 {row['p50_ms']:>7} ms   p95 {row['p95_ms']:>7} ms   max {row['max_ms']:>7} ms   matched {row['found']}/{row['lookups']}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
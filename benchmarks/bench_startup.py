@@ -0,0 +1,132 @@
+"""Cold start cost of a new app replica: import time and time to first paint, each in a fresh process.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --save startup.json
+
+Every run starts a new Python process, imports Streamlit and the app's own modules, then runs
+the script once with Streamlit's AppTest (the sign-in page a new session sees first) and once
+more (a warm rerun). Reports the median of each phase, the bytes sent to the browser and which
+heavy optional modules the first paint pulled in.
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Modules that should only load once the user does something that needs them
+HEAVY_MODULES = ("openai", "PIL", "pyperclip", "requests", "pandas")
+
+
+# Top-level modules app.py imports, other than Streamlit itself
+def app_imports(path=APP_PATH):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [m for m in dict.fromkeys(modules) if m.split(".")[0] != "streamlit"]
+
+
+# One measurement, run inside the fresh process
+def measure_once():
+    started = time.perf_counter()
+    importlib.import_module("streamlit")
+    streamlit_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for module in app_imports():
+        importlib.import_module(module)
+    app_imports_s = time.perf_counter() - started
+
+    import streamlit.testing.v1.app_test as app_test
+    from benchmarks.bench_rerun import _measured_runner_class
+    from streamlit.testing.v1 import AppTest
+
+    runner_class = _measured_runner_class()
+    app_test.LocalScriptRunner = runner_class
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    started = time.perf_counter()
+    at.run()
+    first_paint_s = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    first_paint_bytes = sum(msg.ByteSize() for msg in runner_class.last.forward_msgs())
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    started = time.perf_counter()
+    at.run()
+    rerun_s = time.perf_counter() - started
+    rerun_bytes = sum(msg.ByteSize() for msg in runner_class.last.forward_msgs())
+
+    return {
+        "streamlit_import_ms": round(streamlit_s * 1000, 1),
+        "app_import_ms": round(app_imports_s * 1000, 1),
+        "first_paint_ms": round(first_paint_s * 1000, 1),
+        "rerun_ms": round(rerun_s * 1000, 1),
+        "first_paint_bytes": first_paint_bytes,
+        "rerun_bytes": rerun_bytes,
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def run_fresh_process(workdir):
+    env = dict(
+        os.environ,
+        SOCIALBUZZ_CACHE_PATH=os.path.join(workdir, "cache.sqlite3"),
+        SOCIALBUZZ_BLOB_DIR=os.path.join(workdir, "blobs"),
+        SOCIALBUZZ_HISTORY_PATH=os.path.join(workdir, "history.sqlite3"),
+        SOCIALBUZZ_HISTORY_BLOB_DIR=os.path.join(workdir, "history-images"),
+        SOCIALBUZZ_METRICS_FILE="",
+    )
+    root = os.path.dirname(APP_PATH)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+        cwd=root, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and first paint of a fresh app process.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to measure (default: 5)")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_once()))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="socialbuzz-bench-")
+    runs = [run_fresh_process(workdir) for _ in range(args.runs)]
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key != "heavy_modules_loaded"}
+    summary["heavy_modules_loaded"] = sorted({m for run in runs for m in run["heavy_modules_loaded"]})
+
+    print(f"streamlit import  {summary['streamlit_import_ms']:>8} ms")
+    print(f"app imports       {summary['app_import_ms']:>8} ms")
+    print(f"first paint       {summary['first_paint_ms']:>8} ms   {summary['first_paint_bytes']:>8} bytes")
+    print(f"warm rerun        {summary['rerun_ms']:>8} ms   {summary['rerun_bytes']:>8} bytes")
+    print(f"heavy modules loaded by first paint: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
+    print(f"(median of {args.runs} fresh processes)")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "runs": runs}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
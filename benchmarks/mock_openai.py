@@ -0,0 +1,176 @@
+"""Local stand-in for the OpenAI chat, images and models endpoints.
+
+Point a client at it with base_url="http://127.0.0.1:<port>/v1". Latency, error rate
+and payload sizes are configurable so the app can be load tested without spending money.
+
+    python -m benchmarks.mock_openai --port 8765 --latency 0.5 --error-rate 0.05
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+WORDS = ("launch", "community", "growth", "innovation", "team", "summit", "future", "ideas", "#AI", "🚀")
+
+
+class MockConfig:
+    """Behaviour of the mock server; attributes may be changed while it is running."""
+
+    def __init__(self, latency=0.2, jitter=0.1, error_rate=0.0, post_words=150, image_size=1024, stream_chunk_delay=0.01):
+        self.latency = latency  # Seconds before the first byte of every response
+        self.jitter = jitter  # Uniform +/- spread around the latency
+        self.error_rate = error_rate  # Fraction of requests answered with 429 or 500
+        self.post_words = post_words  # Words in each chat completion
+        self.image_size = image_size  # Width and height of generated images
+        self.stream_chunk_delay = stream_chunk_delay  # Seconds between streamed chunks
+        self.requests = Counter()  # POST requests received per path
+        self.requests_lock = threading.Lock()
+
+
+def _noise_png(size):
+    from PIL import Image  # Imported here so bench_startup can tell whether the app itself loads Pillow
+
+    # Random pixels so the PNG has a realistic (incompressible) size
+    img = Image.frombytes("RGB", (size, size), random.randbytes(size * size * 3))
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode("ascii")
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    config = MockConfig()
+    _images = {}
+    _images_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _wait(self):
+        config = self.config
+        time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+    # Maybe answer with an error instead; returns True if it did
+    def _maybe_fail(self):
+        if random.random() >= self.config.error_rate:
+            return False
+        if random.random() < 0.5:
+            self._send_json({"error": {"message": "Rate limit reached", "type": "rate_limit"}}, 429, {"retry-after-ms": "200"})
+        else:
+            self._send_json({"error": {"message": "The server had an error", "type": "server_error"}}, 500)
+        return True
+
+    # Requested sizes below the configured image_size (e.g. drafts) are honoured
+    def _image(self, requested=None):
+        size = self.config.image_size
+        if requested:
+            size = min(size, int(str(requested).split("x")[0]))
+        with self._images_lock:
+            if size not in self._images:
+                self._images[size] = _noise_png(size)
+            return self._images[size]
+
+    def _text(self, body):
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            # Post plus image prompts, as many as the schema asks for
+            prompts_schema = response_format["json_schema"]["schema"]["properties"]["image_prompts"]
+            prompts = [f"A vivid square illustration of {random.choice(WORDS)}" for _ in range(prompts_schema.get("minItems", 2))]
+            post = " ".join(random.choice(WORDS) for _ in range(self.config.post_words))
+            return json.dumps({"post": post, "image_prompts": prompts})
+        if "numbered list" in json.dumps(body.get("messages", [])):
+            return "\n".join(f"{i}. A vivid square illustration of {random.choice(WORDS)}" for i in range(1, 4))
+        return " ".join(random.choice(WORDS) for _ in range(self.config.post_words))
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._wait()
+            models = ["gpt-4", "gpt-4o", "gpt-3.5-turbo", "dall-e-2", "dall-e-3"]
+            self._send_json({"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "mock"} for m in models]})
+        else:
+            self._send_json({"error": {"message": "Not found"}}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.config.requests_lock:
+            self.config.requests[self.path] += 1
+        self._wait()
+        if self._maybe_fail():
+            return
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/images/generations"):
+            data = [{"b64_json": self._image(body.get("size")), "revised_prompt": body.get("prompt")} for _ in range(body.get("n", 1))]
+            self._send_json({"created": int(time.time()), "data": data})
+        else:
+            self._send_json({"error": {"message": "Not found"}}, 404)
+
+    def _chat(self, body):
+        text = self._text(body)
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4, "total_tokens": prompt_tokens + len(text) // 4}
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "gpt-4")}
+        if not body.get("stream"):
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            self._send_json({**base, "object": "chat.completion", "choices": [choice], "usage": usage})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in text.split(" "):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.config.stream_chunk_delay)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+# Start the server on a background thread; returns (server, base_url)
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"config": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--post-words", type=int, default=150)
+    parser.add_argument("--image-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.jitter, args.error_rate, args.post_words, args.image_size)
+    server, base_url = start_mock_server(config, args.host, args.port)
+    print(f"Mock OpenAI server listening on {base_url} (set OPENAI_BASE_URL to use it from the app)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Generation engine shared by the Streamlit app and command line tools."""
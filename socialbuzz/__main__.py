@@ -0,0 +1,69 @@
+"""Command line entry point: python -m socialbuzz <command> ..."""
+import argparse
+import os
+import sys
+
+from socialbuzz.batch import run_batch
+from socialbuzz.client import get_client
+from socialbuzz.export import batch_records, export_records, history_records
+from socialbuzz.history import History
+from socialbuzz.shared import open_completion_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m socialbuzz", description="Social media post generator tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Generate posts for every row of a CSV or JSONL file.")
+    batch.add_argument("input", help="CSV or JSONL file with title, platform, tone and length columns")
+    batch.add_argument("-o", "--output", help="JSONL results file (default: <input>.results.jsonl); reruns resume from it")
+    batch.add_argument("-w", "--workers", type=int, default=4, help="number of concurrent requests (default: 4)")
+    batch.add_argument("--no-cache", action="store_true", help="always request fresh completions")
+
+    prune = subparsers.add_parser("history-prune", help="Delete old entries from the post history.")
+    prune.add_argument("--days", type=float, help="keep posts from the last N days (default: SOCIALBUZZ_HISTORY_DAYS)")
+    prune.add_argument("--max-entries", type=int, help="keep at most N posts (default: SOCIALBUZZ_HISTORY_MAX_ENTRIES)")
+
+    export = subparsers.add_parser("export", help="Write posts, image prompts and images to a ZIP bundle.")
+    export.add_argument("-o", "--output", required=True, help="ZIP file to write")
+    source = export.add_mutually_exclusive_group(required=True)
+    source.add_argument("--history", action="store_true", help="export the post history (with images)")
+    source.add_argument("--batch", metavar="RESULTS", help="export the posts of a batch results JSONL file")
+    export.add_argument("--query", default="", help="with --history, only posts matching this search")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        if not os.environ.get("OPENAI_API_KEY"):
+            parser.error("OPENAI_API_KEY must be set")
+        output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+        counts = run_batch(
+            args.input,
+            output,
+            workers=args.workers,
+            client=get_client(os.environ["OPENAI_API_KEY"]),
+            cache=open_completion_cache(),
+            bypass_cache=args.no_cache,
+        )
+        print(f"Done: {counts['ok']} generated, {counts['error']} failed. Results in {output}", file=sys.stderr)
+        return 1 if counts["error"] else 0
+
+    if args.command == "export":
+        if args.batch:
+            counts = export_records(args.output, batch_records(args.batch))
+        else:
+            history = History()
+            counts = export_records(args.output, history_records(history, args.query), history.load_image)
+        print(f"Exported {counts['posts']} posts and {counts['images']} images to {args.output}", file=sys.stderr)
+        if counts["missing_images"]:
+            print(f"{counts['missing_images']} images had already been pruned", file=sys.stderr)
+        return 0
+
+    if args.command == "history-prune":
+        removed = History().prune(max_age_days=args.days, max_entries=args.max_entries)
+        print(f"Removed {removed} posts from the history.", file=sys.stderr)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
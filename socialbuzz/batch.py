@@ -0,0 +1,130 @@
+"""Headless batch generation of posts from a CSV or JSONL content calendar."""
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from socialbuzz.engine import choose_post_route, generate_post
+
+REQUIRED_FIELDS = ("title", "platform", "tone", "length")
+
+
+# Read (title, platform, tone, length) rows from a .csv or .jsonl file
+def read_rows(path):
+    rows = []
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows.extend(csv.DictReader(f))
+
+    for number, row in enumerate(rows, start=1):
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"{path}: row {number} is missing {', '.join(missing)}")
+    return rows
+
+
+# Stable id for a row: its own "id" column, or a hash of the generation inputs
+def row_id(row):
+    if row.get("id"):
+        return str(row["id"])
+    key = "\x1f".join(str(row.get(field, "")) for field in REQUIRED_FIELDS + ("custom_word_count",))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# Ids already written successfully to the output file, so an interrupted run can resume
+def completed_ids(output_path):
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Partial line left behind by an interrupted write
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _generate(row, client, cache, bypass_cache):
+    started = time.time()
+    custom_word_count = int(row.get("custom_word_count") or 100)
+    route = choose_post_route(row["platform"], row["length"], custom_word_count)
+    post = generate_post(
+        row["title"],
+        row["platform"],
+        row["tone"],
+        row["length"],
+        custom_word_count=custom_word_count,
+        client=client,
+        cache=cache,
+        bypass_cache=bypass_cache,
+        route=route,
+    )
+    return post, route, time.time() - started
+
+
+# Generate every pending row concurrently and append each result to the output as it completes
+def run_batch(input_path, output_path, workers=4, client=None, cache=None, bypass_cache=False, log=sys.stderr):
+    rows = read_rows(input_path)
+    done = completed_ids(output_path)
+    pending = {}
+    for row in rows:
+        rid = row_id(row)
+        if rid not in done and rid not in pending:
+            pending[rid] = row
+
+    print(f"{len(rows)} rows, {len(rows) - len(pending)} already done, {len(pending)} to generate", file=log)
+    if not pending:
+        return {"ok": 0, "error": 0}
+
+    counts = {"ok": 0, "error": 0}
+    write_lock = threading.Lock()
+
+    # Append one finished row to the output
+    def record_result(future, rid):
+        row = pending[rid]
+        record = {"id": rid, **{field: row[field] for field in REQUIRED_FIELDS}}
+        try:
+            post, route, elapsed = future.result()
+            record.update(status="ok", post=post, route=route.name, model=route.model, seconds=round(elapsed, 3))
+        except Exception as e:
+            record.update(status="error", error=str(e))
+        counts[record["status"]] += 1
+
+        with write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        print(f"[{counts['ok'] + counts['error']}/{len(pending)}] {record['status']}: {row['title']} ({row['platform']})", file=log)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        futures = {executor.submit(_generate, row, client, cache, bypass_cache): rid for rid, row in pending.items()}
+        recorded = set()
+        try:
+            for future in as_completed(futures):
+                recorded.add(future)
+                record_result(future, futures[future])
+        except BaseException:
+            # Interrupted (e.g. Ctrl-C): drop the rows not started yet instead of generating (and paying for)
+            # them, let the ones in flight finish and keep everything already paid for so a resumed run skips it
+            print("Interrupted; finishing the rows in flight", file=log)
+            executor.shutdown(wait=True, cancel_futures=True)
+            for future, rid in futures.items():
+                if future not in recorded and not future.cancelled():
+                    record_result(future, rid)
+            print(f"Interrupted; {counts['ok']} rows saved, run again to resume", file=log)
+            raise
+        executor.shutdown()
+
+    return counts
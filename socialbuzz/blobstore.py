@@ -0,0 +1,134 @@
+"""Content-addressed blob store for generated images."""
+import os
+import tempfile
+import threading
+import time
+
+from socialbuzz.images import image_digest
+
+# Images spill to this directory unless SOCIALBUZZ_BLOB_DIR is set to an empty string (memory only)
+DEFAULT_BLOB_DIR = os.environ.get("SOCIALBUZZ_BLOB_DIR", os.path.join(".socialbuzz", "blobs"))
+# Seconds after which a file on disk that no owner in this process claims is deleted (left by an earlier
+# run that crashed or was restarted); generous, since other processes started in the same directory share it
+DEFAULT_ORPHAN_TTL = float(os.environ.get("SOCIALBUZZ_BLOB_ORPHAN_TTL", str(24 * 3600)))
+ORPHAN_SWEEP_INTERVAL = 3600  # Seconds between scans of the directory for orphaned files
+
+
+class BlobStore:
+    """Stores image bytes once per content hash and tracks which sessions still use them."""
+
+    # With a shared backend (socialbuzz.shared), every blob is also written there so other replicas can read it
+    def __init__(self, root=DEFAULT_BLOB_DIR, sweep_interval=60, backend=None, orphan_ttl=DEFAULT_ORPHAN_TTL):
+        self.root = root or None
+        self.sweep_interval = sweep_interval
+        self.backend = backend
+        self.orphan_ttl = orphan_ttl
+        self._memory = {}
+        self._owners = {}  # digest -> set of owner ids
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._last_orphan_sweep = 0.0
+        if self.root:
+            os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    # Store bytes and return their handle; identical content is only kept once
+    def put(self, data, owner=None):
+        digest = image_digest(data)
+        with self._lock:
+            if self.root:
+                path = self._path(digest)
+                try:
+                    os.utime(path)  # Already on disk; keep it from looking orphaned
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    # Write to a temporary file first so readers never see a partial blob
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+            else:
+                self._memory[digest] = bytes(data)
+            if owner is not None:
+                self._owners.setdefault(digest, set()).add(owner)
+        if self.backend is not None:
+            self.backend.put_blob(digest, data)
+        return digest
+
+    # Return the bytes for a handle, from the shared backend if this process does not have them;
+    # raises KeyError once the blob has been evicted everywhere
+    def get(self, digest):
+        try:
+            if not self.root:
+                return self._memory[digest]
+            try:
+                with open(self._path(digest), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                raise KeyError(digest) from None
+        except KeyError:
+            if self.backend is None:
+                raise
+            return self.backend.get_blob(digest)
+
+    # Drop an owner's claim on some (or all) of its blobs and delete blobs nobody uses any more
+    # (here; a shared backend expires its copies on its own)
+    def release(self, owner, digests=None):
+        with self._lock:
+            for digest in list(self._owners if digests is None else digests):
+                owners = self._owners.get(digest)
+                if owners is None:
+                    continue
+                owners.discard(owner)
+                if not owners:
+                    del self._owners[digest]
+                    self._delete(digest)
+
+    # Release every owner for which is_alive(owner) is false; runs at most once per sweep_interval.
+    # Only for stores whose blobs all have owners: files nobody here claims are deleted once they are old.
+    def sweep(self, is_alive):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        with self._lock:
+            owners = {owner for digest_owners in self._owners.values() for owner in digest_owners}
+        for owner in owners:
+            if not is_alive(owner):
+                self.release(owner)
+        if self.root and now - self._last_orphan_sweep >= ORPHAN_SWEEP_INTERVAL:
+            self.remove_orphans()
+
+    # Delete files on disk that no owner claims and that have not been written for orphan_ttl seconds:
+    # blobs of sessions from before a restart or crash, and temporary files of interrupted writes
+    def remove_orphans(self):
+        self._last_orphan_sweep = time.time()
+        cutoff = self._last_orphan_sweep - self.orphan_ttl
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                with self._lock:
+                    if name in self._owners:
+                        continue
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    # Delete a blob outright, whoever still owns it (for stores that track use themselves)
+    def discard(self, digest):
+        with self._lock:
+            self._owners.pop(digest, None)
+            self._delete(digest)
+
+    def _delete(self, digest):
+        if not self.root:
+            self._memory.pop(digest, None)
+            return
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
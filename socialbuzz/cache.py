@@ -0,0 +1,103 @@
+"""Persistent, content-addressed cache for chat completions."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Defaults can be overridden per deployment through the environment
+DEFAULT_CACHE_PATH = os.environ.get("SOCIALBUZZ_CACHE_PATH", os.path.join(".socialbuzz", "completions.sqlite3"))
+DEFAULT_CACHE_TTL = float(os.environ.get("SOCIALBUZZ_CACHE_TTL", str(7 * 24 * 3600)))  # One week
+DEFAULT_CACHE_MAX_ENTRIES = int(os.environ.get("SOCIALBUZZ_CACHE_MAX_ENTRIES", "5000"))
+
+
+# Build the cache key from everything that influences the completion
+def make_cache_key(model, messages, **params):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """SQLite-backed completion cache with TTL expiry and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all script threads; access is serialised by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+
+    # Return the cached value, or None on a miss or an expired entry
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    # Store a value and evict expired and least recently used entries beyond the size limit
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                " SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+
+    # Store the result of fn(). A cache only this process uses has no other replicas to share the
+    # work with; socialbuzz.shared.SharedCompletionCache does.
+    def compute_once(self, key, fn):
+        value = fn()
+        self.set(key, value)
+        return value
+
+    # Yield the tokens of make_stream(on_cancel) and store the text once it has been received in full
+    def stream_once(self, key, make_stream, on_cancel=None):
+        parts = []
+        for token in make_stream(on_cancel):
+            parts.append(token)
+            yield token
+        self.set(key, "".join(parts))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
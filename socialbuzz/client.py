@@ -0,0 +1,309 @@
+"""Shared OpenAI call layer: process-wide rate limits, per-model concurrency caps and retries."""
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+# Per-model quotas. rpm counts requests (images for DALL-E), tpm counts prompt + completion tokens.
+# Override with e.g. SOCIALBUZZ_RATE_LIMITS='{"gpt-4": {"rpm": 200, "tpm": 40000, "concurrency": 4}}'
+DEFAULT_LIMITS = {
+    "gpt-4": {"rpm": 500, "tpm": 10000, "concurrency": 8},
+    "gpt-3.5-turbo": {"rpm": 3500, "tpm": 200000, "concurrency": 16},
+    "gpt-4o": {"rpm": 500, "tpm": 30000, "concurrency": 8},
+    "dall-e-2": {"rpm": 50, "tpm": None, "concurrency": 4},
+    "dall-e-3": {"rpm": 7, "tpm": None, "concurrency": 4},
+}
+FALLBACK_LIMITS = {"rpm": 500, "tpm": None, "concurrency": 8}
+
+MAX_RETRIES = int(os.environ.get("SOCIALBUZZ_MAX_RETRIES", "5"))
+CLIENT_POOL_SIZE = int(os.environ.get("SOCIALBUZZ_CLIENT_POOL_SIZE", "64"))
+KEY_VERIFY_TTL = float(os.environ.get("SOCIALBUZZ_KEY_VERIFY_TTL", "3600"))  # Seconds a verified key stays verified
+BASE_DELAY = 1.0  # Seconds before the first retry; doubles on each attempt
+MAX_DELAY = 60.0
+
+
+class StreamAborted(Exception):
+    """Raised by a streamed completion that was aborted through its on_cancel callback."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Block until `amount` tokens are available, then take them
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # An oversized request must still be able to run eventually
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    # Return tokens that were reserved but not used
+    def refund(self, amount):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelLimiter:
+    """Request and token buckets plus a concurrency cap for one model."""
+
+    def __init__(self, rpm, tpm=None, concurrency=8):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.paused_until = 0.0
+
+    # After a 429 with Retry-After every caller for this model waits, not just the one that was rejected
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_if_paused(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RateLimiter:
+    """Holds one ModelLimiter per model for the whole process."""
+
+    def __init__(self, limits=None):
+        self.limits = limits if limits is not None else load_limits()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model):
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = ModelLimiter(**{**FALLBACK_LIMITS, **self.limits.get(model, {})})
+            return self._models[model]
+
+
+def load_limits():
+    limits = {model: dict(values) for model, values in DEFAULT_LIMITS.items()}
+    overrides = os.environ.get("SOCIALBUZZ_RATE_LIMITS")
+    if overrides:
+        for model, values in json.loads(overrides).items():
+            limits.setdefault(model, {}).update(values)
+    return limits
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+# Process-wide limiter shared by every Streamlit session and worker thread
+def get_rate_limiter():
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+
+# Rough token count used to reserve quota before the real usage is known
+def estimate_tokens(messages, max_tokens=0):
+    return sum(len(message.get("content") or "") for message in messages) // 4 + (max_tokens or 0)
+
+
+# The OpenAI SDK is imported on first use: it is the slowest import in the app and the sign-in page does not need it
+def _openai():
+    import openai
+    return openai
+
+
+def _is_retryable(error):
+    openai = _openai()
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 409 or error.status_code >= 500)
+
+
+# Seconds the server asked us to wait, if it said so
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form; fall back to exponential backoff
+    return None
+
+
+# Run request() under the model's limits, retrying transient failures with backoff and jitter
+def call_with_retry(request, model, cost=1, tokens=0, max_retries=None, use_slot=True):
+    limiter = get_rate_limiter().for_model(model)
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        limiter.wait_if_paused()
+        limiter.requests.acquire(cost)
+        if tokens and limiter.tokens:
+            limiter.tokens.acquire(tokens)
+        if use_slot:
+            limiter.slots.acquire()
+        try:
+            return request()
+        except Exception as e:
+            if tokens and limiter.tokens:
+                limiter.tokens.refund(tokens)  # Nothing was generated; the next attempt reserves again
+            if not _is_retryable(e) or attempt >= max_retries:
+                raise
+            delay = _retry_after(e)
+            if delay is not None:
+                limiter.pause(delay)
+            else:
+                delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))  # Full jitter
+            attempt += 1
+        finally:
+            if use_slot:
+                limiter.slots.release()
+        time.sleep(delay)
+
+
+# Identifies an API key in caches without keeping the key itself as the lookup value
+def key_fingerprint(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+_clients = OrderedDict()  # fingerprint -> OpenAI client, least recently used first
+_clients_lock = threading.Lock()
+
+
+# One OpenAI client per API key, reused by every session with that key so connections are pooled
+def get_client(api_key):
+    fingerprint = key_fingerprint(api_key)
+    with _clients_lock:
+        client = _clients.get(fingerprint)
+        if client is None:
+            # The SDK's own retries would multiply ours, so they are switched off
+            client = _openai().OpenAI(api_key=api_key, max_retries=0)
+            _clients[fingerprint] = client
+            while len(_clients) > CLIENT_POOL_SIZE:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(fingerprint)
+        return client
+
+
+_verified_keys = {}  # fingerprint -> expiry time
+_verified_keys_lock = threading.Lock()
+
+
+# Check an API key with a free models.list call; successful checks are remembered for KEY_VERIFY_TTL
+def verify_api_key(api_key, ttl=None):
+    ttl = KEY_VERIFY_TTL if ttl is None else ttl
+    fingerprint = key_fingerprint(api_key)
+    now = time.time()
+    with _verified_keys_lock:
+        if _verified_keys.get(fingerprint, 0) > now:
+            return
+    client = get_client(api_key)
+    call_with_retry(lambda: client.models.list(), "models")
+    with _verified_keys_lock:
+        _verified_keys[fingerprint] = now + ttl
+
+
+def _sdk(client):
+    return client if client is not None else _openai()
+
+
+# Return the part of a reservation a completion did not use; all of it when its usage is unknown
+def _refund_unused(limiter, reserved, usage):
+    used = getattr(usage, "total_tokens", None) or 0
+    if limiter.tokens and used < reserved:
+        limiter.tokens.refund(reserved - used)
+
+
+# Chat completion through the shared limiter; unused reserved tokens are returned afterwards
+def chat_completion(client=None, **params):
+    model = params["model"]
+    reserved = estimate_tokens(params["messages"], params.get("max_tokens"))
+    response = call_with_retry(lambda: _sdk(client).chat.completions.create(**params), model, tokens=reserved)
+    _refund_unused(get_rate_limiter().for_model(model), reserved, getattr(response, "usage", None))
+    return response
+
+
+# Break the connection under a stream being read on another thread. Closing the stream would only take
+# effect once the next chunk arrives; shutting the socket down wakes the blocked read at once.
+def _abort_stream(stream):
+    network_stream = stream.response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    if sock is None:
+        stream.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # Already closed
+
+
+# Streamed chat completion; the concurrency slot is held until the stream has been read or closed.
+# Unused reserved tokens are returned from the usage chunk (requested with stream_options={"include_usage": True}).
+# on_cancel(callback) is handed the stream's close, so another thread can abort the request mid-stream.
+def stream_chat_completion(client=None, on_cancel=None, **params):
+    model = params["model"]
+    limiter = get_rate_limiter().for_model(model)
+    reserved = estimate_tokens(params["messages"], params.get("max_tokens"))
+    limiter.slots.acquire()
+    try:
+        stream = call_with_retry(
+            lambda: _sdk(client).chat.completions.create(stream=True, **params), model, tokens=reserved, use_slot=False
+        )
+        aborted = threading.Event()
+        reading = True
+        lock = threading.Lock()
+
+        # Once the stream is closed its connection may serve other requests, so it is left alone
+        def abort():
+            with lock:
+                if reading:
+                    aborted.set()
+                    _abort_stream(stream)
+
+        if on_cancel is not None:
+            on_cancel(abort)
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        finally:
+            with lock:
+                reading = False
+            stream.close()
+            _refund_unused(limiter, reserved, usage)
+        # A broken connection can look like the end of the stream; the text so far is not the whole completion
+        if aborted.is_set():
+            raise StreamAborted()
+    finally:
+        limiter.slots.release()
+
+
+# Image generation through the shared limiter; each image counts against the model's per-minute quota
+def generate_images(client=None, **params):
+    return call_with_retry(lambda: _sdk(client).images.generate(**params), params["model"], cost=params.get("n", 1))
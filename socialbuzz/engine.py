@@ -0,0 +1,443 @@
+"""Prompt construction and OpenAI calls for posts and images, independent of the UI."""
+import contextvars
+import functools
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from socialbuzz.cache import make_cache_key
+from socialbuzz.client import chat_completion, generate_images, stream_chat_completion
+from socialbuzz.images import decode_image
+from socialbuzz.metrics import image_cost, span
+from socialbuzz.routing import route_post
+from socialbuzz.settings import get_settings
+from socialbuzz.singleflight import get_single_flight
+
+# Platforms a post can be written for
+PLATFORMS = ["LinkedIn", "Twitter", "WhatsApp"]
+
+# Word count targets for each length option (Custom Length uses the user's own number)
+WORD_COUNT_TARGETS = {
+    "Short": 75,  # ~75 words
+    "Medium": 175,  # ~175 words
+    "Long": 400,  # ~400 words
+    "Thread/Multiple Messages": 600,  # ~600 words (to be split into multiple messages)
+}
+
+# Model and parameters for post requests made without a route (also part of the cache key)
+POST_MODEL = "gpt-4"
+POST_PARAMS = {"max_tokens": 1500, "temperature": 0.7}
+
+# Maximum number of DALL-E requests in flight at once per caller (keeps us under the org's images-per-minute limit)
+IMAGE_CONCURRENCY = int(os.environ.get("SOCIALBUZZ_IMAGE_CONCURRENCY", "4"))
+
+# Faster model for image prompts
+IMAGE_PROMPT_MODEL = "gpt-3.5-turbo"
+IMAGE_PROMPT_PARAMS = {"max_tokens": 500, "temperature": 0.7}
+
+# Prompt templates, filled in with str.format. Their exact text is part of every cache key,
+# so a wording change starts a fresh set of cached completions.
+POST_SYSTEM_PROMPT = "You are an expert social media manager who creates engaging, platform-appropriate content."
+POST_PROMPT = """
+    Create a compelling social media post about "{title}" for {platform}.
+
+    Tone: {tone}
+    Target length: {target_words} words
+    {platform_notes}
+    {thread_notes}
+
+    The post should be engaging, relevant to the platform, and formatted appropriately.
+    Add emojis where they fit naturally with the tone and platform.
+    For LinkedIn and Twitter, include 2-3 appropriate hashtags.
+    For LinkedIn, make sure it has good paragraph breaks for readability.
+    For WhatsApp, make it more personal and conversational.
+
+    Return ONLY the post content with no explanations or additional text.
+    """
+# Additional constraints based on platform
+PLATFORM_NOTES = {
+    "Twitter": "Respect Twitter's character limit (280 chars). Use hashtags appropriately.",
+    "LinkedIn": "Professional tone with appropriate line breaks. Can include hashtags and tag people with @.",
+    "WhatsApp": "More casual, conversational and direct. Can use emojis naturally.",
+}
+# Additional notes for thread format
+TWITTER_THREAD_NOTES = "Format as 4-5 connected tweets in a thread, with each under 280 characters."
+MESSAGE_THREAD_NOTES = "Format as 3-4 separate messages that build on each other."
+
+# Rewrites an earlier post on a near-identical topic instead of starting from scratch
+ADAPT_PROMPT = """
+    Here is an existing {platform} post about "{source_title}":
+
+    {source_post}
+
+    Adapt it into a post about "{title}" for {platform}.
+
+    Tone: {tone}
+    Target length: {target_words} words
+
+    Keep what still applies and change only what the new topic requires.
+    Return ONLY the post content with no explanations or additional text.
+    """
+
+IMAGE_PROMPT_SYSTEM_PROMPT = "You are an expert at creating visual prompts for AI image generators."
+IMAGE_PROMPT_PROMPT = """
+    Based on this social media post about "{title}", create {num_images} different image prompts for DALL-E 3.
+    Each prompt should describe a square-format image that would complement the post well.
+    Make the prompts specific, visually appealing, and under 200 characters each.
+    Format your response as a numbered list with just the prompts, nothing else.
+
+    Post content:
+    {post_content}
+    """
+
+# Appended to the post prompt when the image prompts come back in the same structured response
+FUSED_PROMPTS_PROMPT = """
+    Also create {num_images} different image prompts for DALL-E 3 to go with the post.
+    Each prompt should describe a square-format image that would complement the post well.
+    Make the prompts specific, visually appealing, and under 200 characters each.
+
+    Respond with a JSON object: "post" holds the post content exactly as it should be published,
+    "image_prompts" holds the {num_images} prompts.
+    """
+
+
+# Function to work out the target word count for a length option
+def target_word_count(length, custom_word_count=100):
+    if length == "Custom Length":
+        return custom_word_count
+    return WORD_COUNT_TARGETS.get(length, 150)  # Default to 150 if not found
+
+
+# Function to pick the model and token budget for a post from its platform and length (see socialbuzz.toml);
+# num_image_prompts > 0 routes the combined post + image prompts request instead
+def choose_post_route(platform, length, custom_word_count=100, num_image_prompts=0):
+    return route_post(platform, length, target_word_count(length, custom_word_count), num_image_prompts=num_image_prompts)
+
+
+# Function to build the chat messages for a post
+def build_post_messages(title, platform, tone, length, custom_word_count=100):
+    thread_notes = ""
+    if length == "Thread/Multiple Messages":
+        thread_notes = TWITTER_THREAD_NOTES if platform == "Twitter" else MESSAGE_THREAD_NOTES
+    prompt = POST_PROMPT.format(
+        title=title,
+        platform=platform,
+        tone=tone,
+        target_words=target_word_count(length, custom_word_count),
+        platform_notes=PLATFORM_NOTES.get(platform, ""),
+        thread_notes=thread_notes,
+    )
+    return [
+        {"role": "system", "content": POST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# Function to build the chat messages adapting an earlier post (source_title, source_post) to a new topic
+def build_adapt_messages(title, platform, tone, length, source_title, source_post, custom_word_count=100):
+    prompt = ADAPT_PROMPT.format(
+        title=title,
+        platform=platform,
+        tone=tone,
+        target_words=target_word_count(length, custom_word_count),
+        source_title=source_title,
+        source_post=source_post,
+    )
+    return [
+        {"role": "system", "content": POST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# Model and parameters for a post request
+def _post_call(route, response_format=None):
+    model, params = (POST_MODEL, POST_PARAMS) if route is None else (route.model, route.params)
+    if response_format is not None:
+        params = {**params, "response_format": response_format}
+    return model, params
+
+
+# Function to request a complete post, served from the cache unless bypassed.
+# Identical requests already in flight from other sessions (or, with a shared cache, other replicas)
+# are joined unless coalesce is False or the cache is bypassed (Regenerate always asks for a fresh completion).
+# A `usage` dict is filled with the tokens this call spent (nothing when it was served from the cache or another call).
+def request_post(messages, client=None, cache=None, bypass_cache=False, route=None, response_format=None, coalesce=True, usage=None):
+    model, params = _post_call(route, response_format)
+    cache_key = make_cache_key(model, messages, **params)
+    if cache is not None and not bypass_cache:
+        cached_post = cache.get(cache_key)
+        if cached_post is not None:
+            return cached_post
+
+    def request():
+        with span("post", model=model) as s:
+            response = chat_completion(client, model=model, messages=messages, **params)
+            s.add_usage(response.usage)
+        if usage is not None:
+            usage.update(s.tokens)
+        return response.choices[0].message.content
+
+    if coalesce and not bypass_cache:
+        if cache is not None:
+            request = functools.partial(cache.compute_once, cache_key, request)
+        return get_single_flight().do(cache_key, request)
+    generated_post = request()
+    if cache is not None:
+        cache.set(cache_key, generated_post)
+    return generated_post
+
+
+# Function to stream a post, yielding text as the tokens arrive; an identical stream already in
+# flight is joined (and replayed from its start) on the same terms as request_post.
+# on_cancel(callback), e.g. Job.on_cancel, gets a callback that stops this caller's stream at once; the
+# HTTP stream (or a wait for another replica's) is aborted once no caller sharing it is still reading.
+def stream_post_tokens(messages, client=None, cache=None, bypass_cache=False, route=None, response_format=None, coalesce=True, usage=None, on_cancel=None):
+    model, params = _post_call(route, response_format)
+    cache_key = make_cache_key(model, messages, **params)
+    if cache is not None and not bypass_cache:
+        cached_post = cache.get(cache_key)
+        if cached_post is not None:
+            yield cached_post
+            return
+
+    def stream(on_cancel=None):
+        with span("post_stream", model=model) as s:
+            # The last chunk then carries the usage of the whole completion
+            for chunk in stream_chat_completion(client, on_cancel=on_cancel, model=model, messages=messages, stream_options={"include_usage": True}, **params):
+                if chunk.usage:
+                    s.add_usage(chunk.usage)
+                    if usage is not None:
+                        usage.update(s.tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    s.mark("first_token")
+                    yield chunk.choices[0].delta.content
+
+    if coalesce and not bypass_cache:
+        if cache is not None:
+            stream = functools.partial(cache.stream_once, cache_key, stream)
+        tokens = get_single_flight().stream(cache_key, stream, on_cancel=on_cancel)
+    else:
+        tokens = stream(on_cancel)
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield token
+    finally:
+        tokens.close()
+    # Only a fully received completion is cached (the coalesced path has already stored it)
+    if cache is not None and (bypass_cache or not coalesce):
+        cache.set(cache_key, "".join(parts))
+
+
+# Function to generate a finished post for one (title, platform, tone, length) request, routed by length unless a route is given
+def generate_post(title, platform, tone, length, custom_word_count=100, client=None, cache=None, bypass_cache=False, route=None):
+    route = route or choose_post_route(platform, length, custom_word_count)
+    messages = build_post_messages(title, platform, tone, length, custom_word_count)
+    return request_post(messages, client=client, cache=cache, bypass_cache=bypass_cache, route=route).strip()
+
+
+# Function to build the chat messages asking for image prompts
+def build_image_prompt_messages(title, post_content, num_images=2):
+    prompt = IMAGE_PROMPT_PROMPT.format(title=title, num_images=num_images, post_content=post_content)
+    return [
+        {"role": "system", "content": IMAGE_PROMPT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# A numbered or bulleted list item: "1. ...", "12) ...", "3: ...", "- ...", "* ..."
+_LIST_ITEM_RE = re.compile(r"^\s*(?:\d+\s*[.):-]?|[-*\u2022])\s*(.*?)\s*$")
+
+
+# Function to extract the prompts from a numbered or bulleted list
+def parse_image_prompts(prompts_text, num_images=2):
+    prompts = []
+    for line in prompts_text.split('\n'):
+        match = _LIST_ITEM_RE.match(line)
+        if match:
+            # Items that are only a number or bullet (or just quotes and markdown) are skipped
+            prompt = match.group(1).strip('"*` ')
+            if prompt:
+                prompts.append(prompt)
+
+    # Limit to requested number
+    return prompts[:num_images]
+
+
+# JSON schema for a post written together with its image prompts (structured outputs)
+def post_with_prompts_format(num_images=2):
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "post_with_image_prompts",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "post": {"type": "string"},
+                    "image_prompts": {"type": "array", "items": {"type": "string"}, "minItems": num_images, "maxItems": num_images},
+                },
+                "required": ["post", "image_prompts"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+# Function to build the chat messages for a post plus its image prompts in one structured response
+def build_post_with_prompts_messages(title, platform, tone, length, custom_word_count=100, num_images=2):
+    messages = build_post_messages(title, platform, tone, length, custom_word_count)
+    messages[-1]["content"] += FUSED_PROMPTS_PROMPT.format(num_images=num_images)
+    return messages
+
+
+# Function to split a structured response into (post, image prompts); raises ValueError if it is malformed
+def parse_post_with_prompts(response_text, num_images=2):
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}") from e
+    post = data.get("post") if isinstance(data, dict) else None
+    prompts = data.get("image_prompts") if isinstance(data, dict) else None
+    if not isinstance(post, str) or not post.strip():
+        raise ValueError("Response has no post")
+    if not isinstance(prompts, list) or not all(isinstance(prompt, str) for prompt in prompts):
+        raise ValueError("Response has no image prompts")
+    prompts = [prompt.strip() for prompt in prompts if prompt.strip()]
+    return post.strip(), prompts[:num_images]
+
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldReader:
+    """Decodes one string field of a JSON object as it streams in, so the post can be shown while it is written."""
+
+    def __init__(self, field):
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos = None  # Just after the field's opening quote, once seen
+        self._done = False
+
+    # Add the next chunk of the response and return the newly decoded text of the field
+    def feed(self, chunk):
+        self._buffer += chunk
+        if self._done:
+            return ""
+        if self._pos is None:
+            match = self._start.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buffer, i, out = self._buffer, self._pos, []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self._done = True
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(buffer):
+                break  # Wait for the rest of the escape
+            if buffer[i + 1] != "u":
+                out.append(_JSON_ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            # \uXXXX, or a surrogate pair \uXXXX\uXXXX for characters outside the BMP
+            width = 12 if i + 6 <= len(buffer) and 0xD800 <= int(buffer[i + 2:i + 6], 16) <= 0xDBFF else 6
+            if i + width > len(buffer):
+                break
+            out.append(json.loads(f'"{buffer[i:i + width]}"'))
+            i += width
+        self._pos = i
+        return "".join(out)
+
+
+# Function to request image prompts for a post; raises on API errors.
+# Coalesced with identical in-flight requests like request_post.
+def request_image_prompts(title, post_content, num_images=2, client=None, cache=None, bypass_cache=False, coalesce=True):
+    messages = build_image_prompt_messages(title, post_content, num_images)
+    cache_key = make_cache_key(IMAGE_PROMPT_MODEL, messages, **IMAGE_PROMPT_PARAMS)
+    prompts_text = None
+    if cache is not None and not bypass_cache:
+        prompts_text = cache.get(cache_key)
+
+    if prompts_text is None:
+        def request():
+            with span("image_prompts", model=IMAGE_PROMPT_MODEL) as s:
+                response = chat_completion(client, model=IMAGE_PROMPT_MODEL, messages=messages, **IMAGE_PROMPT_PARAMS)
+                s.add_usage(response.usage)
+            return response.choices[0].message.content.strip()
+
+        if coalesce and not bypass_cache:
+            if cache is not None:
+                request = functools.partial(cache.compute_once, cache_key, request)
+            prompts_text = get_single_flight().do(cache_key, request)
+        else:
+            prompts_text = request()
+        if cache is not None and (bypass_cache or not coalesce):
+            cache.set(cache_key, prompts_text)
+
+    return parse_image_prompts(prompts_text, num_images)
+
+
+# DALL-E settings for an image mode ("draft" or "final"), as configured under [images]
+def image_mode_settings(mode="final"):
+    config = get_settings()["images"][mode]
+    return {"model": config["model"], "size": config.get("size", "1024x1024"), "quality": config.get("quality"), "n": config.get("n", 1)}
+
+
+# Raw DALL-E request in an image mode; raises on failure so it can run outside the Streamlit script thread
+def request_dall_e_images(prompt, n=None, client=None, mode="final"):
+    config = image_mode_settings(mode)
+    n = n or config["n"]
+    params = {"quality": config["quality"]} if config["quality"] else {}
+    with span("dall_e", model=config["model"], mode=mode) as s:
+        response = generate_images(
+            client,
+            model=config["model"],
+            prompt=prompt,
+            n=n,
+            size=config["size"],
+            response_format="b64_json",
+            **params
+        )
+        s.add_cost(image_cost(config["model"], config["size"], config["quality"], len(response.data)))
+
+    # Decode the base64 payload once, straight into raw bytes
+    images_data = []
+    with span("image_decode"):
+        for data in response.data:
+            images_data.append(decode_image(data.b64_json))
+
+    return images_data
+
+
+# Function to generate images for every prompt concurrently (one request per prompt, with the mode's
+# images per prompt), yielding (index, images) as each one finishes; a prompt whose request failed
+# yields the exception instead of a list of images. on_cancel(callback), e.g. Job.on_cancel, gets a
+# callback that drops the requests not sent yet without waiting for the next image to finish.
+def iter_dall_e_images(image_prompts, client=None, max_workers=None, mode="final", on_cancel=None):
+    if not image_prompts:
+        return
+    max_workers = max(1, min(max_workers or IMAGE_CONCURRENCY, len(image_prompts)))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(contextvars.copy_context().run, request_dall_e_images, prompt, client=client, mode=mode): i for i, prompt in enumerate(image_prompts)}
+        if on_cancel is not None:
+            on_cancel(lambda: executor.shutdown(wait=False, cancel_futures=True))
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+    finally:
+        # If the caller stops early (e.g. its job was cancelled) requests that have not been sent are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
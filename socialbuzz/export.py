@@ -0,0 +1,127 @@
+"""Bulk export of posts, image prompts and images as a ZIP bundle, written to disk one entry at a time."""
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+# Where archives are built before they are handed over; the system temp directory when unset
+EXPORT_DIR = os.environ.get("SOCIALBUZZ_EXPORT_DIR", "") or None
+
+# Post fields copied into posts.jsonl, in this order, when a record has them
+POST_FIELDS = ("id", "title", "platform", "tone", "length", "text", "model", "route", "prompt_tokens", "completion_tokens", "created_at", "image_prompts")
+
+
+# File extension for image bytes, from their magic number
+def image_extension(data):
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+class ExportWriter:
+    """ZIP bundle of posts.jsonl and an images/ folder, built without holding the export in memory."""
+
+    # Each image is written (and freed) as it is added, and the JSON lines are spooled to a temporary
+    # file until the end, since a ZIP can only be written one member at a time
+    def __init__(self, file):
+        self._zip = zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        self._posts = tempfile.TemporaryFile(dir=EXPORT_DIR)
+        self._image_names = {}  # content hash -> archive name, so an image shared by posts is stored once
+        self.posts = 0
+        self.images = 0
+        self.missing_images = 0
+
+    # Add one post. images is an iterable of (content hash, prompt); load_image(hash) returns the bytes
+    # or raises KeyError if the image is gone, in which case the post records it as missing.
+    def add_post(self, record, images=(), load_image=None):
+        self.posts += 1
+        entry = {field: record[field] for field in POST_FIELDS if record.get(field) is not None}
+        entry["images"] = []
+        for image_hash, prompt in images:
+            name = self._image_names.get(image_hash)
+            if name is None:
+                try:
+                    data = load_image(image_hash)
+                except KeyError:
+                    self.missing_images += 1
+                    entry["images"].append({"sha256": image_hash, "prompt": prompt, "file": None})
+                    continue
+                self.images += 1
+                name = self._image_names[image_hash] = f"images/{self.images:05d}.{image_extension(data)}"
+                # Generated images are already compressed
+                self._zip.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+            entry["images"].append({"sha256": image_hash, "prompt": prompt, "file": name})
+        self._posts.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    # Write posts.jsonl and finish the archive; returns the counts of what went in
+    def close(self):
+        self._posts.seek(0)
+        info = zipfile.ZipInfo("posts.jsonl", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self._zip.open(info, "w", force_zip64=True) as f:
+            shutil.copyfileobj(self._posts, f)
+        self._posts.close()
+        self._zip.close()
+        return {"posts": self.posts, "images": self.images, "missing_images": self.missing_images}
+
+    # Give up on an export that failed part way
+    def discard(self):
+        self._zip.close()
+        self._posts.close()
+
+
+# Write records (dicts with the POST_FIELDS and optionally "images": [(hash, prompt)]) to a ZIP at `file`,
+# a path or a binary file object. Records are consumed one at a time, so they can come from a generator.
+def export_records(file, records, load_image=None):
+    writer = ExportWriter(file)
+    try:
+        for record in records:
+            writer.add_post(record, record.get("images", ()), load_image)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+# The same export built in a temporary file, returned rewound for reading (it is deleted once closed)
+def export_to_tempfile(records, load_image=None):
+    file = tempfile.TemporaryFile(dir=EXPORT_DIR, suffix=".zip")
+    try:
+        export_records(file, records, load_image)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+# Every post in the history matching a search (all posts for an empty query), newest first, page by page
+def history_records(history, query="", page_size=200):
+    before = None
+    while True:
+        rows = history.search(query, before=before, limit=page_size)
+        for row in rows:
+            post = history.get(row["id"])
+            if post is not None:
+                yield post
+        if len(rows) < page_size:
+            return
+        before = rows[-1]["id"]
+
+
+# The successful rows of a batch results file (see socialbuzz.batch), read line by line
+def batch_records(results_path):
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Partial line left behind by an interrupted run
+            if record.get("status") == "ok":
+                yield {**record, "text": record["post"]}
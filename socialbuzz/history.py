@@ -0,0 +1,279 @@
+"""Persistent history of generated posts and their images, with a full-text index for search and a
+near-duplicate index over the requests that produced them."""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+
+from socialbuzz.blobstore import BlobStore
+from socialbuzz.similar import SIMILARITY_THRESHOLD, band_keys, jaccard, title_shingles
+
+# Defaults can be overridden per deployment through the environment
+DEFAULT_HISTORY_PATH = os.environ.get("SOCIALBUZZ_HISTORY_PATH", os.path.join(".socialbuzz", "history.sqlite3"))
+DEFAULT_HISTORY_BLOB_DIR = os.environ.get("SOCIALBUZZ_HISTORY_BLOB_DIR", os.path.join(".socialbuzz", "history-images"))
+DEFAULT_HISTORY_DAYS = float(os.environ.get("SOCIALBUZZ_HISTORY_DAYS", "365"))
+DEFAULT_HISTORY_MAX_ENTRIES = int(os.environ.get("SOCIALBUZZ_HISTORY_MAX_ENTRIES", "500000"))
+PRUNE_INTERVAL = 3600  # Seconds between automatic retention passes
+# An LSH band holding more posts than this mostly collects topics that only share common trigrams (such as
+# a year); lookups skip such bands, and only read their newest posts when the other bands find no match
+CROWDED_BAND_SIZE = 200
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS posts ("
+    " id INTEGER PRIMARY KEY,"
+    " created_at REAL NOT NULL,"
+    " title TEXT NOT NULL,"
+    " platform TEXT NOT NULL,"
+    " tone TEXT NOT NULL,"
+    " length TEXT NOT NULL,"
+    " text TEXT NOT NULL,"
+    " model TEXT,"
+    " route TEXT,"
+    " prompt_tokens INTEGER,"
+    " completion_tokens INTEGER,"
+    " image_prompts TEXT)",
+    "CREATE INDEX IF NOT EXISTS posts_created_at ON posts (created_at)",
+    "CREATE TABLE IF NOT EXISTS post_images ("
+    " post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,"
+    " position INTEGER NOT NULL,"
+    " image_hash TEXT NOT NULL,"
+    " prompt TEXT,"
+    " PRIMARY KEY (post_id, position))",
+    "CREATE INDEX IF NOT EXISTS post_images_hash ON post_images (image_hash)",
+    # External-content index: the text lives once, in posts
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+    " title, text, content='posts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN"
+    " INSERT INTO posts_fts (rowid, title, text) VALUES (new.id, new.title, new.text); END",
+    # LSH bands of each request (see socialbuzz.similar); lookups use an in-memory copy, loaded on open
+    "CREATE TABLE IF NOT EXISTS post_bands ("
+    " band INTEGER NOT NULL,"
+    " post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,"
+    " PRIMARY KEY (band, post_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS post_bands_post_id ON post_bands (post_id)",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN"
+    " INSERT INTO posts_fts (posts_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text); END",
+)
+
+_COLUMNS = (
+    "p.id, p.created_at, p.title, p.platform, p.tone, p.length, p.text, p.model, p.route,"
+    " p.prompt_tokens, p.completion_tokens, (SELECT COUNT(*) FROM post_images WHERE post_id = p.id)"
+)
+_FIELDS = ("id", "created_at", "title", "platform", "tone", "length", "text", "model", "route",
+           "prompt_tokens", "completion_tokens", "image_count")
+
+
+# FTS5 query for free text typed by a user: every word must match, as a prefix
+def fts_query(text):
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+class History:
+    """SQLite store of past posts, full-text indexed, and their images kept by content hash."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, blob_dir=DEFAULT_HISTORY_BLOB_DIR,
+                 max_age_days=DEFAULT_HISTORY_DAYS, max_entries=DEFAULT_HISTORY_MAX_ENTRIES):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        # Blobs here have no owners, so nothing but prune() removes them
+        self.images = BlobStore(blob_dir)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._bands = {}  # LSH band key -> array of the ids of the posts in it, oldest first
+        self._titles = {}  # post id -> title, to check near-duplicate candidates without a query
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all script threads; access is serialised by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._index_missing_bands()
+        self._load_bands()
+
+    # Band keys for posts saved before the near-duplicate index existed
+    def _index_missing_bands(self):
+        rows = self._conn.execute(
+            "SELECT id, title, platform, tone, length FROM posts WHERE id NOT IN (SELECT post_id FROM post_bands)"
+        ).fetchall()
+        if rows:
+            self._conn.execute("BEGIN")
+            for post_id, *request in rows:
+                self._insert_bands(post_id, *request)
+            self._conn.execute("COMMIT")
+
+    # Read the near-duplicate index into memory: one row per band is much faster to fetch than one per entry,
+    # and grouping scans the (band, post_id) primary key, so each band's ids come out oldest first
+    def _load_bands(self):
+        self._titles = dict(self._conn.execute("SELECT id, title FROM posts"))
+        self._bands = {
+            key: array("q", map(int, post_ids.split(",")))
+            for key, post_ids in self._conn.execute("SELECT band, group_concat(post_id) FROM post_bands GROUP BY band")
+        }
+
+    def _insert_bands(self, post_id, title, platform, tone, length):
+        keys = band_keys(title, platform, tone, length)
+        self._conn.executemany("INSERT OR IGNORE INTO post_bands (band, post_id) VALUES (?, ?)", [(key, post_id) for key in keys])
+        self._titles[post_id] = title
+        for key in set(keys):
+            posts = self._bands.get(key)
+            if posts is None:
+                posts = self._bands[key] = array("q")
+            posts.append(post_id)
+
+    # Record a generated post and return its id; usage is {"prompt": n, "completion": n} when known
+    def add_post(self, title, platform, tone, length, text, model=None, route=None, usage=None, image_prompts=None):
+        usage = usage or {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            cursor = self._conn.execute(
+                "INSERT INTO posts (created_at, title, platform, tone, length, text, model, route,"
+                " prompt_tokens, completion_tokens, image_prompts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), title, platform, tone, length, text, model, route,
+                 usage.get("prompt"), usage.get("completion"), json.dumps(image_prompts) if image_prompts else None),
+            )
+            post_id = cursor.lastrowid
+            self._insert_bands(post_id, title, platform, tone, length)
+            self._conn.execute("COMMIT")
+        if time.time() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+        return post_id
+
+    # Attach images (raw bytes, with the prompt each came from) after any the post already has;
+    # identical image bytes are only stored once on disk
+    def add_images(self, post_id, images, prompts=None):
+        prompts = list(prompts or [])
+        hashes = [self.images.put(image_bytes) for image_bytes in images]
+        with self._lock:
+            start = self._conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM post_images WHERE post_id = ?", (post_id,)).fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO post_images (post_id, position, image_hash, prompt) VALUES (?, ?, ?, ?)",
+                [(post_id, start + i, h, prompts[i] if i < len(prompts) else None) for i, h in enumerate(hashes)],
+            )
+
+    # Newest posts first, optionally only those matching a search, one page at a time:
+    # pass the id of the last post of a page as `before` to get the next one
+    def search(self, query="", before=None, limit=20):
+        match = fts_query(query)
+        before = before if before is not None else 2 ** 63 - 1
+        with self._lock:
+            if match:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS}, snippet(posts_fts, 1, '**', '**', ' ... ', 16)"
+                    " FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid"
+                    " WHERE posts_fts MATCH ? AND posts_fts.rowid < ? ORDER BY posts_fts.rowid DESC LIMIT ?",
+                    (match, before, limit),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS}, NULL FROM posts p WHERE p.id < ? ORDER BY p.id DESC LIMIT ?",
+                    (before, limit),
+                ).fetchall()
+        return [dict(zip(_FIELDS + ("snippet",), row)) for row in rows]
+
+    # Ids and titles of the posts sharing the most LSH bands with a request, from the in-memory index.
+    # Posts sharing more bands are more likely to be close, so only the top `max_candidates` are returned.
+    def _band_candidates(self, keys, max_candidates, crowded):
+        shared = Counter()
+        with self._lock:
+            for posts in map(self._bands.get, set(keys)):
+                if not posts:
+                    continue
+                if len(posts) <= CROWDED_BAND_SIZE:
+                    if not crowded:
+                        shared.update(posts)
+                elif crowded:
+                    shared.update(posts[-CROWDED_BAND_SIZE:])
+            return [(post_id, self._titles[post_id]) for post_id, _ in shared.most_common(max_candidates)]
+
+    # Past posts for the same platform, tone and length whose topic is a near-duplicate of `title`,
+    # most similar (then newest) first, each with its "similarity" (0-1)
+    def find_similar(self, title, platform, tone, length, threshold=SIMILARITY_THRESHOLD, limit=3, max_candidates=5):
+        keys = band_keys(title, platform, tone, length)
+        shingles = title_shingles(title)
+        similarity = {}
+        # Uncrowded bands first; crowded ones only if those find nothing
+        for crowded in (False, True):
+            for post_id, candidate_title in self._band_candidates(keys, max_candidates, crowded):
+                score = jaccard(shingles, title_shingles(candidate_title))
+                if score >= threshold:
+                    similarity[post_id] = score
+            if similarity:
+                break
+        if not similarity:
+            return []
+        best = sorted(similarity, key=lambda post_id: (similarity[post_id], post_id), reverse=True)[:limit]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM posts p WHERE p.id IN ({', '.join('?' * len(best))})", best
+            ).fetchall()
+        matches = [dict(zip(_FIELDS, row), similarity=similarity[row[0]]) for row in rows]
+        matches.sort(key=lambda post: (post["similarity"], post["id"]), reverse=True)
+        return matches
+
+    # Drop deleted posts, given as (band, post_id) rows, from the in-memory near-duplicate index
+    def _forget_bands(self, rows):
+        deleted = {}
+        for key, post_id in rows:
+            deleted.setdefault(key, set()).add(post_id)
+            self._titles.pop(post_id, None)
+        for key, post_ids in deleted.items():
+            posts = array("q", (post_id for post_id in self._bands.get(key, ()) if post_id not in post_ids))
+            if posts:
+                self._bands[key] = posts
+            else:
+                self._bands.pop(key, None)
+
+    # One post with its image prompts and images ([(hash, prompt)] in the order they were added), or None
+    def get(self, post_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS}, p.image_prompts FROM posts p WHERE p.id = ?", (post_id,)).fetchone()
+            if row is None:
+                return None
+            images = self._conn.execute(
+                "SELECT image_hash, prompt FROM post_images WHERE post_id = ? ORDER BY position", (post_id,)
+            ).fetchall()
+        post = dict(zip(_FIELDS, row))
+        post["image_prompts"] = json.loads(row[-1]) if row[-1] else []
+        post["images"] = images
+        return post
+
+    # Raw bytes of a stored image; raises KeyError if it has been pruned
+    def load_image(self, image_hash):
+        return self.images.get(image_hash)
+
+    # Delete posts older than max_age_days and the oldest beyond max_entries, with images no other post uses.
+    # Returns the number of posts removed.
+    def prune(self, max_age_days=None, max_entries=None):
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        max_entries = self.max_entries if max_entries is None else max_entries
+        self._last_prune = time.time()
+        with self._lock:
+            cutoff = self._conn.execute("SELECT id FROM posts ORDER BY id DESC LIMIT 1 OFFSET ?", (max_entries,)).fetchone()
+            condition, args = "created_at < ?", [time.time() - max_age_days * 86400]
+            if cutoff is not None:
+                condition, args = condition + " OR id <= ?", args + [cutoff[0]]
+            hashes = [row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT image_hash FROM post_images WHERE post_id IN (SELECT id FROM posts WHERE {condition})", args
+            )]
+            bands = self._conn.execute(
+                f"SELECT band, post_id FROM post_bands WHERE post_id IN (SELECT id FROM posts WHERE {condition})", args
+            ).fetchall()
+            self._conn.execute("BEGIN")
+            removed = self._conn.execute(f"DELETE FROM posts WHERE {condition}", args).rowcount
+            self._conn.execute("COMMIT")
+            self._forget_bands(bands)
+            orphaned = [h for h in hashes if self._conn.execute(
+                "SELECT 1 FROM post_images WHERE image_hash = ? LIMIT 1", (h,)
+            ).fetchone() is None]
+        for image_hash in orphaned:
+            self.images.discard(image_hash)
+        return removed
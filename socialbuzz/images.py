@@ -0,0 +1,51 @@
+"""Image helpers for decoding DALL-E output, display thumbnails and downloads."""
+import base64
+import hashlib
+from io import BytesIO
+
+from socialbuzz.metrics import span
+
+# Pillow is imported by the functions that use it, so it only loads once there are images.
+# Thumbnails are what the browser gets for display; full-size images only go out as downloads
+THUMBNAIL_QUALITY = 80
+
+
+# Content hash used as the cache key for an image
+def image_digest(img_data):
+    if isinstance(img_data, str):
+        img_data = img_data.encode("ascii")
+    return hashlib.sha256(img_data).hexdigest()
+
+
+# Decode a base64 image returned by the images API into raw bytes
+def decode_image(img_data):
+    return base64.b64decode(img_data)
+
+
+# Re-encode raw image bytes as a JPEG for download
+def encode_jpeg(image_bytes, quality=90):
+    from PIL import Image
+
+    with span("jpeg_encode"):
+        img = Image.open(BytesIO(image_bytes))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")  # JPEG has no alpha channel
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=quality)
+        return buffered.getvalue()
+
+
+# Downscale image bytes to fit in width x width for display, as JPEG: st.image passes JPEG bytes
+# through untouched and serves them from a cacheable media URL (other formats are re-encoded every run)
+def make_thumbnail(image_bytes, width, quality=THUMBNAIL_QUALITY):
+    from PIL import Image
+
+    with span("thumbnail"):
+        img = Image.open(BytesIO(image_bytes))
+        img.draft("RGB", (width, width))  # Lets JPEG sources decode at reduced size
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((width, width), Image.LANCZOS)
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=quality)
+        return buffered.getvalue()
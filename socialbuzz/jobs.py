@@ -0,0 +1,173 @@
+"""Process-level background jobs that outlive Streamlit reruns and can be cancelled."""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("SOCIALBUZZ_JOB_WORKERS", "16"))
+FINISHED_JOB_TTL = 600  # Seconds an unclaimed finished job is kept before it is pruned
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once the job has been cancelled."""
+
+
+class Job:
+    """State of one background job, shared between its worker thread and the UI polling it."""
+
+    def __init__(self, kind, owner=None, meta=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.meta = meta or {}
+        self.status = "queued"  # queued -> running -> done | error | cancelled
+        self.progress = 0.0
+        self.message = ""
+        self.partial = {}  # Output produced so far, for live display
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._on_cancel = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error", "cancelled")
+
+    def report(self, progress=None, message=None):
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    # Called by job functions between steps
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    # Register a callback that aborts in-flight work (e.g. closes an HTTP stream) when the job is cancelled
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self.cancelled:
+                self._on_cancel.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self._lock:
+            if self.finished:
+                return
+            self._cancelled.set()
+            self.status = "cancelled"
+            self.finished_at = time.time()
+            callbacks, self._on_cancel = self._on_cancel, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    # Mark the job as running unless it was cancelled while queued
+    def _start(self):
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.status = "running"
+            return True
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self.finished:
+                return  # Cancelled while running; the late result is dropped
+            self.result = result
+            self.error = error
+            self.status = status
+            self.finished_at = time.time()
+            if status == "done":
+                self.progress = 1.0
+
+
+class JobManager:
+    """Runs jobs on a shared thread pool and keeps them addressable by id until they are claimed."""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Run fn(job, *args, **kwargs) in the background and return the job
+    def submit(self, kind, fn, *args, owner=None, meta=None, **kwargs):
+        self.prune()
+        job = Job(kind, owner=owner, meta=meta)
+        with self._lock:
+            self._jobs[job.id] = job
+        # The job runs in the caller's context, so metrics recorded by it belong to the caller's session
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if not job._start():
+            return
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job.cancel()
+        except Exception as e:
+            job._finish("error", error=str(e))
+        else:
+            job._finish("done", result=result)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # Hand a finished job over to its caller and forget it
+    def pop(self, job_id):
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def cancel_owner(self, owner):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+        for job in jobs:
+            job.cancel()
+
+    # Cancel the jobs of owners that are gone (e.g. closed browser sessions)
+    def sweep(self, is_alive):
+        with self._lock:
+            owners = {job.owner for job in self._jobs.values() if not job.finished and job.owner is not None}
+        for owner in owners:
+            if not is_alive(owner):
+                self.cancel_owner(owner)
+
+    # Drop finished jobs nobody claimed
+    def prune(self, max_age=FINISHED_JOB_TTL):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -0,0 +1,210 @@
+"""Timing spans, token usage and cost per generation stage, exported as JSON logs and Prometheus text."""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from socialbuzz.jobs import JobCancelled
+from socialbuzz.settings import get_settings
+from socialbuzz.singleflight import get_single_flight
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text file for a local scraper (e.g. node_exporter's textfile collector); empty disables it
+METRICS_FILE = os.environ.get("SOCIALBUZZ_METRICS_FILE", os.path.join(".socialbuzz", "metrics.prom"))
+METRICS_FILE_INTERVAL = float(os.environ.get("SOCIALBUZZ_METRICS_FILE_INTERVAL", "10"))  # Seconds between rewrites
+# JSON lines log of every span; when unset, spans only go to the "socialbuzz.metrics" logger
+METRICS_LOG = os.environ.get("SOCIALBUZZ_METRICS_LOG", "")
+
+SPAN_HISTORY = 2000  # Recent spans kept in memory for the debug panel
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Browser session the current thread works for; copied into worker threads with contextvars.copy_context()
+_session = contextvars.ContextVar("socialbuzz_session", default=None)
+
+
+def set_session(session_id):
+    _session.set(session_id)
+
+
+# USD for a chat request, from the [pricing] settings (None for models without a price)
+def chat_cost(model, prompt_tokens, completion_tokens):
+    price = get_settings()["pricing"]["chat"].get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+
+# USD for n generated images of a model, size and quality
+def image_cost(model, size, quality=None, n=1):
+    prices = get_settings()["pricing"]["images"].get(model, {})
+    price = prices.get(f"{size} {quality}") or prices.get(size)
+    return None if price is None else price * n
+
+
+class Span:
+    """One timed stage of a request, with the tokens and cost it used."""
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.session = _session.get()
+        self.started = time.time()
+        self.fields = {}
+        self.tokens = {}
+        self.cost = None
+
+    # Record the usage object of a chat completion (or the final chunk of a stream)
+    def add_usage(self, usage, model=None):
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        self.tokens = {"prompt": prompt_tokens, "completion": completion_tokens}
+        self.add_cost(chat_cost(model or self.labels.get("model"), prompt_tokens, completion_tokens))
+
+    def add_cost(self, cost):
+        if cost is not None:
+            self.cost = (self.cost or 0) + cost
+
+    # Time since the span started, under a name (e.g. time to first token)
+    def mark(self, name):
+        self.fields.setdefault(f"{name}_ms", round((time.time() - self.started) * 1000, 1))
+
+
+class Metrics:
+    """Process-wide totals per stage and model, plus recent spans per session."""
+
+    def __init__(self, history=SPAN_HISTORY):
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 2))  # buckets..., +Inf, sum
+        self._errors = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._cost = defaultdict(float)
+        self._spans = deque(maxlen=history)
+        self._last_write = 0.0
+
+    def record(self, span, duration, status):
+        entry = {
+            "time": span.started,
+            "session": span.session,
+            "stage": span.stage,
+            **span.labels,
+            "duration_ms": round(duration * 1000, 1),
+            "status": status,
+            **span.fields,
+        }
+        if span.tokens:
+            entry["prompt_tokens"] = span.tokens["prompt"]
+            entry["completion_tokens"] = span.tokens["completion"]
+        if span.cost is not None:
+            entry["cost_usd"] = round(span.cost, 6)
+
+        key = (span.stage, span.labels.get("model", ""))
+        with self._lock:
+            # Buckets are cumulative, as Prometheus expects
+            counts = self._durations[key]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += duration
+            if status == "error":
+                self._errors[key] += 1
+            for kind, count in span.tokens.items():
+                self._tokens[key + (kind,)] += count
+            if span.cost is not None:
+                self._cost[key] += span.cost
+            self._spans.append(entry)
+            write_file = METRICS_FILE and time.time() - self._last_write >= METRICS_FILE_INTERVAL
+            if write_file:
+                self._last_write = time.time()
+
+        logger.info(json.dumps(entry, ensure_ascii=False))
+        if write_file:
+            self.write_prometheus(METRICS_FILE)
+
+    # Most recent spans of one session, oldest first
+    def recent(self, session, n=50):
+        with self._lock:
+            return [entry for entry in self._spans if entry["session"] == session][-n:]
+
+    # Prometheus text exposition format
+    def prometheus_text(self):
+        lines = [
+            "# HELP socialbuzz_stage_duration_seconds Time spent in each generation stage.",
+            "# TYPE socialbuzz_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, model), counts in sorted(self._durations.items()):
+                labels = f'stage="{stage}",model="{model}"'
+                for bound, count in zip(DURATION_BUCKETS, counts):
+                    lines.append(f'socialbuzz_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'socialbuzz_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {counts[-2]}')
+                lines.append(f"socialbuzz_stage_duration_seconds_sum{{{labels}}} {counts[-1]:.6f}")
+                lines.append(f"socialbuzz_stage_duration_seconds_count{{{labels}}} {counts[-2]}")
+            lines += ["# HELP socialbuzz_stage_errors_total Stages that raised.", "# TYPE socialbuzz_stage_errors_total counter"]
+            lines += [f'socialbuzz_stage_errors_total{{stage="{s}",model="{m}"}} {n}' for (s, m), n in sorted(self._errors.items())]
+            lines += ["# HELP socialbuzz_tokens_total Tokens reported by the API.", "# TYPE socialbuzz_tokens_total counter"]
+            lines += [f'socialbuzz_tokens_total{{stage="{s}",model="{m}",kind="{k}"}} {n}' for (s, m, k), n in sorted(self._tokens.items())]
+            lines += ["# HELP socialbuzz_cost_usd_total Estimated spend from the [pricing] settings.", "# TYPE socialbuzz_cost_usd_total counter"]
+            lines += [f'socialbuzz_cost_usd_total{{stage="{s}",model="{m}"}} {c:.6f}' for (s, m), c in sorted(self._cost.items())]
+        flight = get_single_flight().stats()
+        lines += [
+            "# HELP socialbuzz_coalesced_requests_total Requests that joined an identical one already in flight.",
+            "# TYPE socialbuzz_coalesced_requests_total counter",
+            f"socialbuzz_coalesced_requests_total {flight['coalesced']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    # Replace the file atomically so a scraper never reads half of it
+    def write_prometheus(self, path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("could not write metrics to %s", path, exc_info=True)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+# Time a stage: `with span("post", model=model) as s: ...`. The span is recorded as ok, error or
+# cancelled (closed before it finished, e.g. an abandoned stream).
+@contextmanager
+def span(stage, **labels):
+    current = Span(stage, labels)
+    status = "ok"
+    try:
+        yield current
+    except (GeneratorExit, JobCancelled):
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _metrics.record(current, time.time() - current.started, status)
+
+
+if METRICS_LOG:
+    _handler = logging.handlers.RotatingFileHandler(METRICS_LOG, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,63 @@
+"""Speculative background generation of image prompts (and optionally images) for a new post."""
+import contextvars
+import difflib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from socialbuzz.engine import iter_dall_e_images, request_image_prompts
+
+# Posts edited below this similarity to the prefetched text are treated as a different post
+STALE_THRESHOLD = float(os.environ.get("SOCIALBUZZ_PREFETCH_STALE_THRESHOLD", "0.85"))
+
+# Shared by every session; speculative work never competes with more than this many threads
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("SOCIALBUZZ_PREFETCH_WORKERS", "4")), thread_name_prefix="prefetch")
+
+
+# Similarity of two post texts between 0 and 1 (cheap upper-bound ratio, fine for staleness checks)
+def text_similarity(a, b):
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).quick_ratio()
+
+
+class Prefetch:
+    """Image prompts, and optionally images, generated ahead of the user asking for them."""
+
+    def __init__(self, title, post, client=None, cache=None, with_images=False, num_images=2, mode="final"):
+        self.title = title
+        self.source = post
+        self.with_images = with_images
+        self.mode = mode  # Image mode the images are prepared in
+        self._cancelled = threading.Event()
+        self.future = _executor.submit(contextvars.copy_context().run, self._run, client, cache, num_images)
+
+    def _run(self, client, cache, num_images):
+        prompts = request_image_prompts(self.title, self.source, num_images, client=client, cache=cache)
+        images, sources = [], []
+        if self.with_images and prompts and not self._cancelled.is_set():
+            results = [[] for _ in prompts]
+            for i, result in iter_dall_e_images(prompts, client=client, mode=self.mode):
+                if not isinstance(result, Exception):
+                    results[i] = result
+            images = [image for result in results for image in result]
+            sources = [prompts[i] for i, result in enumerate(results) for _ in result]
+        return prompts, images, sources
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    # Stop work that has not started yet and skip the image stage if the prompts are still being written
+    def cancel(self):
+        self._cancelled.set()
+        self.future.cancel()
+
+    # True while the prefetched work still matches the post the user is looking at
+    def is_fresh(self, post, threshold=None):
+        threshold = STALE_THRESHOLD if threshold is None else threshold
+        return not self.cancelled and text_similarity(self.source, post) >= threshold
+
+    # (image prompts, images, the prompt behind each image); blocks until the background work is done and re-raises its error
+    def result(self, timeout=None):
+        return self.future.result(timeout)
@@ -0,0 +1,110 @@
+"""Length-aware model routing for post generation, with a record of the route each request took."""
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+
+from socialbuzz.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+ROUTE_LOG_SIZE = 500  # Recent routing decisions kept in memory
+
+
+class Route:
+    """Model and completion parameters chosen for one post request."""
+
+    def __init__(self, name, model, max_tokens, temperature):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    @property
+    def params(self):
+        return {"max_tokens": self.max_tokens, "temperature": self.temperature}
+
+    def __repr__(self):
+        return f"Route({self.name!r}, {self.model!r}, max_tokens={self.max_tokens})"
+
+
+def _matches(rule, platform, length, target_words):
+    if "platforms" in rule and platform not in rule["platforms"]:
+        return False
+    if "lengths" in rule and length not in rule["lengths"]:
+        return False
+    if "max_words" in rule and target_words > rule["max_words"]:
+        return False
+    if "min_words" in rule and target_words < rule["min_words"]:
+        return False
+    return True
+
+
+# Completion token budget for a post of target_words, with room for emojis, hashtags and line breaks
+def token_budget(target_words, config=None):
+    config = config or get_settings()["routing"]
+    budget = math.ceil(target_words * config["tokens_per_word"] * config["headroom"])
+    return max(config["min_tokens"], min(config["max_tokens"], budget))
+
+
+# Pick the model and token budget for a post; the first matching route in the settings wins.
+# With num_image_prompts the post and its image prompts come from one structured-output request,
+# which needs a model that supports JSON schemas (the [fused] settings).
+def route_post(platform, length, target_words, config=None, num_image_prompts=0):
+    config = config or get_settings()["routing"]
+    rule = next((rule for rule in config["routes"] if _matches(rule, platform, length, target_words)), None)
+    if rule is None:
+        raise ValueError(f"No route matches a {target_words}-word {length} post for {platform}; add a catch-all route")
+    max_tokens = rule.get("max_tokens") or token_budget(target_words, config)
+    route = Route(rule["name"], rule["model"], max_tokens, rule.get("temperature", config["temperature"]))
+    if num_image_prompts:
+        fused = get_settings()["fused"]
+        route = Route(
+            f"{route.name}+prompts",
+            fused.get("model") or route.model,
+            route.max_tokens + num_image_prompts * fused["tokens_per_prompt"],
+            route.temperature,
+        )
+    _route_log.record(route, platform, length, target_words)
+    return route
+
+
+class RouteLog:
+    """Thread-safe record of recent routing decisions and per-route totals."""
+
+    def __init__(self, size=ROUTE_LOG_SIZE):
+        self._entries = deque(maxlen=size)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, route, platform, length, target_words):
+        entry = {
+            "time": time.time(),
+            "route": route.name,
+            "model": route.model,
+            "max_tokens": route.max_tokens,
+            "platform": platform,
+            "length": length,
+            "target_words": target_words,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self._counts[route.name] += 1
+        logger.info("route=%s model=%s max_tokens=%s platform=%s length=%s target_words=%s",
+                    route.name, route.model, route.max_tokens, platform, length, target_words)
+
+    def recent(self, n=20):
+        with self._lock:
+            return list(self._entries)[-n:]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+_route_log = RouteLog()
+
+
+def get_route_log():
+    return _route_log
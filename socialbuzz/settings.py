@@ -0,0 +1,84 @@
+"""Deployment settings read from a TOML file (socialbuzz.toml by default), layered over built-in defaults."""
+import copy
+import os
+import threading
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+SETTINGS_PATH = os.environ.get("SOCIALBUZZ_SETTINGS", "socialbuzz.toml")
+
+# Used for every section or key the settings file leaves out
+DEFAULT_SETTINGS = {
+    "routing": {
+        # Completion budget: target words * tokens_per_word * headroom, clamped to [min_tokens, max_tokens]
+        "tokens_per_word": 1.4,
+        "headroom": 1.5,
+        "min_tokens": 200,
+        "max_tokens": 1500,
+        "temperature": 0.7,
+        # First matching route wins; a route matches when every condition it sets holds
+        "routes": [
+            {"name": "short", "model": "gpt-3.5-turbo", "max_words": 100},
+            {"name": "whatsapp", "model": "gpt-3.5-turbo", "platforms": ["WhatsApp"], "max_words": 250},
+            {"name": "default", "model": "gpt-4"},
+        ],
+    },
+    # Post + image prompts in one structured-output request
+    "fused": {
+        "model": "gpt-4o",  # Must support response_format json_schema; gpt-4 and gpt-3.5-turbo do not
+        "tokens_per_prompt": 80,
+    },
+    # DALL-E parameters per image mode; n is images per prompt in one request
+    "images": {
+        # Cheap low-resolution candidates to pick from
+        "draft": {"model": "dall-e-2", "size": "256x256", "n": 2},
+        # What picked drafts (and images made without drafts) are rendered as; dall-e-3 only allows n = 1
+        "final": {"model": "dall-e-3", "size": "1024x1024", "quality": "standard", "n": 1},
+    },
+    # List prices for the cost estimates in the metrics; update them when OpenAI's change
+    "pricing": {
+        # USD per 1K [prompt, completion] tokens
+        "chat": {"gpt-4": [0.03, 0.06], "gpt-4o": [0.0025, 0.01], "gpt-3.5-turbo": [0.0005, 0.0015]},
+        # USD per image by size, or by "size quality" where the quality changes the price
+        "images": {
+            "dall-e-3": {"1024x1024": 0.04, "1024x1024 hd": 0.08, "1024x1792": 0.08, "1792x1024": 0.08},
+            "dall-e-2": {"256x256": 0.016, "512x512": 0.018, "1024x1024": 0.02},
+        },
+    },
+}
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+# Merge override tables into the defaults at every depth: [images.draft] setting only model keeps the
+# default size and n. Anything else, lists included (e.g. the routes), replaces the default outright.
+def _merge(settings, overrides):
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(settings.get(key), dict):
+            _merge(settings[key], value)
+        else:
+            settings[key] = value
+    return settings
+
+
+# Settings from `path` merged over the defaults; a missing file means defaults only
+def load_settings(path=None):
+    path = path or SETTINGS_PATH
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    if not os.path.exists(path):
+        return settings
+    with open(path, "rb") as f:
+        return _merge(settings, tomllib.load(f))
+
+
+# Process-wide settings, read once
+def get_settings():
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = load_settings()
+        return _settings
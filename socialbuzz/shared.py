@@ -0,0 +1,334 @@
+"""Storage shared by every replica of the app: completions, image blobs and markers for requests in flight."""
+import abc
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+
+from socialbuzz.cache import DEFAULT_CACHE_MAX_ENTRIES, DEFAULT_CACHE_TTL, CompletionCache
+from socialbuzz.client import StreamAborted
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# A directory every replica on this host can write to (e.g. /var/lib/socialbuzz); empty keeps state per process
+SHARED_DIR = os.environ.get("SOCIALBUZZ_SHARED_DIR", "")
+# "package.module:Class" of another SharedBackend (e.g. one over Redis or S3), built with no arguments
+SHARED_BACKEND = os.environ.get("SOCIALBUZZ_SHARED_BACKEND", "")
+SHARED_BLOB_TTL = float(os.environ.get("SOCIALBUZZ_SHARED_BLOB_TTL", str(24 * 3600)))  # Seconds an unused image is kept
+FLIGHT_TTL = float(os.environ.get("SOCIALBUZZ_SHARED_FLIGHT_TTL", "120"))  # Longest a replica may hold a request marker
+FLIGHT_POLL = 0.1  # Seconds between checks while another replica finishes a request
+
+# Identifies this process in the markers it holds
+_REPLICA_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedBackend(abc.ABC):
+    """What a store shared between replicas has to provide. Writes must be atomic; reads should not take locks."""
+
+    # Stored text for a key, or None if it is missing or expired
+    @abc.abstractmethod
+    def get_value(self, key):
+        pass
+
+    @abc.abstractmethod
+    def set_value(self, key, value, ttl):
+        pass
+
+    @abc.abstractmethod
+    def clear_values(self):
+        pass
+
+    # Number of stored values, or None if the store cannot count them cheaply
+    def count_values(self):
+        return None
+
+    # Bytes of a blob; raises KeyError if it is not stored
+    @abc.abstractmethod
+    def get_blob(self, digest):
+        pass
+
+    # Store a blob under its content hash; storing the same content again only marks it as recently used
+    @abc.abstractmethod
+    def put_blob(self, digest, data):
+        pass
+
+    # Take the marker for a request in flight: True if this replica now holds it, False if another one does.
+    # A marker not released within ttl seconds lapses, so a crashed replica cannot block others.
+    @abc.abstractmethod
+    def claim(self, key, ttl):
+        pass
+
+    @abc.abstractmethod
+    def release(self, key):
+        pass
+
+
+# Exclusive lock on a file, held by one process (and one thread) at a time
+class _FileLock:
+    def __init__(self, path):
+        self._file = open(path, "a+b")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._lock.release()
+
+
+class LocalSharedBackend(SharedBackend):
+    """Shared directory for the replicas on one host: SQLite for values and markers, one file per blob."""
+
+    def __init__(self, root, max_entries=DEFAULT_CACHE_MAX_ENTRIES, blob_ttl=SHARED_BLOB_TTL):
+        self.root = root
+        self.max_entries = max_entries
+        self.blob_ttl = blob_ttl
+        self._db_path = os.path.join(root, "shared.sqlite3")
+        self._blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        # Writers from every replica take this lock; readers never do
+        self._write_lock = _FileLock(os.path.join(root, "shared.lock"))
+        self._readers = threading.local()
+        self._last_prune = 0.0
+
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        with self._write_lock:
+            # WAL lets readers see the last committed state while a write is in progress
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_values ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS shared_values_created_at ON shared_values (created_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS flights ("
+                " key TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    # Read-only connection for the calling thread, so reads need no lock of any kind
+    def _reader(self):
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True, isolation_level=None)
+        return conn
+
+    # Run statements in one transaction while holding the write lock
+    def _write(self, *statements):
+        with self._write_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursors = [self._conn.execute(sql, args) for sql, args in statements]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursors
+
+    def get_value(self, key):
+        row = self._reader().execute(
+            "SELECT value FROM shared_values WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    # Entries are evicted oldest first; reads do not record use, which would turn every read into a write
+    def set_value(self, key, value, ttl):
+        now = time.time()
+        self._write(
+            ("INSERT OR REPLACE INTO shared_values (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)", (key, value, now, now + ttl)),
+            ("DELETE FROM shared_values WHERE expires_at <= ?", (now,)),
+            ("DELETE FROM shared_values WHERE key IN (SELECT key FROM shared_values ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)),
+        )
+
+    def clear_values(self):
+        self._write(("DELETE FROM shared_values", ()))
+
+    def count_values(self):
+        return self._reader().execute("SELECT COUNT(*) FROM shared_values WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self._blob_dir, digest[:2], digest)
+
+    def get_blob(self, digest):
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+    # Blobs are written to a temporary file and renamed into place, so no lock is needed to read them
+    def put_blob(self, digest, data):
+        path = self._blob_path(digest)
+        try:
+            os.utime(path)  # Already stored (possibly by another replica); keep it for another blob_ttl
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        if time.time() - self._last_prune >= 3600:
+            self.prune_blobs()
+
+    # Delete blobs nobody has stored or restored for blob_ttl seconds
+    def prune_blobs(self):
+        self._last_prune = time.time()
+        cutoff = self._last_prune - self.blob_ttl
+        for directory, _, files in os.walk(self._blob_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def claim(self, key, ttl):
+        now = time.time()
+        _, inserted = self._write(
+            ("DELETE FROM flights WHERE key = ? AND expires_at <= ?", (key, now)),
+            ("INSERT OR IGNORE INTO flights (key, owner, expires_at) VALUES (?, ?, ?)", (key, _REPLICA_ID, now + ttl)),
+        )
+        return inserted.rowcount == 1
+
+    def release(self, key):
+        self._write(("DELETE FROM flights WHERE key = ? AND owner = ?", (key, _REPLICA_ID)))
+
+
+class SharedCompletionCache:
+    """Completion cache kept in a SharedBackend, so a result from any replica serves all of them."""
+
+    def __init__(self, backend, ttl=DEFAULT_CACHE_TTL, flight_ttl=FLIGHT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.flight_ttl = flight_ttl
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0  # Requests answered by waiting for another replica instead of calling the API
+        self._stats_lock = threading.Lock()  # Sessions and jobs update the counters from many threads
+
+    def get(self, key):
+        value = self.backend.get_value(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.backend.set_value(key, json.dumps(value), self.ttl)
+
+    def clear(self):
+        self.backend.clear_values()
+
+    def stats(self):
+        entries = self.backend.count_values()
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "waits": self.waits}
+
+    # Result of fn() computed by at most one replica at a time: if another replica is already making
+    # this request, wait for its result to appear instead. The result is stored before the marker is
+    # released, so waiters always find it.
+    def compute_once(self, key, fn):
+        while True:
+            if self.backend.claim(key, self.flight_ttl):
+                try:
+                    value = fn()
+                    self.set(key, value)
+                    return value
+                finally:
+                    self.backend.release(key)
+            value = self._wait(key)
+            if value is not None:
+                return value
+
+    # Like compute_once for a token stream. A replica that waits gets the finished text in one piece.
+    # on_cancel(callback) is passed on to make_stream and also ends a wait for another replica at once.
+    def stream_once(self, key, make_stream, on_cancel=None):
+        cancelled = threading.Event()
+        if on_cancel is not None:
+            on_cancel(cancelled.set)
+        while True:
+            if self.backend.claim(key, self.flight_ttl):
+                parts = []
+                try:
+                    for token in make_stream(on_cancel):
+                        parts.append(token)
+                        yield token
+                    self.set(key, "".join(parts))
+                finally:
+                    self.backend.release(key)
+                return
+            value = self._wait(key, cancelled)
+            if value is not None:
+                yield value
+                return
+
+    # The value another replica is producing, or None once its marker is gone without one (it failed
+    # or was cancelled), in which case the caller tries to claim the request itself.
+    # Raises StreamAborted as soon as the optional `cancelled` event is set.
+    def _wait(self, key, cancelled=None):
+        deadline = time.time() + self.flight_ttl
+        while time.time() < deadline:
+            if cancelled is None:
+                time.sleep(FLIGHT_POLL)
+            elif cancelled.wait(FLIGHT_POLL):
+                raise StreamAborted()
+            value = self.backend.get_value(key)
+            if value is not None:
+                with self._stats_lock:
+                    self.waits += 1
+                return json.loads(value)
+            if self.backend.claim(key, self.flight_ttl):
+                self.backend.release(key)
+                return None
+        return None
+
+
+_backend = None
+_backend_loaded = False
+_backend_lock = threading.Lock()
+
+
+# The process-wide shared backend configured through the environment, or None when there is none
+def get_shared_backend():
+    global _backend, _backend_loaded
+    with _backend_lock:
+        if not _backend_loaded:
+            if SHARED_BACKEND:
+                module_name, _, class_name = SHARED_BACKEND.partition(":")
+                _backend = getattr(importlib.import_module(module_name), class_name)()
+            elif SHARED_DIR:
+                _backend = LocalSharedBackend(SHARED_DIR)
+            _backend_loaded = True
+        return _backend
+
+
+# The completion cache to use: shared between replicas when a backend is configured, else this process's own
+def open_completion_cache():
+    backend = get_shared_backend()
+    return SharedCompletionCache(backend) if backend is not None else CompletionCache()
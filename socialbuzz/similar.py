@@ -0,0 +1,65 @@
+"""Near-duplicate detection for post topics: normalised titles compared with MinHash and LSH bands."""
+import functools
+import hashlib
+import os
+import re
+import struct
+import unicodedata
+
+# Share of title trigrams two topics must have in common to count as the same topic
+SIMILARITY_THRESHOLD = float(os.environ.get("SOCIALBUZZ_SIMILAR_THRESHOLD", "0.6"))
+
+# 20 bands of 3 hashes: a pair sharing 60% of its trigrams lands in a common band 99% of the time,
+# while few unrelated titles do; candidates are then checked exactly
+NUM_BANDS = 20
+ROWS_PER_BAND = 3
+NUM_HASHES = NUM_BANDS * ROWS_PER_BAND
+
+# One SHAKE-128 digest per shingle gives all of its hash values at once, unpacked in C
+_SIGNATURE = struct.Struct(f"<{NUM_HASHES}I")
+_BAND_KEY = struct.Struct(">q")
+
+
+# Lower-case words without accents or punctuation, in sorted order: "AI summit - Delhi 2025!" -> "2025 ai delhi summit"
+def normalize_title(title):
+    text = title
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(sorted(re.findall(r"\w+", text.lower())))
+
+
+# Character trigrams of the normalised title (the whole title if it is shorter).
+# Cached, since the same past titles come up as candidates again and again.
+@functools.lru_cache(maxsize=4096)
+def title_shingles(title):
+    text = normalize_title(title)
+    if len(text) < 3:
+        return frozenset([text] if text else [])
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# MinHash signature: for each of NUM_HASHES independent hash functions, the smallest value over the shingles
+def minhash(shingles):
+    rows = [_SIGNATURE.unpack(hashlib.shake_128(s.encode("utf-8")).digest(_SIGNATURE.size)) for s in shingles]
+    return list(map(min, zip(*rows))) if rows else [0] * NUM_HASHES
+
+
+# LSH keys for a request: one per band of the title's MinHash signature, scoped to the platform, tone
+# and length so only requests for the same kind of post collide. Signed 64-bit, to fit an SQLite integer.
+def band_keys(title, platform, tone, length):
+    packed = _SIGNATURE.pack(*minhash(title_shingles(title)))
+    scope = hashlib.blake2b("\x1f".join((platform, tone, length)).encode("utf-8"), digest_size=8)
+    step = 4 * ROWS_PER_BAND
+    keys = []
+    for band in range(NUM_BANDS):
+        h = scope.copy()
+        h.update(bytes([band]) + packed[band * step:(band + 1) * step])
+        keys.append(_BAND_KEY.unpack(h.digest())[0])
+    return keys
@@ -0,0 +1,187 @@
+"""Process-wide coalescing of identical in-flight requests, so concurrent sessions share one API call."""
+import functools
+import threading
+
+CANCEL_POLL = 0.05  # Seconds between cancellation checks while another reader pulls the next token
+
+
+class _Call:
+    """One in-flight call and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """One upstream token stream replayed to every caller that joined it."""
+
+    def __init__(self):
+        self.upstream = None
+        self.parts = []
+        self.finished = False
+        self.error = None
+        self.readers = set()  # One cancellation event per reader still reading
+        self.pull_lock = threading.Lock()
+        self._aborted = False
+        self._on_abort = []
+        self._lock = threading.Lock()
+
+    # Register a callback that aborts the upstream request; it runs once every reader has been cancelled
+    def on_abort(self, callback):
+        with self._lock:
+            if not self._aborted:
+                self._on_abort.append(callback)
+                return
+        callback()
+
+    # Add a reader, given its cancellation event; False if the stream has already been aborted
+    def _join(self, cancelled):
+        with self._lock:
+            if self._aborted:
+                return False
+            self.readers.add(cancelled)
+            return True
+
+    def _abort_if_all_cancelled(self):
+        with self._lock:
+            if self._aborted or not self.readers or not all(cancelled.is_set() for cancelled in self.readers):
+                return
+            self._aborted = True
+            callbacks, self._on_abort = self._on_abort, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; identical calls made meanwhile wait for its result."""
+
+    def __init__(self):
+        # A blocking call and a stream for the same key are different requests, so they are kept apart
+        self._calls = {}  # key -> _Call in flight
+        self._streams = {}  # key -> _Broadcast in flight
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    # Result of fn(), shared with every caller that asks for the same key while it runs.
+    # Errors reach every waiting caller; the next call after it finishes starts afresh.
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    # Tokens of make_stream(on_cancel), shared with every caller that asks for the same key while it streams.
+    # Whichever reader needs the next token pulls it from upstream, so the stream keeps going while
+    # anyone still reads it; late joiners get the tokens so far first.
+    # A caller's on_cancel(callback), e.g. Job.on_cancel, ends its reading as soon as the callback runs;
+    # the on_cancel make_stream gets aborts the upstream request once every reader has been cancelled.
+    def stream(self, key, make_stream, on_cancel=None):
+        cancelled = threading.Event()
+        with self._lock:
+            broadcast = self._streams.get(key)
+            # A stream aborted for its cancelled readers is only waiting for them to leave; start afresh
+            if broadcast is not None and broadcast._join(cancelled):
+                self.coalesced += 1
+            else:
+                broadcast = self._streams[key] = _Broadcast()
+                broadcast.upstream = make_stream(broadcast.on_abort)
+                broadcast._join(cancelled)
+                self.calls += 1
+        if on_cancel is not None:
+            on_cancel(functools.partial(self._cancel_reader, broadcast, cancelled))
+
+        i = 0
+        try:
+            while True:
+                if cancelled.is_set():
+                    return
+                if i < len(broadcast.parts):
+                    yield broadcast.parts[i]
+                    i += 1
+                    continue
+                if broadcast.finished:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                # Waits for another reader's pull a little at a time, so a cancelled reader need not
+                if broadcast.pull_lock.acquire(timeout=CANCEL_POLL):
+                    try:
+                        # Another reader may have pulled while this one waited for the lock
+                        if i == len(broadcast.parts) and not broadcast.finished:
+                            self._pull(key, broadcast)
+                    finally:
+                        broadcast.pull_lock.release()
+        finally:
+            self._leave(key, broadcast, cancelled)
+
+    def _cancel_reader(self, broadcast, cancelled):
+        cancelled.set()
+        broadcast._abort_if_all_cancelled()
+
+    def _pull(self, key, broadcast):
+        try:
+            broadcast.parts.append(next(broadcast.upstream))
+        except StopIteration:
+            self._finish(key, broadcast)
+        except Exception as e:
+            broadcast.error = e
+            self._finish(key, broadcast)
+
+    def _finish(self, key, broadcast):
+        broadcast.finished = True
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    # The last reader to leave an unfinished stream closes it, so the server stops generating
+    def _leave(self, key, broadcast, cancelled):
+        with self._lock:
+            with broadcast._lock:
+                broadcast.readers.discard(cancelled)
+            abandoned = not broadcast.readers and not broadcast.finished
+            if abandoned and self._streams.get(key) is broadcast:
+                del self._streams[key]
+        if abandoned:
+            with broadcast.pull_lock:
+                broadcast.finished = True
+                broadcast.upstream.close()
+        else:
+            broadcast._abort_if_all_cancelled()  # Those left may all have been cancelled
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls) + len(self._streams), "calls": self.calls, "coalesced": self.coalesced}
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    return _single_flight
@@ -0,0 +1,187 @@
+"""Job bodies for the background job manager: posts, platform variants, images and final renders of drafts."""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from socialbuzz.engine import (
+    PLATFORMS,
+    JsonFieldReader,
+    build_adapt_messages,
+    build_post_messages,
+    build_post_with_prompts_messages,
+    choose_post_route,
+    iter_dall_e_images,
+    parse_post_with_prompts,
+    post_with_prompts_format,
+    request_image_prompts,
+    stream_post_tokens,
+)
+from socialbuzz.jobs import JobCancelled
+
+
+# Read a token stream into job.partial[key] (through `display`, if given) and return the full text;
+# cancelling the job closes the stream so the server stops generating
+def _consume_stream(job, tokens, key, display=None):
+    raw = []
+    parts = job.partial[key] = []
+    try:
+        for token in tokens:
+            if job.cancelled:
+                break
+            raw.append(token)
+            parts.append(display(token) if display else token)
+    finally:
+        tokens.close()
+    job.check_cancelled()
+    return "".join(raw).strip()
+
+
+# Write a post, plus its image prompts in the same structured request when num_image_prompts > 0,
+# or adapt an earlier post given as adapt_from=(its title, its text).
+# Returns (post, image prompts or None, route, tokens spent).
+def _write_post(job, title, platform, tone, length, custom_word_count, client, cache, bypass_cache, num_image_prompts=0, adapt_from=None):
+    if adapt_from is not None:
+        num_image_prompts = 0  # Image prompts take their own request afterwards
+    route = choose_post_route(platform, length, custom_word_count, num_image_prompts=num_image_prompts)
+    usage = {}
+    if not num_image_prompts:
+        if adapt_from is not None:
+            messages = build_adapt_messages(title, platform, tone, length, *adapt_from, custom_word_count=custom_word_count)
+        else:
+            messages = build_post_messages(title, platform, tone, length, custom_word_count)
+        tokens = stream_post_tokens(messages, client=client, cache=cache, bypass_cache=bypass_cache, route=route, usage=usage, on_cancel=job.on_cancel)
+        return _consume_stream(job, tokens, platform), None, route, usage
+
+    messages = build_post_with_prompts_messages(title, platform, tone, length, custom_word_count, num_image_prompts)
+    response_format = post_with_prompts_format(num_image_prompts)
+    tokens = stream_post_tokens(messages, client=client, cache=cache, bypass_cache=bypass_cache, route=route, response_format=response_format, usage=usage, on_cancel=job.on_cancel)
+    response_text = _consume_stream(job, tokens, platform, display=JsonFieldReader("post").feed)
+    try:
+        post, prompts = parse_post_with_prompts(response_text, num_image_prompts)
+    except ValueError:
+        # Keep whatever post text came through; the images fall back to a separate prompt request
+        post, prompts = partial_text(job, platform).strip(), None
+        if not post:
+            raise
+    return post, prompts, route, usage
+
+
+# Text streamed so far for a key of job.partial
+def partial_text(job, key):
+    return "".join(job.partial.get(key, ()))
+
+
+# Write one post (used for Create Post, Regenerate Post, regenerating a single variant and adapting a past post)
+def post_task(job, title, platform, tone, length, custom_word_count, client=None, cache=None, bypass_cache=False, num_image_prompts=0, adapt_from=None):
+    job.report(0.0, f"{'Adapting' if adapt_from else 'Writing'} your {platform} post...")
+    post, prompts, route, usage = _write_post(job, title, platform, tone, length, custom_word_count, client, cache, bypass_cache, num_image_prompts, adapt_from)
+    return {"post": post, "routes": {platform: route}, "image_prompts": {platform: prompts} if prompts else {}, "usage": {platform: usage}}
+
+
+# Write every platform variant concurrently; platforms that fail are reported without failing the others
+def variants_task(job, title, tone, length, custom_word_count, client=None, cache=None, bypass_cache=False, num_image_prompts=0):
+    job.report(0.0, "Writing a post for every platform...")
+
+    def write(platform):
+        return _write_post(job, title, platform, tone, length, custom_word_count, client, cache, bypass_cache, num_image_prompts)
+
+    variants = {}
+    routes = {}
+    image_prompts = {}
+    usage = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=len(PLATFORMS)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, write, platform): platform for platform in PLATFORMS}
+        for future in as_completed(futures):
+            platform = futures[future]
+            try:
+                variants[platform], prompts, routes[platform], usage[platform] = future.result()
+                if prompts:
+                    image_prompts[platform] = prompts
+            except JobCancelled:
+                continue
+            except Exception as e:
+                errors[platform] = str(e)
+            job.report((len(variants) + len(errors)) / len(PLATFORMS), f"{len(variants)} of {len(PLATFORMS)} posts written...")
+
+    job.check_cancelled()
+    if not variants:
+        raise RuntimeError("; ".join(f"{platform}: {error}" for platform, error in errors.items()))
+    return {"variants": variants, "errors": errors, "routes": routes, "image_prompts": image_prompts, "usage": usage}
+
+
+# Wait for a future while staying responsive to cancellation
+def _wait(job, future, poll=0.2):
+    while True:
+        job.check_cancelled()
+        try:
+            return future.result(timeout=poll)
+        except FutureTimeoutError:
+            continue
+
+
+# Render images for the prompts in the given mode, reporting progress from `start` to 1.
+# Returns (images, the prompt behind each image, errors).
+def _render_images(job, prompts, client, mode, start=0.1):
+    results = [[] for _ in prompts]
+    errors = []
+    completed = 0
+    started = time.time()
+    generated = iter_dall_e_images(prompts, client=client, mode=mode, on_cancel=job.on_cancel)
+    try:
+        for i, result in generated:
+            # Stopping here also drops DALL-E requests that have not been sent yet
+            job.check_cancelled()
+            completed += 1
+            if isinstance(result, Exception):
+                errors.append(f"Error generating image {i+1}: {str(result)}")
+            else:
+                results[i] = result
+            job.report(start + (1 - start) * completed / len(prompts), f"Generated {completed} of {len(prompts)} images ({time.time() - started:.0f}s)...")
+    finally:
+        generated.close()
+    images = [image for result in results for image in result]
+    sources = [prompts[i] for i, result in enumerate(results) for _ in result]
+    return images, sources, errors
+
+
+# Image prompts plus images for them, in the given mode ("draft" candidates or "final" images).
+# Prompts written with the post are used as given, and speculative results are picked up when a
+# prefetch is handed over.
+def images_task(job, title, post, num_images=2, client=None, cache=None, bypass_cache=False, prefetch=None, prompts=None, mode="final"):
+    images, sources, errors = [], [], []
+    if prompts is None and prefetch is not None:
+        job.report(0.05, "Using image prompts prepared in the background...")
+        try:
+            prompts, images, sources = _wait(job, prefetch.future)
+        except JobCancelled:
+            prefetch.cancel()
+            raise
+        except Exception:
+            prompts, images, sources = None, [], []  # Fall back to generating them here
+        if prefetch.mode != mode:
+            images, sources = [], []  # Prepared for the other mode; only the prompts carry over
+
+    if prompts is None:
+        job.report(0.05, "Creating image prompts...")
+        try:
+            prompts = request_image_prompts(title, post, num_images, client=client, cache=cache, bypass_cache=bypass_cache)
+        except Exception as e:
+            errors.append(f"Error generating image prompts: {str(e)}")
+            prompts = [f"Professional square image related to {title}"] * num_images  # Fallback prompts
+    job.check_cancelled()
+
+    if prompts and not images:
+        job.report(0.1, f"Generating {'draft ' if mode == 'draft' else ''}images for {len(prompts)} prompts...")
+        images, sources, render_errors = _render_images(job, prompts, client, mode)
+        errors.extend(render_errors)
+
+    return {"prompts": prompts, "images": images, "sources": sources, "mode": mode, "errors": errors}
+
+
+# Render the prompts behind the draft images the user picked again in final quality
+def finalize_images_task(job, prompts, client=None):
+    job.report(0.0, f"Rendering {len(prompts)} images at full quality...")
+    images, sources, errors = _render_images(job, prompts, client, "final", start=0.0)
+    return {"prompts": prompts, "images": images, "sources": sources, "mode": "final", "errors": errors}
@@ -0,0 +1,190 @@
+"""Local platform length rules: Twitter's weighted character count, thread splitting and limit checks."""
+import re
+import unicodedata
+
+# Maximum post length per platform, in the units the platform counts (weighted characters for Twitter)
+PLATFORM_LIMITS = {"Twitter": 280, "LinkedIn": 3000, "WhatsApp": 65536}
+
+# twitter-text v3 weighting: code points in these ranges count once, everything else twice,
+# every URL counts as 23 after t.co shortening and every emoji sequence counts as 2
+TWITTER_LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+TWITTER_URL_LENGTH = 23
+TWITTER_EMOJI_LENGTH = 2
+
+_EMOJI_BASE = "[\U0001F000-\U0001FAFF\u2190-\u21FF\u2300-\u23FF\u2600-\u27BF\u2B00-\u2BFF\u3030\u303D\u3297\u3299]"
+_EMOJI_TAIL = "(?:\uFE0F|[\U0001F3FB-\U0001F3FF])*"  # Variation selector and skin tones
+EMOJI_RE = re.compile(
+    "[\U0001F1E6-\U0001F1FF]{2}"  # Flags
+    "|[#*0-9]\uFE0F?\u20E3"  # Keycaps
+    f"|{_EMOJI_BASE}{_EMOJI_TAIL}(?:\u200D{_EMOJI_BASE}{_EMOJI_TAIL})*"  # ZWJ sequences count once
+)
+URL_RE = re.compile(
+    r"(?:https?://|www\.)[^\s<>\"]*[^\s<>\".,!?;:)\]'\"]"
+    r"|\b(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+(?:com|net|org|io|ai|co|dev|app|in|uk|us|me|ly|gg|tv|info|biz|edu|gov)\b(?:/[^\s<>\"]*[^\s<>\".,!?;:)\]'\"])?",
+    re.IGNORECASE,
+)
+_TOKEN_RE = re.compile(f"(?P<url>{URL_RE.pattern})|(?P<emoji>{EMOJI_RE.pattern})", re.IGNORECASE)
+
+# Existing thread numbering on a tweet: "1/5. ", "(2/5) " at the start or " 3/5" (as split_thread writes it) at the end.
+# A bare "24/7" or "9/10" in prose matches too, so markers only count when a whole post is numbered 1..N.
+_LEADING_MARKER_RE = re.compile(r"^\(?(\d+)/(\d+)\)?[.:)]\s+")
+_TRAILING_MARKER_RE = re.compile(r"\s\(?(\d+)/(\d+)\)?$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?\u2026])\s+(?=\S)")
+# Words whose period does not end a sentence (compared lower-case, without the final period)
+_ABBREVIATIONS = frozenset((
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "a.m", "p.m",
+    "inc", "ltd", "co", "corp", "dept", "approx", "no", "fig", "u.s", "u.k",
+))
+
+
+def _char_weight(char):
+    code = ord(char)
+    return 1 if any(start <= code <= end for start, end in TWITTER_LIGHT_RANGES) else 2
+
+
+# Length of text as Twitter counts it toward the 280 character limit
+def twitter_length(text):
+    text = unicodedata.normalize("NFC", text)
+    length = 0
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        length += sum(_char_weight(char) for char in text[pos:match.start()])
+        length += TWITTER_URL_LENGTH if match.group("url") else TWITTER_EMOJI_LENGTH
+        pos = match.end()
+    return length + sum(_char_weight(char) for char in text[pos:])
+
+
+# Length of a post in the units its platform counts
+def post_length(text, platform):
+    return twitter_length(text) if platform == "Twitter" else len(text)
+
+
+# A tweet without its "n/N" marker, or None unless it is marked as tweet `number` of `count`
+def _strip_marker(tweet, number, count):
+    for pattern in (_LEADING_MARKER_RE, _TRAILING_MARKER_RE):
+        match = pattern.search(tweet)
+        if match and (int(match.group(1)), int(match.group(2))) == (number, count):
+            return (tweet[:match.start()] + tweet[match.end():]).strip()
+    return None
+
+
+# Tweets of a post that is already a numbered thread (blank-line separated, marked 1/N to N/N in order), else None
+def parse_thread(text):
+    tweets = [tweet.strip() for tweet in re.split(r"\n\s*\n", text.strip()) if tweet.strip()]
+    if len(tweets) > 1 and all(_strip_marker(tweet, i, len(tweets)) is not None for i, tweet in enumerate(tweets, 1)):
+        return tweets
+    return None
+
+
+# Problems with a post that the platform would reject, as readable messages (empty when the post fits).
+# A numbered Twitter thread is checked tweet by tweet.
+def validate_post(text, platform):
+    limit = PLATFORM_LIMITS.get(platform)
+    if limit is None:
+        return []
+    thread = parse_thread(text) if platform == "Twitter" else None
+    if thread:
+        return [
+            f"Tweet {i} counts as {twitter_length(tweet)} characters; Twitter allows {limit}."
+            for i, tweet in enumerate(thread, 1)
+            if twitter_length(tweet) > limit
+        ]
+    length = post_length(text, platform)
+    if length > limit:
+        return [f"{platform} allows {limit} characters; this post counts as {length} ({length - limit} over)."]
+    return []
+
+
+# Whether text ending in a period ends with an abbreviation or an initial ("Dr.", "e.g.", "J.") rather than a sentence
+def _ends_with_abbreviation(text):
+    if not text.endswith("."):
+        return False
+    word = text.rsplit(None, 1)[-1].lstrip("([\"'\u201c\u2018").rstrip(".").lower()
+    return word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+# Sentences of a piece of text. A break needs end punctuation followed by a word that does not start
+# lower-case, and not after a common abbreviation: "Meet Dr. Rao at 5 p.m. today." stays whole.
+def split_sentences(text):
+    text = text.strip()
+    sentences, start = [], 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        if text[match.end()].islower() or _ends_with_abbreviation(text[start:match.start()]):
+            continue
+        sentences.append(text[start:match.start()])
+        start = match.end()
+    sentences.append(text[start:])
+    return [sentence for sentence in sentences if sentence]
+
+
+# Break a piece of text that is too long for one tweet at word boundaries (or anywhere, for a huge word)
+def _split_words(text, limit):
+    chunks, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if twitter_length(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        current = word
+        while twitter_length(current) > limit:
+            cut = len(current)
+            while cut > 1 and twitter_length(current[:cut]) > limit:
+                cut -= 1
+            chunks.append(current[:cut])
+            current = current[cut:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Pack sentences greedily into chunks of at most `limit` weighted characters
+def _pack(paragraphs, limit, keep_paragraphs):
+    chunks, current = [], ""
+    for paragraph in paragraphs:
+        if keep_paragraphs and current:
+            chunks.append(current)
+            current = ""
+        separator = "\n\n"  # Paragraphs that share a tweet stay visually separate
+        for sentence in split_sentences(paragraph):
+            pieces = [sentence] if twitter_length(sentence) <= limit else _split_words(sentence, limit)
+            for piece in pieces:
+                candidate = f"{current}{separator}{piece}" if current else piece
+                if twitter_length(candidate) <= limit:
+                    current = candidate
+                else:
+                    chunks.append(current)
+                    current = piece
+                separator = " "
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Split a post into a numbered Twitter thread, breaking at sentence boundaries; the numbering of a post
+# that is already a numbered thread is replaced. keep_paragraphs starts a new tweet at every blank line,
+# for posts that were written as a thread already.
+def split_thread(text, limit=PLATFORM_LIMITS["Twitter"], numbered=True, keep_paragraphs=False):
+    thread = parse_thread(text)
+    if thread:
+        paragraphs = [_strip_marker(tweet, i, len(thread)) for i, tweet in enumerate(thread, 1)]
+    else:
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text.strip())]
+    paragraphs = [p for p in paragraphs if p]
+    if not paragraphs:
+        return []
+
+    chunks = _pack(paragraphs, limit, keep_paragraphs)
+    if not numbered or len(chunks) == 1:
+        return chunks
+
+    # Reserve room for the " n/N" suffix; a longer suffix can change the count, so repeat until stable
+    count = len(chunks)
+    while True:
+        reserve = twitter_length(f" {count}/{count}")
+        chunks = _pack(paragraphs, limit - reserve, keep_paragraphs)
+        if len(chunks) <= count:
+            break
+        count = len(chunks)
+    return [f"{chunk} {i}/{len(chunks)}" for i, chunk in enumerate(chunks, 1)]
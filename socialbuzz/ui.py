@@ -0,0 +1,177 @@
+"""Static page furniture for the Streamlit app: styles and option tables, built once per process."""
+import re
+
+# Styles for the whole page; the app script reruns on every interaction, this module does not
+_APP_CSS = """
+    .main {
+        background-color: #f0f2f6;
+    }
+    .stButton>button {
+        background-color: #4267B2;
+        color: white;
+        border-radius: 20px;
+        padding: 10px 24px;
+        font-weight: bold;
+    }
+    .stButton>button:hover {
+        background-color: #365899;
+    }
+    .copy-btn {
+        background-color: #25D366;
+        color: white;
+        border-radius: 20px;
+        padding: 5px 15px;
+        font-weight: bold;
+        border: none;
+        cursor: pointer;
+    }
+    .copy-btn:hover {
+        background-color: #128C7E;
+    }
+    .platform-header {
+        font-size: 24px;
+        font-weight: bold;
+        margin-bottom: 10px;
+    }
+    .post-container {
+        background-color: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        margin-bottom: 20px;
+    }
+    .input-container {
+        background-color: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        margin-bottom: 20px;
+    }
+    .image-container {
+        background-color: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        margin-top: 20px;
+        margin-bottom: 20px;
+    }
+    .image-grid {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 10px;
+        justify-content: space-around;
+    }
+    .image-card {
+        border: 1px solid #ddd;
+        border-radius: 8px;
+        padding: 10px;
+        margin-bottom: 10px;
+        width: 250px;
+    }
+    /* Aggressively target and remove all capsule containers and dividers */
+    div[data-testid="stCaptionContainer"],
+    div[data-testid="stHeader"],
+    div[data-baseweb="card"],
+    div.stMarkdown > div > div {
+        background-color: transparent !important;
+        border: none !important;
+        box-shadow: none !important;
+        padding: 0 !important;
+        margin: 0 !important;
+    }
+    
+    /* Target subheaders specifically */
+    .stSubheader > div:first-child {
+        background-color: transparent !important;
+        border: none !important;
+        box-shadow: none !important;
+        padding: 0 !important;
+    }
+    
+    /* Fix specific styling for headers */
+    h1, h2, h3, h4, h5, h6 {
+        margin-top: 0.75em !important;
+        margin-bottom: 0.5em !important;
+        padding: 0 !important;
+        background: none !important;
+        border: none !important;
+    }
+    
+    /* Fix for step containers */
+    section[data-testid="stSidebar"] > div,
+    .main > div {
+        background-color: transparent !important;
+        border: none !important;
+    }
+    .stDownloadButton>button {
+        background-color: #5b7dff;
+        color: white !important; /* Force white text color */
+        border-radius: 12px;
+        padding: 8px 10px;
+        font-weight: bold;
+        border: none;
+        width: 100%;
+        margin-top: 5px;
+        transition: all 0.3s ease;
+    }
+    .stDownloadButton>button:hover {
+        background-color: #3957e0;
+        transform: translateY(-2px);
+        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+        color: white !important; /* Keep text white even on hover */
+    }
+    .regenerate-btn {
+        background-color: #FF5722;
+        color: white;
+        border-radius: 20px;
+        padding: 5px 15px;
+        font-weight: bold;
+        border: none;
+        cursor: pointer;
+    }
+/* Target and remove white capsule dividers around subheaders */
+.stSubheader {
+    border: none !important;
+    background-color: transparent !important;
+    padding: 0 !important;
+    margin: 0 !important;
+    box-shadow: none !important;
+}
+
+/* Target the specific subheader wrapper Streamlit uses */
+.stSubheader > div {
+    border: none !important;
+    background-color: transparent !important;
+    padding: 0 !important;
+    margin: 0 !important;
+    box-shadow: none !important;
+}
+"""
+
+
+# Drop comments and layout whitespace; the stylesheet goes out with every full rerun
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+
+APP_STYLE = f"<style>{_minify_css(_APP_CSS)}</style>"
+
+# Platform option that writes a variant for every platform at once
+ALL_PLATFORMS = "All platforms"
+PLATFORM_ICONS = {"LinkedIn": "🔗", "Twitter": "🐦", "WhatsApp": "💬"}
+
+# Select box options; the empty first entry means "not chosen yet"
+PLATFORM_OPTIONS = ("", "LinkedIn", "Twitter", "WhatsApp", ALL_PLATFORMS)
+TONE_OPTIONS = (
+    "", "Professional", "Casual", "Sarcastic", "Humorous", "Inspirational",
+    "Excited/Hyped", "Minimalist", "Storytelling", "Authoritative", "Marketing/Salesy",
+)
+LENGTH_OPTIONS = ("", "Short", "Medium", "Long", "Thread/Multiple Messages", "Custom Length")
+_OPTION_INDEX = {options: {option: i for i, option in enumerate(options)} for options in (PLATFORM_OPTIONS, TONE_OPTIONS, LENGTH_OPTIONS)}
+
+
+# Position of a saved choice in its options, or 0 (the empty option) if it is not one of them
+def option_index(options, value):
+    return _OPTION_INDEX[options].get(value, 0)
@@ -0,0 +1,108 @@
+import io
+import json
+import threading
+
+import pytest
+
+from socialbuzz import batch
+from socialbuzz.batch import completed_ids, row_id, run_batch
+
+
+class Route:
+    name = "standard"
+    model = "gpt-4"
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    path = tmp_path / "calendar.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(6):
+            f.write(json.dumps({"title": f"Topic {i}", "platform": "LinkedIn", "tone": "Casual", "length": "Short"}) + "\n")
+    return str(path)
+
+
+# Stand-in for _generate that records the titles it was asked for
+def recording(titles):
+    def generate(row, *args):
+        titles.append(row["title"])
+        return f"Post about {row['title']}", Route, 0.01
+    return generate
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    titles = []
+    monkeypatch.setattr(batch, "_generate", recording(titles))
+    return titles
+
+
+def test_row_id():
+    row = {"title": "AI Summit", "platform": "LinkedIn", "tone": "Casual", "length": "Short"}
+    assert row_id(row) == row_id(dict(row))
+    assert row_id(row) != row_id({**row, "tone": "Professional"})
+    assert row_id(row) != row_id({**row, "custom_word_count": "250"})
+    assert row_id({**row, "id": 7}) == "7"
+
+
+def test_resume_skips_rows_already_written(tmp_path, calendar, generated):
+    output = str(tmp_path / "posts.jsonl")
+    assert run_batch(calendar, output, workers=2, log=io.StringIO()) == {"ok": 6, "error": 0}
+    assert len(completed_ids(output)) == 6
+
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "trunc')  # Partial line from an interrupted write
+    assert run_batch(calendar, output, log=io.StringIO()) == {"ok": 0, "error": 0}
+    assert len(generated) == 6
+
+
+def test_failed_rows_are_retried_on_resume(tmp_path, calendar, generated, monkeypatch):
+    output = str(tmp_path / "posts.jsonl")
+
+    def flaky(row, *args):
+        if row["title"] == "Topic 3":
+            raise RuntimeError("server error")
+        return "Post", Route, 0.01
+
+    monkeypatch.setattr(batch, "_generate", flaky)
+    assert run_batch(calendar, output, log=io.StringIO()) == {"ok": 5, "error": 1}
+    monkeypatch.setattr(batch, "_generate", recording(generated))
+    assert run_batch(calendar, output, log=io.StringIO()) == {"ok": 1, "error": 0}
+    assert generated == ["Topic 3"]
+
+
+class InterruptingLog(io.StringIO):
+    """Raises KeyboardInterrupt, as Ctrl-C would, once the first row has been reported."""
+
+    def write(self, text):
+        if text.startswith("[1/") and "[1/" not in self.getvalue():
+            super().write(text)
+            raise KeyboardInterrupt
+        return super().write(text)
+
+
+def test_interrupt_keeps_rows_in_flight_and_skips_the_rest(tmp_path, calendar, monkeypatch):
+    output = str(tmp_path / "posts.jsonl")
+    started = []
+    second_started = threading.Event()
+
+    def generate(row, *args):
+        started.append(row["title"])
+        if row["title"] == "Topic 0":
+            second_started.wait(5)  # Finish first, while Topic 1 is still in flight
+            return "Post", Route, 0.01
+        second_started.set()
+        threading.Event().wait(0.2)
+        return "Post", Route, 0.01
+
+    monkeypatch.setattr(batch, "_generate", generate)
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(calendar, output, workers=2, log=InterruptingLog())
+
+    saved = completed_ids(output)
+    assert len(saved) == len(started)  # Every row paid for was written
+    assert len(started) < 6  # Rows not started were cancelled
+
+    monkeypatch.setattr(batch, "_generate", recording(started))
+    assert run_batch(calendar, output, log=io.StringIO())["ok"] == 6 - len(saved)
+    assert sorted(started) == sorted(f"Topic {i}" for i in range(6))  # Nothing generated twice
@@ -0,0 +1,47 @@
+import os
+import time
+
+from socialbuzz.blobstore import BlobStore
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_sweep_releases_dead_owners(tmp_path):
+    store = BlobStore(str(tmp_path), sweep_interval=0)
+    kept = store.put(b"kept", owner="alive")
+    gone = store.put(b"gone", owner="dead")
+    store.sweep(lambda owner: owner == "alive")
+    assert store.get(kept) == b"kept"
+    assert not os.path.exists(store._path(gone))
+
+
+def test_sweep_removes_old_files_nobody_owns(tmp_path):
+    earlier = BlobStore(str(tmp_path))
+    orphan = earlier.put(b"left by an earlier run")
+    recent = earlier.put(b"written moments ago")
+    age(earlier._path(orphan), 7200)
+
+    store = BlobStore(str(tmp_path), sweep_interval=0, orphan_ttl=3600)
+    owned = store.put(b"still shown", owner="alive")
+    age(store._path(owned), 7200)
+    partial = tmp_path / owned[:2] / "tmpabc123"
+    partial.write_bytes(b"interrupted write")
+    age(partial, 7200)
+
+    store.sweep(lambda owner: True)
+    assert not os.path.exists(store._path(orphan))
+    assert not partial.exists()
+    assert os.path.exists(store._path(recent))
+    assert store.get(owned) == b"still shown"
+
+
+def test_put_refreshes_an_existing_file(tmp_path):
+    store = BlobStore(str(tmp_path), sweep_interval=0, orphan_ttl=3600)
+    digest = store.put(b"image")
+    age(store._path(digest), 7200)
+    store.put(b"image")
+    store.sweep(lambda owner: True)
+    assert store.get(digest) == b"image"
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+from socialbuzz import cache as cache_module, client
+from socialbuzz.cache import CompletionCache, make_cache_key
+from socialbuzz.client import RateLimiter
+from socialbuzz.engine import request_post
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return CompletionCache(str(tmp_path / "completions.sqlite3"), ttl=60, max_entries=2)
+
+
+def test_cache_key_covers_every_input():
+    messages = [{"role": "user", "content": "Write a post"}]
+    key = make_cache_key("gpt-4", messages, temperature=0.7, max_tokens=500)
+    assert key == make_cache_key("gpt-4", [dict(messages[0])], max_tokens=500, temperature=0.7)
+    assert key != make_cache_key("gpt-3.5-turbo", messages, temperature=0.7, max_tokens=500)
+    assert key != make_cache_key("gpt-4", messages, temperature=0.8, max_tokens=500)
+    assert key != make_cache_key("gpt-4", [{"role": "user", "content": "Write a tweet"}], temperature=0.7, max_tokens=500)
+
+
+def test_hits_and_misses_are_counted(cache):
+    assert cache.get("k") is None
+    cache.set("k", {"post": "Hello"})
+    assert cache.get("k") == {"post": "Hello"}
+    assert cache.get("k") == {"post": "Hello"}
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1}
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.set("k", "post")
+    clock[0] += 60
+    assert cache.get("k") == "post"
+    clock[0] += 1
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0  # Removed on the miss
+
+    cache.set("old", "post")
+    clock[0] += 61
+    cache.set("new", "post")  # Expired entries are swept on every write
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(cache, clock):
+    cache.set("a", "post a")
+    clock[0] += 1
+    cache.set("b", "post b")
+    clock[0] += 1
+    assert cache.get("a") == "post a"  # Now used more recently than b
+    clock[0] += 1
+    cache.set("c", "post c")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("post a", "post c")
+
+
+def test_entries_survive_a_reopen(cache):
+    cache.set("k", "post")
+    reopened = CompletionCache(cache.path, ttl=60, max_entries=2)
+    assert reopened.get("k") == "post"
+
+
+def test_bypass_skips_the_cache_and_replaces_the_entry(cache, monkeypatch):
+    monkeypatch.setattr(client, "_rate_limiter", RateLimiter({}))
+    posts = iter(["First post", "Second post"])
+
+    def create(**params):
+        message = SimpleNamespace(content=next(posts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    messages = [{"role": "user", "content": "Write a post"}]
+    assert request_post(messages, client=fake, cache=cache) == "First post"
+    assert request_post(messages, client=fake, cache=cache) == "First post"  # Served from the cache
+    assert request_post(messages, client=fake, cache=cache, bypass_cache=True) == "Second post"
+    assert request_post(messages, client=fake, cache=cache) == "Second post"
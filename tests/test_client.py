@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from socialbuzz import client
+from socialbuzz.client import (
+    RateLimiter,
+    TokenBucket,
+    _retry_after,
+    call_with_retry,
+    estimate_tokens,
+    stream_chat_completion,
+)
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]  # 100 tokens
+
+
+def rate_limit_error(headers=None):
+    response = SimpleNamespace(request=None, status_code=429, headers=headers or {})
+    return openai.RateLimitError("slow down", response=response, body=None)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(client, "_rate_limiter", RateLimiter({"gpt-4": {"rpm": 600, "tpm": 1000, "concurrency": 2}}))
+    monkeypatch.setattr(client.random, "uniform", lambda a, b: 0)  # No backoff sleeps
+    return client.get_rate_limiter().for_model("gpt-4")
+
+
+def test_token_bucket_takes_refunds_and_caps():
+    bucket = TokenBucket(60, capacity=10)
+    bucket.acquire(8)
+    assert bucket.tokens < 3
+    bucket.refund(100)
+    assert bucket.tokens == 10
+    bucket.acquire(1000)  # More than the capacity: takes the whole bucket rather than waiting forever
+    assert bucket.tokens < 1
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(6000, capacity=10)  # 100 tokens a second
+    bucket.acquire(10)
+    bucket.acquire(5)  # About 50 ms
+    assert bucket.tokens < 1
+
+
+def test_retry_after():
+    assert _retry_after(rate_limit_error({"retry-after-ms": "250"})) == 0.25
+    assert _retry_after(rate_limit_error({"retry-after": "3"})) == 3.0
+    assert _retry_after(rate_limit_error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert _retry_after(rate_limit_error()) is None
+    assert _retry_after(ValueError()) is None
+
+
+def test_call_with_retry_retries_transient_errors_and_refunds_failed_attempts(limiter):
+    attempts = []
+
+    def request():
+        attempts.append(limiter.tokens.tokens)
+        if len(attempts) < 3:
+            raise rate_limit_error({"retry-after-ms": "0"})
+        return "ok"
+
+    assert call_with_retry(request, "gpt-4", tokens=300) == "ok"
+    assert len(attempts) == 3
+    assert min(attempts) > 650  # Each attempt held one reservation, never several
+    assert 650 < limiter.tokens.tokens < 750
+
+
+def test_call_with_retry_gives_up(limiter):
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        call_with_retry(request, "gpt-4", tokens=300, max_retries=2)
+    assert len(attempts) == 3
+    assert limiter.tokens.tokens > 990
+
+    with pytest.raises(ValueError):
+        call_with_retry(lambda: attempts.append(1) or int("x"), "gpt-4", tokens=300)
+    assert len(attempts) == 4  # Not retried
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def fake_client(stream):
+    completions = SimpleNamespace(create=lambda **params: stream)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_stream_refunds_unused_tokens_from_usage(limiter):
+    reserved = estimate_tokens(MESSAGES, 500)
+    chunks = [SimpleNamespace(usage=None), SimpleNamespace(usage=None), SimpleNamespace(usage=SimpleNamespace(total_tokens=150))]
+    stream = FakeStream(chunks)
+    assert list(stream_chat_completion(fake_client(stream), model="gpt-4", messages=MESSAGES, max_tokens=500)) == chunks
+    assert reserved == 600
+    assert stream.closed
+    assert 840 < limiter.tokens.tokens < 860  # Charged 150, not 600
+
+
+def test_stream_without_usage_refunds_everything(limiter):
+    stream = FakeStream([SimpleNamespace(usage=None)] * 3)
+    tokens = stream_chat_completion(fake_client(stream), model="gpt-4", messages=MESSAGES, max_tokens=500)
+    next(tokens)
+    tokens.close()  # Reader stopped before the usage chunk
+    assert stream.closed
+    assert limiter.tokens.tokens > 990
@@ -0,0 +1,87 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from socialbuzz.export import batch_records, export_records, history_records, image_extension
+from socialbuzz.history import History
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"red square"
+JPEG = b"\xff\xd8\xff" + b"blue circle"
+
+
+@pytest.fixture
+def history(tmp_path):
+    return History(str(tmp_path / "history.sqlite3"), str(tmp_path / "images"))
+
+
+def read_export(file):
+    with zipfile.ZipFile(file) as bundle:
+        posts = [json.loads(line) for line in bundle.read("posts.jsonl").decode("utf-8").splitlines()]
+        images = {name: bundle.read(name) for name in bundle.namelist() if name.startswith("images/")}
+    return posts, images
+
+
+def test_image_extension():
+    assert image_extension(PNG) == "png"
+    assert image_extension(JPEG) == "jpg"
+    assert image_extension(b"RIFF\0\0\0\0WEBPVP8 ") == "webp"
+    assert image_extension(b"GIF89a") == "bin"
+
+
+def test_history_records_pages_through_every_post(history):
+    ids = [history.add_post(f"Topic {i}", "LinkedIn", "Casual", "Short", f"Post {i}") for i in range(5)]
+    history.add_post("Quarterly payroll deadline", "Twitter", "Casual", "Short", "Unrelated")
+    assert [post["id"] for post in history_records(history, "topic", page_size=2)] == ids[::-1]
+    assert len(list(history_records(history, page_size=2))) == 6
+
+
+def test_history_export_round_trip(history, tmp_path):
+    first = history.add_post("AI Summit", "LinkedIn", "Casual", "Short", "Join us", image_prompts=["A red square"])
+    history.add_images(first, [PNG], ["A red square"])
+    second = history.add_post("AI Summit recap", "Twitter", "Casual", "Short", "What a day \U0001F680")
+    history.add_images(second, [PNG, JPEG], ["A red square", "A blue circle"])
+
+    path = str(tmp_path / "history.zip")
+    counts = export_records(path, history_records(history), history.load_image)
+    assert counts == {"posts": 2, "images": 2, "missing_images": 0}
+
+    posts, images = read_export(path)
+    assert [post["id"] for post in posts] == [second, first]
+    assert posts[0]["text"] == "What a day \U0001F680"
+    assert posts[1]["image_prompts"] == ["A red square"]
+    # The image both posts use is stored once and referenced by both
+    assert sorted(images.values()) == sorted([PNG, JPEG])
+    assert posts[0]["images"][0]["file"] == posts[1]["images"][0]["file"]
+    assert images[posts[0]["images"][1]["file"]] == JPEG
+    assert posts[0]["images"][1]["prompt"] == "A blue circle"
+
+
+def test_pruned_images_are_reported_missing(history):
+    post_id = history.add_post("AI Summit", "LinkedIn", "Casual", "Short", "Join us")
+    history.add_images(post_id, [PNG, JPEG])
+    history.images.discard(history.get(post_id)["images"][0][0])
+
+    file = io.BytesIO()
+    assert export_records(file, history_records(history), history.load_image)["missing_images"] == 1
+    posts, images = read_export(file)
+    assert list(images.values()) == [JPEG]
+    assert [image["file"] is None for image in posts[0]["images"]] == [True, False]
+
+
+def test_batch_records(tmp_path):
+    results = tmp_path / "posts.jsonl"
+    rows = [
+        {"id": "a", "status": "ok", "title": "AI Summit", "platform": "LinkedIn", "tone": "Casual", "length": "Short", "post": "Join us"},
+        {"id": "b", "status": "error", "title": "Payroll", "platform": "Twitter", "tone": "Casual", "length": "Short", "error": "timeout"},
+    ]
+    results.write_text("".join(json.dumps(row) + "\n" for row in rows) + '{"id": "c", "sta', encoding="utf-8")
+
+    records = list(batch_records(str(results)))
+    assert [(record["id"], record["text"]) for record in records] == [("a", "Join us")]
+    counts = export_records(str(tmp_path / "batch.zip"), records)
+    assert counts == {"posts": 1, "images": 0, "missing_images": 0}
+    posts, _ = read_export(str(tmp_path / "batch.zip"))
+    assert posts == [{"id": "a", "title": "AI Summit", "platform": "LinkedIn", "tone": "Casual", "length": "Short", "text": "Join us", "images": []}]
+
@@ -0,0 +1,51 @@
+import threading
+
+from socialbuzz.jobs import Job, JobManager
+
+
+def test_cancel_runs_registered_callbacks_once():
+    job = Job("post")
+    calls = []
+    job.on_cancel(lambda: calls.append("abort"))
+    job.cancel()
+    job.cancel()
+    assert calls == ["abort"]
+    assert job.status == "cancelled"
+
+
+def test_callback_registered_after_cancel_runs_at_once():
+    job = Job("post")
+    job.cancel()
+    calls = []
+    job.on_cancel(lambda: calls.append("abort"))
+    assert calls == ["abort"]
+
+
+def test_cancel_unblocks_a_running_job():
+    manager = JobManager(max_workers=1)
+    unblocked = threading.Event()
+
+    def body(job):
+        wake = threading.Event()
+        job.on_cancel(wake.set)
+        wake.wait(5)
+        unblocked.set()
+        job.check_cancelled()
+
+    job = manager.submit("images", body)
+    while job.status == "queued":
+        pass
+    job.cancel()
+    assert unblocked.wait(1)
+    assert job.status == "cancelled"
+
+
+def test_finished_job_ignores_cancel():
+    job = Job("post")
+    job._start()
+    job._finish("done", result="post")
+    calls = []
+    job.on_cancel(lambda: calls.append("abort"))
+    job.cancel()
+    assert job.status == "done"
+    assert calls == []
@@ -0,0 +1,26 @@
+from socialbuzz.settings import DEFAULT_SETTINGS, load_settings
+
+
+def write(tmp_path, text):
+    path = tmp_path / "socialbuzz.toml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_missing_file_means_defaults(tmp_path):
+    assert load_settings(str(tmp_path / "missing.toml")) == DEFAULT_SETTINGS
+
+
+def test_nested_tables_keep_the_keys_they_leave_out(tmp_path):
+    settings = load_settings(write(tmp_path, '[images.draft]\nmodel = "dall-e-3"\n\n[pricing.chat]\ngpt-4o-mini = [0.00015, 0.0006]\n'))
+    assert settings["images"]["draft"] == {"model": "dall-e-3", "size": "256x256", "n": 2}
+    assert settings["images"]["final"] == DEFAULT_SETTINGS["images"]["final"]
+    assert settings["pricing"]["chat"]["gpt-4"] == [0.03, 0.06]
+    assert settings["pricing"]["chat"]["gpt-4o-mini"] == [0.00015, 0.0006]
+    assert DEFAULT_SETTINGS["images"]["draft"]["model"] == "dall-e-2"
+
+
+def test_lists_replace_the_defaults(tmp_path):
+    settings = load_settings(write(tmp_path, '[[routing.routes]]\nname = "all"\nmodel = "gpt-4o"\n'))
+    assert settings["routing"]["routes"] == [{"name": "all", "model": "gpt-4o"}]
+    assert settings["routing"]["max_tokens"] == 1500
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from socialbuzz.client import StreamAborted
+from socialbuzz.shared import LocalSharedBackend, SharedBackend, SharedCompletionCache
+
+
+def test_incomplete_backend_fails_when_created():
+    class ValuesOnly(SharedBackend):
+        def get_value(self, key):
+            return None
+
+        def set_value(self, key, value, ttl):
+            pass
+
+        def clear_values(self):
+            pass
+
+    with pytest.raises(TypeError, match="claim"):
+        ValuesOnly()
+
+
+def test_local_backend(tmp_path):
+    backend = LocalSharedBackend(str(tmp_path))
+    backend.set_value("k", "v", ttl=60)
+    assert backend.get_value("k") == "v"
+    assert backend.get_value("missing") is None
+    backend.put_blob("ab" * 32, b"image")
+    assert backend.get_blob("ab" * 32) == b"image"
+    with pytest.raises(KeyError):
+        backend.get_blob("cd" * 32)
+    assert backend.claim("request", ttl=60)
+    assert not backend.claim("request", ttl=60)
+    backend.release("request")
+    assert backend.claim("request", ttl=60)
+
+
+def test_counters_from_many_threads(tmp_path):
+    cache = SharedCompletionCache(LocalSharedBackend(str(tmp_path)))
+    cache.set("hit", "post")
+
+    def lookups():
+        for _ in range(200):
+            cache.get("hit")
+            cache.get("miss")
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1600, 1600, 1)
+
+
+def test_compute_once_stores_the_result(tmp_path):
+    cache = SharedCompletionCache(LocalSharedBackend(str(tmp_path)))
+    calls = []
+    assert cache.compute_once("k", lambda: calls.append(1) or "post") == "post"
+    assert cache.get("k") == "post"
+    assert calls == [1]
+
+
+def test_cancel_ends_a_wait_for_another_replica(tmp_path):
+    backend = LocalSharedBackend(str(tmp_path))
+    cache = SharedCompletionCache(backend, flight_ttl=60)
+    assert backend.claim("k", ttl=60)  # Another replica is making this request
+    callbacks = []
+    tokens = cache.stream_once("k", lambda on_cancel: iter(["never"]), on_cancel=callbacks.append)
+
+    outcome = []
+
+    def read():
+        try:
+            list(tokens)
+        except StreamAborted:
+            outcome.append(time.monotonic())
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    while not callbacks:
+        time.sleep(0.01)
+    cancelled_at = time.monotonic()
+    callbacks[0]()
+    reader.join(5)
+    assert len(outcome) == 1
+    assert outcome[0] - cancelled_at < 0.5  # Not a FLIGHT_TTL wait
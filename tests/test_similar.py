@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from socialbuzz.history import History
+from socialbuzz.similar import NUM_BANDS, band_keys, jaccard, normalize_title, title_shingles
+
+
+def test_normalize_title_ignores_case_accents_punctuation_and_word_order():
+    assert normalize_title("AI summit - Delhi 2025!") == "2025 ai delhi summit"
+    assert normalize_title("Café Déjà-vu") == normalize_title("deja vu cafe")
+
+
+def test_jaccard():
+    a = title_shingles("AI Summit Delhi 2025")
+    assert jaccard(a, a) == 1.0
+    assert jaccard(a, title_shingles("Quarterly payroll deadline")) == 0.0
+    assert jaccard(a, frozenset()) == 0.0
+    assert 0.6 < jaccard(a, title_shingles("AI Summit Delhi 2026")) < 1.0
+
+
+def test_band_keys():
+    keys = band_keys("AI Summit Delhi 2025", "LinkedIn", "Casual", "Medium")
+    assert len(keys) == NUM_BANDS
+    assert all(-2 ** 63 <= key < 2 ** 63 for key in keys)
+    # Same topic reworded: same signature
+    assert keys == band_keys("Delhi AI summit, 2025!", "LinkedIn", "Casual", "Medium")
+    # Near-duplicate: shares bands; unrelated topic or another kind of post: shares none
+    assert set(keys) & set(band_keys("AI Summit Delhi 2026", "LinkedIn", "Casual", "Medium"))
+    assert not set(keys) & set(band_keys("Quarterly payroll deadline", "LinkedIn", "Casual", "Medium"))
+    assert not set(keys) & set(band_keys("AI Summit Delhi 2025", "Twitter", "Casual", "Medium"))
+
+
+def test_near_duplicates_collide_in_a_band():
+    # A pair at the similarity threshold should land in a common band almost always
+    rng = random.Random(1)
+    words = ["launch", "summit", "growth", "hiring", "cloud", "security", "design", "mobile", "award", "webinar"]
+    collided = 0
+    for _ in range(200):
+        title = " ".join(rng.sample(words, 5))
+        near = title + " " + rng.choice(["2025", "recap", "live"])
+        assert jaccard(title_shingles(title), title_shingles(near)) >= 0.6
+        collided += bool(set(band_keys(title, "X", "c", "s")) & set(band_keys(near, "X", "c", "s")))
+    assert collided >= 190
+
+
+@pytest.fixture
+def history(tmp_path):
+    return History(str(tmp_path / "history.sqlite3"), str(tmp_path / "images"))
+
+
+def test_find_similar(history):
+    old = history.add_post("AI Summit Delhi 2025", "LinkedIn", "Casual", "Medium", "Old post")
+    new = history.add_post("Delhi AI summit 2025", "LinkedIn", "Casual", "Medium", "New post")
+    history.add_post("AI Summit Delhi 2025", "Twitter", "Casual", "Medium", "Other platform")
+    history.add_post("Quarterly payroll deadline", "LinkedIn", "Casual", "Medium", "Unrelated")
+
+    matches = history.find_similar("AI summit in Delhi 2025", "LinkedIn", "Casual", "Medium")
+    assert [post["id"] for post in matches] == [new, old]
+    assert matches[0]["text"] == "New post"
+    assert all(post["similarity"] >= 0.6 for post in matches)
+    assert history.find_similar("AI Summit Delhi 2025", "LinkedIn", "Professional", "Medium") == []
+    assert history.find_similar("Quarterly payroll deadline", "LinkedIn", "Casual", "Medium", threshold=1.0)[0]["text"] == "Unrelated"
+
+
+def test_find_similar_after_reopen_and_prune(tmp_path, history):
+    old = history.add_post("AI Summit Delhi 2025", "LinkedIn", "Casual", "Medium", "Old post")
+    new = history.add_post("Delhi AI summit 2025", "LinkedIn", "Casual", "Medium", "New post")
+
+    reopened = History(str(tmp_path / "history.sqlite3"), str(tmp_path / "images"))
+    assert reopened._bands == history._bands
+    assert [post["id"] for post in reopened.find_similar("AI summit 2025 Delhi", "LinkedIn", "Casual", "Medium")] == [new, old]
+
+    assert reopened.prune(max_entries=1) == 1
+    assert [post["id"] for post in reopened.find_similar("AI summit 2025 Delhi", "LinkedIn", "Casual", "Medium")] == [new]
+    assert old not in reopened._titles
+    assert all(old not in posts for posts in reopened._bands.values())
+
+
+def test_crowded_bands_are_read_when_nothing_else_matches(history, monkeypatch):
+    monkeypatch.setattr("socialbuzz.history.CROWDED_BAND_SIZE", 0)  # Every band counts as crowded
+    post_id = history.add_post("AI Summit Delhi 2025", "LinkedIn", "Casual", "Medium", "Old post")
+    assert [post["id"] for post in history.find_similar("Delhi AI summit 2025", "LinkedIn", "Casual", "Medium")] == [post_id]
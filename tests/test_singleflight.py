@@ -0,0 +1,106 @@
+import threading
+
+from socialbuzz.singleflight import SingleFlight
+
+
+def tokens(on_cancel=None):
+    yield "po"
+    yield "st"
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "post"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+    follower.start()
+    while flight.stats()["coalesced"] == 0:
+        pass
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ["post", "post"]
+    assert len(calls) == 1
+
+
+def test_stream_while_call_on_same_key_is_in_flight():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        return "post"
+
+    results = []
+    caller = threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+    caller.start()
+    started.wait(5)
+    assert list(flight.stream("key", tokens)) == ["po", "st"]
+    release.set()
+    caller.join(5)
+    assert results == ["post"]
+    assert flight.stats() == {"in_flight": 0, "calls": 2, "coalesced": 0}
+
+
+def test_call_while_stream_on_same_key_is_in_flight():
+    flight = SingleFlight()
+    stream = flight.stream("key", tokens)
+    assert next(stream) == "po"
+    assert flight.do("key", lambda: "post") == "post"
+    assert list(stream) == ["st"]
+    assert flight.stats()["in_flight"] == 0
+
+
+# An upstream that blocks until it is aborted through the on_cancel it was given
+def blocked_stream(on_cancel):
+    aborted = threading.Event()
+    on_cancel(aborted.set)
+    yield "po"
+    aborted.wait(5)
+    if aborted.is_set():
+        raise RuntimeError("aborted")
+    yield "st"
+
+
+def test_cancelled_reader_leaves_a_shared_stream_at_once():
+    flight = SingleFlight()
+    first_cancel, second_cancel = [], []
+    first = flight.stream("key", blocked_stream, on_cancel=first_cancel.append)
+    second = flight.stream("key", blocked_stream, on_cancel=second_cancel.append)
+    assert next(first) == "po"
+    assert next(second) == "po"
+
+    pulled = []
+    puller = threading.Thread(target=lambda: pulled.extend(first))  # Blocks inside the upstream
+    puller.start()
+    second_cancel[0]()
+    assert list(second) == []  # Leaves although the other reader holds the upstream
+    assert puller.is_alive()  # Still reading: the upstream was not aborted for it
+
+    first_cancel[0]()  # Now nobody is reading: the upstream is aborted
+    puller.join(1)
+    assert not puller.is_alive()
+    assert pulled == []
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_new_caller_does_not_join_an_aborted_stream():
+    flight = SingleFlight()
+    cancel = []
+    stale = flight.stream("key", blocked_stream, on_cancel=cancel.append)
+    assert next(stale) == "po"
+    cancel[0]()
+    assert list(flight.stream("key", tokens)) == ["po", "st"]
+    assert list(stale) == []
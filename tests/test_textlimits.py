@@ -0,0 +1,50 @@
+from socialbuzz.textlimits import parse_thread, split_sentences, split_thread
+
+
+def test_prose_fractions_are_kept():
+    text = "Our support team is here for you 24/7\n\nWe are rated 9/10 by our users"
+    assert parse_thread(text) is None
+    assert split_thread(text, numbered=False, keep_paragraphs=True) == [
+        "Our support team is here for you 24/7",
+        "We are rated 9/10 by our users",
+    ]
+
+
+def test_fraction_at_the_start_of_prose_is_kept():
+    assert split_thread("9/10 customers agree", numbered=False) == ["9/10 customers agree"]
+
+
+def test_numbered_thread_is_renumbered():
+    text = "1/2. Big news today\n\n(2/2) More soon 24/7"
+    assert parse_thread(text) == ["1/2. Big news today", "(2/2) More soon 24/7"]
+    assert split_thread(text, keep_paragraphs=True) == ["Big news today 1/2", "More soon 24/7 2/2"]
+
+
+def test_split_thread_output_is_recognised():
+    tweets = split_thread("This sentence is long enough to need splitting. " * 12)
+    assert len(tweets) > 1
+    assert parse_thread("\n\n".join(tweets)) == tweets
+
+
+def test_abbreviations_do_not_end_sentences():
+    assert split_sentences("Meet Dr. Rao at 5 p.m. today, e.g. at Hall B.") == ["Meet Dr. Rao at 5 p.m. today, e.g. at Hall B."]
+    assert split_sentences("Mrs. Iyer and Mr. Sharma met J. K. Rowling. Then (i.e. later) they ate.") == [
+        "Mrs. Iyer and Mr. Sharma met J. K. Rowling.",
+        "Then (i.e. later) they ate.",
+    ]
+
+
+def test_sentences_end_before_a_word_that_is_not_lower_case():
+    assert split_sentences("We launched. 3 new teams joined! Why? \U0001F680 Soon.") == [
+        "We launched.",
+        "3 new teams joined!",
+        "Why?",
+        "\U0001F680 Soon.",
+    ]
+    assert split_sentences("Version 2. of the app is out. it ships today.") == ["Version 2. of the app is out. it ships today."]
+
+
+def test_thread_never_breaks_after_an_abbreviation():
+    tweets = split_thread("Meet Mr. Sharma and Dr. Rao at the summit in Delhi next week for talks. " * 8)
+    assert len(tweets) > 1
+    assert all(not tweet.rsplit(" ", 1)[0].endswith(("Mr.", "Dr.")) for tweet in tweets)